@@ -0,0 +1,233 @@
+# Replays the JMeter plans in Jmeter_files/ without JMeter: every virtual user
+# loops over GET all customers, POST/PUT/DELETE a customer, GET all products and
+# POST/PUT/DELETE a product against a running app.py or app_hybrid.py, and the
+# run ends after --iterations loops per user or --duration seconds.
+# Latencies (p50/p95/p99) and throughput per route are written as JSON, e.g.
+#   python bench.py --backend postgres --concurrency 50 --duration 60 --output pg.json
+#   python bench.py --backend hybrid --concurrency 50 --duration 60 --output hybrid.json --compare pg.json
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+# Request bodies of the two .jmx plans; {id} is filled per virtual user and loop
+# (JMeter used ${__threadNum}, which collides between loops).
+SCENARIOS = {
+    "postgres": [
+        ("GET Customers", "GET", "/customers", None),
+        ("POST Customer", "POST", "/customers", {"customer_unique_id": "jmeter_test_user_{id}", "customer_zip_code_prefix": "12345",
+                                                 "customer_city": "JMeterCity", "customer_state": "JM"}),
+        ("PUT Customer", "PUT", "/customers/{customer_id}", {"customer_city": "UpdatedCity"}),
+        ("DELETE Customer", "DELETE", "/customers/{customer_id}", None),
+        ("GET Products", "GET", "/products", None),
+        ("POST Product", "POST", "/products", {"product_id": "jmeter_test_product_{id}", "product_category_name": "electronics_test",
+                                               "product_photos_qty": 3}),
+        ("PUT Product", "PUT", "/products/{product_id}", {"product_category_name": "updated_electronics_test"}),
+        ("DELETE Product", "DELETE", "/products/{product_id}", None),
+    ],
+    "hybrid": [
+        ("GET All Hybrid Customers", "GET", "/customers", None),
+        ("POST Hybrid Customer", "POST", "/customers/hybrid_jmeter_customer_{id}", {"customer_unique_id": "hybrid_jmeter_user_{id}",
+                                                                                    "customer_zip_code_prefix": "54321",
+                                                                                    "customer_city": "HybridCity", "customer_state": "HY"}),
+        ("PUT Hybrid Customer", "PUT", "/customers/{customer_id}", {"customer_unique_id": "your_new_unique_id_here", "customer_city": "SomeCity",
+                                                                    "customer_state": "XX", "customer_zip_code_prefix": "12345"}),
+        ("DELETE Hybrid Customer", "DELETE", "/customers/{customer_id}", None),
+        ("GET All Hybrid Products", "GET", "/products", None),
+        ("POST Hybrid Product", "POST", "/products/hybrid_jmeter_product_{id}", {"product_id": "hybrid_jmeter_product_{id}",
+                                                                                 "product_category_name": "tech_stuff_hybrid",
+                                                                                 "product_photos_qty": 5}),
+        ("PUT Hybrid Product", "PUT", "/products/{product_id}", {"product_category_name": "new_tech_stuff_hybrid"}),
+        ("DELETE Hybrid Product", "DELETE", "/products/{product_id}", None),
+    ],
+}
+
+# Values a POST response provides to the following requests (the JMeter regex extractors).
+EXTRACTED_KEYS = ('customer_id', 'product_id')
+PERCENTILES = (50, 95, 99)
+
+
+def fill(value, variables):
+    if isinstance(value, dict):
+        return {k: fill(v, variables) for k, v in value.items()}
+    if isinstance(value, str):
+        return value.format(**variables)
+    return value
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile, as JMeter's aggregate report computes it.
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # route label -> list of (latency seconds, status, bytes)
+
+    def add(self, label, latency, status, size):
+        with self._lock:
+            self.samples.setdefault(label, []).append((latency, status, size))
+
+    def summary(self, elapsed):
+        routes = {}
+        for label, samples in self.samples.items():
+            latencies = sorted(s[0] * 1000 for s in samples)
+            statuses = {}
+            for _, status, _ in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            errors = sum(1 for _, status, _ in samples if not isinstance(status, int) or status >= 400)
+            route = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "throughput_rps": len(samples) / elapsed if elapsed else None,
+                "bytes_received": sum(s[2] for s in samples),
+                "status_codes": statuses,
+                "latency_ms": {"min": latencies[0], "mean": sum(latencies) / len(latencies), "max": latencies[-1]},
+            }
+            for p in PERCENTILES:
+                route["latency_ms"][f"p{p}"] = percentile(latencies, p)
+            routes[label] = route
+        return routes
+
+
+def virtual_user(number, args, scenario, recorder, stop_at):
+    target = urlsplit(args.base_url)
+    connection_class = http.client.HTTPSConnection if target.scheme == 'https' else http.client.HTTPConnection
+    conn = connection_class(target.hostname, target.port, timeout=args.timeout)
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+    iteration = 0
+    while (args.iterations is None or iteration < args.iterations) and time.monotonic() < stop_at:
+        variables = {"id": f"{number}_{iteration}_{uuid.uuid4().hex[:8]}", "customer_id": "", "product_id": ""}
+        for label, method, path, body in scenario:
+            if time.monotonic() >= stop_at:
+                break
+            payload = json.dumps(fill(body, variables)) if body is not None else None
+            started = time.perf_counter()
+            try:
+                conn.request(method, fill(path, variables), body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()  # reconnects on the next request
+                recorder.add(label, time.perf_counter() - started, type(e).__name__, 0)
+                continue
+            recorder.add(label, time.perf_counter() - started, status, len(data))
+            if method == 'POST' and status < 400:
+                try:
+                    created = json.loads(data)
+                    for key in EXTRACTED_KEYS:
+                        if key in created:
+                            variables[key] = created[key]
+                except ValueError:
+                    pass
+        iteration += 1
+    conn.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def run(args):
+    scenario = SCENARIOS[args.backend]
+    recorder = Recorder()
+    print(f"Benchmarking {args.base_url} ({args.backend} scenario): {args.concurrency} users, "
+          f"{args.duration}s max, {args.iterations or 'unlimited'} iterations each, {args.ramp_up}s ramp-up")
+    started = time.monotonic()
+    stop_at = started + args.ramp_up + args.duration
+    threads = []
+    for number in range(args.concurrency):
+        thread = threading.Thread(target=virtual_user, args=(number, args, scenario, recorder, stop_at), daemon=True)
+        thread.start()
+        threads.append(thread)
+        if args.ramp_up and args.concurrency > 1:
+            time.sleep(args.ramp_up / args.concurrency)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    routes = recorder.summary(elapsed)
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "base_url": args.base_url,
+            "backend": args.backend,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "iterations": args.iterations,
+            "ramp_up_s": args.ramp_up,
+        },
+        "elapsed_s": elapsed,
+        "total": {
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "throughput_rps": total / elapsed if elapsed else None,
+        },
+        # In scenario order, so reports line up when diffed.
+        "routes": {label: routes[label] for label, *_ in scenario if label in routes},
+    }
+
+
+def print_report(report, baseline=None):
+    baseline_routes = baseline["routes"] if baseline else {}
+    print(f"\n{'route':<28}{'n':>8}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, route in report["routes"].items():
+        latency = route["latency_ms"]
+        print(f"{label:<28}{route['requests']:>8}{route['errors']:>6}{route['throughput_rps']:>9.1f}"
+              f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}")
+        # Route labels differ between the two scenarios, so compare by position too.
+        before = baseline_routes.get(label)
+        if before is None and baseline:
+            position = list(report["routes"]).index(label)
+            before = list(baseline_routes.values())[position] if position < len(baseline_routes) else None
+        if before:
+            changes = "  ".join(f"p{p} {latency[f'p{p}'] / before['latency_ms'][f'p{p}']:.2f}x"
+                                for p in PERCENTILES if before['latency_ms'][f'p{p}'])
+            print(f"{'  vs baseline':<28}{changes}")
+    total = report["total"]
+    print(f"\nTotal: {total['requests']} requests, {total['errors']} errors, {total['throughput_rps']:.1f} req/s "
+          f"in {report['elapsed_s']:.1f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay the JMeter CRUD scenarios against a running backend.")
+    parser.add_argument('--backend', choices=sorted(SCENARIOS), default='postgres',
+                        help="which .jmx plan to replay: postgres (app.py) or hybrid (app_hybrid.py)")
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=10, help="virtual users (JMeter threads)")
+    parser.add_argument('--duration', type=float, default=60.0, help="seconds to run after the ramp-up")
+    parser.add_argument('--iterations', type=int, default=None, help="scenario loops per user (default: until --duration)")
+    parser.add_argument('--ramp-up', type=float, default=0.0, help="seconds over which users are started")
+    parser.add_argument('--timeout', type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--compare', help="earlier JSON report to show latency ratios against")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=False)
+            f.write('\n')
+        print(f"Report written to {args.output}")
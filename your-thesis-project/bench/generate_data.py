@@ -0,0 +1,317 @@
+# Synthetic Olist-shaped CSVs for scale testing. The bundled data/ (about 100k
+# orders and 33k products) fits in every cache; this writes the same files, with
+# the same names and columns, at --scale times the Olist row counts, e.g.
+#   python generate_data.py --scale 10 --output ../data/scale10
+#   OLIST_DATA_PATH=../data/scale10 python ../postgres_only_backend/data_loader.py
+#   OLIST_DATA_PATH=../data/scale10 python ../hybrid_only/data_loader_hybrid.py
+# Value distributions are learned from the CSVs in --source where they exist
+# (product attributes, customer/seller locations, order statuses and delays,
+# items per order, prices, review scores and texts) and otherwise fall back to
+# the published Olist figures below. Every order has its own customer, as in
+# Olist, a few of them sharing a customer_unique_id; products are picked with a
+# long-tailed popularity and each is sold by one seller.
+# Ids are MD5 hex strings of (seed, kind, index), like the Olist ones, so any file
+# can reference the i-th customer, product or seller without keeping ids in
+# memory; rows are generated and appended --chunk-rows at a time.
+import argparse
+import hashlib
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+# Row counts of the public Olist dataset, multiplied by --scale. Orders follow
+# the customers one to one, items and reviews follow the orders.
+OLIST_ROWS = {"customers": 99441, "products": 32951, "sellers": 3095}
+CHUNK_ROWS = 100000
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Fallbacks when --source lacks the file to learn from.
+ORDER_STATUSES = {"delivered": 0.9702, "shipped": 0.0111, "canceled": 0.0063, "unavailable": 0.0061,
+                  "invoiced": 0.0032, "processing": 0.0030, "created": 0.0001, "approved": 0.0001}
+ITEMS_PER_ORDER = {1: 0.9014, 2: 0.0759, 3: 0.0126, 4: 0.0051, 5: 0.0020, 6: 0.0030}
+REVIEW_SCORES = {1: 0.1151, 2: 0.0318, 3: 0.0824, 4: 0.1929, 5: 0.5778}
+REVIEW_MESSAGES = ["Produto chegou antes do prazo.", "Recomendo.", "Muito bom, entrega rápida.",
+                   "Ainda não recebi o produto.", "Produto diferente do anunciado."]
+REVIEW_TITLE_RATE = 0.12
+REVIEW_MESSAGE_RATE = 0.41
+PRICE_MEDIAN, PRICE_SIGMA = 75.0, 0.95          # lognormal, BRL
+FREIGHT_MEDIAN, FREIGHT_SIGMA = 16.3, 0.6
+PURCHASE_RANGE = ("2016-09-04", "2018-10-17")
+# Mean delays in hours: purchase -> approval -> carrier -> customer, and the
+# promised delivery after purchase.
+DELAY_HOURS = {"approved": 10.0, "carrier": 67.0, "delivered": 218.0, "estimated": 565.0}
+SHIPPING_LIMIT_DAYS = 6
+
+# Share of customers that are a returning buyer (same customer_unique_id as an
+# earlier customer) and share of orders with a review.
+REPEAT_CUSTOMER_RATE = 0.031
+REVIEW_RATE = 0.992
+# Product popularity: the item's product index is n_products * u ** PRODUCT_SKEW,
+# so the best sellers take a few hundred sales each, as in Olist, and a long tail
+# sells once or never.
+PRODUCT_SKEW = 2.0
+
+PRODUCT_COLUMNS = ['product_category_name', 'product_name_lenght', 'product_description_lenght', 'product_photos_qty',
+                   'product_weight_g', 'product_length_cm', 'product_height_cm', 'product_width_cm']
+# Dates an order has not reached in each status; the other statuses (canceled,
+# invoiced, ...) stop before the carrier.
+MISSING_DATES = {"delivered": (), "shipped": ('order_delivered_customer_date',),
+                 "created": ('order_approved_at', 'order_delivered_carrier_date', 'order_delivered_customer_date')}
+NOT_SHIPPED = ('order_delivered_carrier_date', 'order_delivered_customer_date')
+
+
+def md5_ids(seed, kind, indexes):
+    prefix = f"{seed}:{kind}:"
+    return [hashlib.md5(f"{prefix}{i}".encode()).hexdigest() for i in indexes]
+
+def read_source(source, filename, **kwargs):
+    path = os.path.join(source, filename)
+    if not os.path.exists(path):
+        return None
+    print(f"  learning from {filename}")
+    return pd.read_csv(path, **kwargs)
+
+def choice(rng, distribution, size):
+    values = list(distribution)
+    weights = np.array([distribution[v] for v in values], dtype=float)
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+def frequencies(series):
+    return series.value_counts(normalize=True).to_dict()
+
+def _hours(df, end, start):
+    return (df[end] - df[start]).dt.total_seconds().to_numpy() / 3600
+
+
+class Model:
+    # What is sampled from: rows of the source files where present, the
+    # fallback figures above otherwise.
+    def __init__(self, source):
+        print(f"Reading distributions from {source}...")
+        self.products = read_source(source, 'olist_products_dataset.csv')
+        if self.products is not None:
+            self.products = self.products[PRODUCT_COLUMNS]
+        location = ['zip_code_prefix', 'city', 'state']
+        customers = read_source(source, 'olist_customers_dataset.csv', dtype=str)
+        sellers = read_source(source, 'olist_sellers_dataset.csv', dtype=str)
+        self.seller_locations = sellers[[f"seller_{c}" for c in location]].to_numpy() if sellers is not None else None
+        self.customer_locations = (customers[[f"customer_{c}" for c in location]].to_numpy() if customers is not None
+                                   else self.seller_locations)
+        if self.customer_locations is None:
+            self.customer_locations = self.seller_locations = np.array([["01001", "sao paulo", "SP"]], dtype=object)
+
+        orders = read_source(source, 'olist_orders_dataset.csv',
+                             parse_dates=['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date',
+                                          'order_delivered_customer_date', 'order_estimated_delivery_date'])
+        self.statuses = frequencies(orders['order_status']) if orders is not None else ORDER_STATUSES
+        self.purchases = orders['order_purchase_timestamp'].dropna().to_numpy() if orders is not None else None
+        self.delays = None
+        if orders is not None:
+            complete = orders.dropna()
+            delays = np.column_stack([
+                _hours(complete, 'order_approved_at', 'order_purchase_timestamp'),
+                _hours(complete, 'order_delivered_carrier_date', 'order_approved_at'),
+                _hours(complete, 'order_delivered_customer_date', 'order_delivered_carrier_date'),
+                _hours(complete, 'order_estimated_delivery_date', 'order_purchase_timestamp'),
+            ])
+            self.delays = delays[(delays >= 0).all(axis=1)] if len(complete) else None
+
+        items = read_source(source, 'olist_order_items_dataset.csv', usecols=['order_id', 'price', 'freight_value'])
+        self.items_per_order = frequencies(items.groupby('order_id').size()) if items is not None else ITEMS_PER_ORDER
+        self.prices = items[['price', 'freight_value']].dropna().to_numpy() if items is not None else None
+
+        reviews = read_source(source, 'olist_order_reviews_dataset.csv',
+                              usecols=['review_score', 'review_comment_title', 'review_comment_message'])
+        if reviews is not None:
+            reviews = reviews.dropna(subset=['review_score'])
+        self.reviews = reviews.to_numpy(dtype=object) if reviews is not None and len(reviews) else None
+        self.translations = os.path.join(source, 'product_category_name_translation.csv')
+
+    def sample_rows(self, rng, rows, size):
+        return rows[rng.integers(0, len(rows), size=size)]
+
+    def purchase_times(self, rng, size):
+        if self.purchases is not None and len(self.purchases):
+            jitter = pd.to_timedelta(rng.integers(-43200, 43200, size=size), unit='s')
+            return pd.DatetimeIndex(self.sample_rows(rng, self.purchases, size)) + jitter
+        # Linearly growing order volume over the Olist period.
+        start, end = (pd.Timestamp(t) for t in PURCHASE_RANGE)
+        seconds = np.sqrt(rng.random(size)) * (end - start).total_seconds()
+        return start + pd.to_timedelta(seconds.astype(np.int64), unit='s')
+
+    def order_delays(self, rng, size):
+        # (approved, carrier, delivered, estimated) delays in hours.
+        if self.delays is not None and len(self.delays):
+            return self.sample_rows(rng, self.delays, size)
+        return np.column_stack([rng.exponential(DELAY_HOURS[k], size) for k in ("approved", "carrier", "delivered")]
+                               + [rng.normal(DELAY_HOURS["estimated"], 120, size).clip(72)])
+
+    def item_prices(self, rng, size):
+        if self.prices is not None and len(self.prices):
+            return self.sample_rows(rng, self.prices, size)
+        return np.column_stack([
+            rng.lognormal(np.log(PRICE_MEDIAN), PRICE_SIGMA, size).clip(0.85).round(2),
+            rng.lognormal(np.log(FREIGHT_MEDIAN), FREIGHT_SIGMA, size).round(2),
+        ])
+
+    def review_values(self, rng, size):
+        # (score, title, message)
+        if self.reviews is not None:
+            return self.sample_rows(rng, self.reviews, size)
+        titles = np.where(rng.random(size) < REVIEW_TITLE_RATE, "Recomendo", None)
+        messages = np.where(rng.random(size) < REVIEW_MESSAGE_RATE, choice(rng, dict.fromkeys(REVIEW_MESSAGES, 1), size), None)
+        return np.column_stack([choice(rng, REVIEW_SCORES, size), titles, messages])
+
+
+class CsvWriter:
+    # Appends DataFrame chunks to one CSV, header first.
+    def __init__(self, output, filename):
+        self.path = os.path.join(output, filename)
+        self.file = open(self.path, 'w', newline='', encoding='utf-8')
+        self.rows = 0
+
+    def write(self, df):
+        df.to_csv(self.file, header=self.rows == 0, index=False, date_format=TIMESTAMP_FORMAT)
+        self.rows += len(df)
+
+    def close(self):
+        self.file.close()
+
+
+def generate_products(model, rng, writer, seed, count, chunk_rows):
+    for start in range(0, count, chunk_rows):
+        end = min(start + chunk_rows, count)
+        if model.products is not None:
+            df = model.products.iloc[rng.integers(0, len(model.products), size=end - start)].reset_index(drop=True)
+        else:
+            size = end - start
+            df = pd.DataFrame({
+                'product_category_name': choice(rng, {"cama_mesa_banho": 3, "beleza_saude": 3, "esporte_lazer": 2,
+                                                      "moveis_decoracao": 2, "informatica_acessorios": 2}, size),
+                'product_name_lenght': rng.integers(20, 64, size), 'product_description_lenght': rng.integers(50, 3000, size),
+                'product_photos_qty': rng.integers(1, 6, size), 'product_weight_g': rng.lognormal(6.5, 1.2, size).astype(int),
+                'product_length_cm': rng.integers(16, 60, size), 'product_height_cm': rng.integers(2, 40, size),
+                'product_width_cm': rng.integers(11, 45, size),
+            })
+        for column in PRODUCT_COLUMNS[1:]:
+            df[column] = df[column].astype('Int64')
+        df.insert(0, 'product_id', md5_ids(seed, 'product', range(start, end)))
+        writer.write(df)
+
+def generate_sellers(model, rng, writer, seed, count, chunk_rows):
+    for start in range(0, count, chunk_rows):
+        end = min(start + chunk_rows, count)
+        location = model.sample_rows(rng, model.seller_locations, end - start)
+        writer.write(pd.DataFrame({
+            'seller_id': md5_ids(seed, 'seller', range(start, end)),
+            'seller_zip_code_prefix': location[:, 0], 'seller_city': location[:, 1], 'seller_state': location[:, 2],
+        }))
+
+def seller_of(product_index, seed, n_sellers):
+    # Fixed pseudo-random seller per product (Knuth's multiplicative hash).
+    return (product_index * 2654435761 + seed) % n_sellers
+
+def generate_orders(model, rng, writers, seed, count, n_products, n_sellers, chunk_rows):
+    # One chunk of orders at a time, with their customers, items and reviews.
+    for start in range(0, count, chunk_rows):
+        end = min(start + chunk_rows, count)
+        size = end - start
+        index = np.arange(start, end)
+        customer_ids = md5_ids(seed, 'customer', index)
+        order_ids = np.array(md5_ids(seed, 'order', index), dtype=object)
+
+        repeat = rng.random(size) < REPEAT_CUSTOMER_RATE
+        unique_index = np.where(repeat, rng.integers(0, index + 1), index)
+        location = model.sample_rows(rng, model.customer_locations, size)
+        writers['customers'].write(pd.DataFrame({
+            'customer_id': customer_ids, 'customer_unique_id': md5_ids(seed, 'unique', unique_index),
+            'customer_zip_code_prefix': location[:, 0], 'customer_city': location[:, 1], 'customer_state': location[:, 2],
+        }))
+
+        status = choice(rng, model.statuses, size)
+        purchase = model.purchase_times(rng, size)
+        hours = model.order_delays(rng, size)
+        # approved, carrier and delivered as offsets from the purchase.
+        delays = pd.to_timedelta(np.cumsum(hours[:, :3], axis=1).ravel() * 3600, unit='s').to_numpy().reshape(size, 3)
+        orders = pd.DataFrame({
+            'order_id': order_ids, 'customer_id': customer_ids, 'order_status': status,
+            'order_purchase_timestamp': purchase,
+            'order_approved_at': purchase + delays[:, 0], 'order_delivered_carrier_date': purchase + delays[:, 1],
+            'order_delivered_customer_date': purchase + delays[:, 2],
+            'order_estimated_delivery_date': (purchase + pd.to_timedelta(hours[:, 3] * 3600, unit='s')).normalize(),
+        })
+        for value in set(status):
+            columns = MISSING_DATES.get(value, NOT_SHIPPED)
+            if columns:
+                orders.loc[status == value, list(columns)] = pd.NaT
+        writers['orders'].write(orders)
+
+        item_counts = choice(rng, model.items_per_order, size).astype(int)
+        item_order = np.repeat(np.arange(size), item_counts)
+        products = (n_products * rng.random(len(item_order)) ** PRODUCT_SKEW).astype(np.int64)
+        prices = model.item_prices(rng, len(item_order))
+        approved = orders['order_approved_at'].fillna(orders['order_purchase_timestamp']).to_numpy()[item_order]
+        writers['order_items'].write(pd.DataFrame({
+            'order_id': order_ids[item_order],
+            'order_item_id': np.arange(len(item_order)) - np.repeat(np.cumsum(item_counts) - item_counts, item_counts) + 1,
+            'product_id': md5_ids(seed, 'product', products),
+            'seller_id': md5_ids(seed, 'seller', seller_of(products, seed, n_sellers)),
+            'shipping_limit_date': pd.DatetimeIndex(approved) + pd.Timedelta(days=SHIPPING_LIMIT_DAYS),
+            'price': prices[:, 0], 'freight_value': prices[:, 1],
+        }))
+
+        reviewed = np.flatnonzero(rng.random(size) < REVIEW_RATE)
+        values = model.review_values(rng, len(reviewed))
+        # Written the day after delivery (or the promised date), answered a few days later.
+        created = (orders['order_delivered_customer_date'].fillna(orders['order_estimated_delivery_date'])
+                   .iloc[reviewed].dt.normalize() + pd.Timedelta(days=1)).reset_index(drop=True)
+        writers['reviews'].write(pd.DataFrame({
+            'review_id': md5_ids(seed, 'review', index[reviewed]), 'order_id': order_ids[reviewed],
+            'review_score': values[:, 0].astype(int), 'review_comment_title': values[:, 1], 'review_comment_message': values[:, 2],
+            'review_creation_date': created,
+            'review_answer_timestamp': created + pd.to_timedelta(rng.exponential(3 * 86400, len(reviewed)).astype(np.int64), unit='s'),
+        }))
+        print(f"  {end}/{count} orders")
+
+def generate(args):
+    os.makedirs(args.output, exist_ok=True)
+    rng = np.random.default_rng(args.seed)
+    model = Model(args.source)
+    counts = {name: max(1, round(rows * args.scale)) for name, rows in OLIST_ROWS.items()}
+    started = time.perf_counter()
+    print(f"Writing {counts['customers']} orders, {counts['products']} products and {counts['sellers']} sellers to {args.output}...")
+
+    writers = {name: CsvWriter(args.output, f"olist_{name}_dataset.csv")
+               for name in ('customers', 'orders', 'order_items', 'products', 'sellers')}
+    writers['reviews'] = CsvWriter(args.output, 'olist_order_reviews_dataset.csv')
+    try:
+        generate_products(model, rng, writers['products'], args.seed, counts['products'], args.chunk_rows)
+        generate_sellers(model, rng, writers['sellers'], args.seed, counts['sellers'], args.chunk_rows)
+        generate_orders(model, rng, writers, args.seed, counts['customers'], counts['products'], counts['sellers'], args.chunk_rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    # Categories do not grow with the catalogue.
+    translations = os.path.join(args.output, 'product_category_name_translation.csv')
+    if os.path.exists(model.translations):
+        shutil.copyfile(model.translations, translations)
+    else:
+        pd.DataFrame({'product_category_name': [], 'product_category_name_english': []}).to_csv(translations, index=False)
+
+    for writer in writers.values():
+        print(f"  {os.path.basename(writer.path)}: {writer.rows} rows")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Write synthetic Olist CSVs at a multiple of the original size.")
+    parser.add_argument('--scale', type=float, default=10.0, help="multiple of the Olist row counts, e.g. 10 or 100")
+    parser.add_argument('--output', required=True, help="directory for the CSVs; point OLIST_DATA_PATH at it")
+    parser.add_argument('--source', default=os.path.join(base_dir, '..', 'data'),
+                        help="Olist CSVs to learn value distributions from (missing files use built-in figures)")
+    parser.add_argument('--seed', type=int, default=42, help="same seed, same files")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="orders (or products, sellers) generated per chunk")
+    generate(parser.parse_args())
@@ -0,0 +1,194 @@
+# Sales reports behind the /analytics routes, precomputed so a report is one
+# small read instead of downloading /order_items and /products. PostgreSQL keeps
+# them as materialized views over orders/order_items, created after a full load
+# and refreshed CONCURRENTLY (readers keep seeing the old rows meanwhile) after
+# every later one:
+#   sales_by_month    - per purchase month (YYYY-MM)
+#   sales_by_seller   - per seller
+#   sales_by_product  - per product
+#   sales_by_category - per product category with its English name; PostgreSQL-only
+#                       backend, which keeps products and the translations in PostgreSQL
+# The hybrid backend keeps both in MongoDB, so there the category report is an
+# aggregation of sales_by_product joined with products and category_translations,
+# written to the category_sales collection with $out.
+# Items of canceled and unavailable orders do not count. Money is NUMERIC in
+# PostgreSQL and Decimal128 in MongoDB, served as strings like order_items.price.
+import time
+from decimal import Decimal
+
+import psycopg2.errors
+from bson.decimal128 import Decimal128
+from flask import jsonify
+
+from common.listing import MAX_PAGE_LIMIT
+
+_SOLD_ITEMS = """
+    FROM order_items i JOIN orders o ON o.order_id = i.order_id
+    WHERE o.order_status NOT IN ('canceled', 'unavailable')
+"""
+_TOTALS = "count(*) AS items, sum(i.price)::numeric(14, 2) AS revenue, sum(i.freight_value)::numeric(14, 2) AS freight"
+
+# view -> (query, unique key needed by REFRESH ... CONCURRENTLY), in refresh order.
+SALES_VIEWS = {
+    "sales_by_month": (
+        f"SELECT to_char(o.order_purchase_timestamp, 'YYYY-MM') AS month, count(DISTINCT o.order_id) AS orders, {_TOTALS}"
+        f"{_SOLD_ITEMS} GROUP BY 1",
+        "month"
+    ),
+    "sales_by_seller": (
+        f"SELECT i.seller_id, count(DISTINCT o.order_id) AS orders, {_TOTALS}{_SOLD_ITEMS} GROUP BY i.seller_id",
+        "seller_id"
+    ),
+    "sales_by_product": (
+        f"SELECT i.product_id, count(DISTINCT o.order_id) AS orders, {_TOTALS}{_SOLD_ITEMS} GROUP BY i.product_id",
+        "product_id"
+    ),
+}
+PRODUCTS_SALES_VIEWS = {
+    "sales_by_category": (
+        """
+        SELECT p.product_category_name, t.product_category_name_english, count(*) AS products, sum(s.items)::bigint AS items,
+               sum(s.revenue) AS revenue, sum(s.freight) AS freight
+        FROM sales_by_product s
+        LEFT JOIN products p ON p.product_id = s.product_id
+        LEFT JOIN product_category_translations t ON t.product_category_name = p.product_category_name
+        GROUP BY p.product_category_name, t.product_category_name_english
+        """,
+        "product_category_name"
+    ),
+}
+
+# report -> (view / collection, ORDER BY)
+REPORTS = {
+    "revenue_by_month": ("sales_by_month", "month"),
+    "revenue_by_seller": ("sales_by_seller", "revenue DESC, seller_id"),
+    "revenue_by_category": ("sales_by_category", "revenue DESC, product_category_name"),
+}
+CATEGORY_SALES_SORT = [("revenue", -1), ("product_category_name", 1)]
+
+# Runs on the product_sales collection (sales_by_product copied from PostgreSQL).
+CATEGORY_SALES_PIPELINE = [
+    {"$lookup": {"from": "products", "localField": "product_id", "foreignField": "product_id", "as": "product"}},
+    {"$group": {
+        "_id": {"$arrayElemAt": ["$product.product_category_name", 0]},
+        "products": {"$sum": 1}, "items": {"$sum": "$items"}, "revenue": {"$sum": "$revenue"}, "freight": {"$sum": "$freight"},
+    }},
+    {"$lookup": {"from": "category_translations", "localField": "_id", "foreignField": "product_category_name", "as": "translation"}},
+    {"$project": {
+        "_id": 0, "product_category_name": "$_id",
+        "product_category_name_english": {"$ifNull": [{"$arrayElemAt": ["$translation.product_category_name_english", 0]}, None]},
+        "products": 1, "items": 1, "revenue": 1, "freight": 1,
+    }},
+    {"$out": "category_sales"},
+]
+
+
+def refresh_sales_views(conn, include_products=False):
+    # Creates missing views (a full load drops them with the tables) and refreshes
+    # the others. Returns {view: {"rows": n, "seconds": s}}.
+    views = {**SALES_VIEWS, **(PRODUCTS_SALES_VIEWS if include_products else {})}
+    timings = {}
+    cursor = conn.cursor()
+    try:
+        for view, (query, key) in views.items():
+            started = time.perf_counter()
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (view,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view};")
+            else:
+                cursor.execute(f"CREATE MATERIALIZED VIEW {view} AS {query};")
+                cursor.execute(f"CREATE UNIQUE INDEX {view}_key_idx ON {view} ({key});")
+            cursor.execute(f"SELECT count(*) FROM {view};")
+            timings[view] = {"rows": cursor.fetchone()[0], "seconds": time.perf_counter() - started}
+            print(f"  {view}: {timings[view]['rows']} rows refreshed in {timings[view]['seconds']:.2f}s")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return timings
+
+def refresh_mongo_category_sales(conn, db):
+    # Copies sales_by_product into MongoDB and rebuilds category_sales from it.
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT product_id, orders, items, revenue, freight FROM sales_by_product;")
+        product_sales = [
+            {"product_id": product_id, "orders": orders, "items": items,
+             "revenue": Decimal128(revenue), "freight": Decimal128(freight)}
+            for product_id, orders, items, revenue, freight in cursor.fetchall()
+        ]
+    finally:
+        conn.rollback()
+        cursor.close()
+    db.product_sales.drop()
+    if product_sales:
+        db.product_sales.insert_many(product_sales, ordered=False)
+    db.product_sales.aggregate(CATEGORY_SALES_PIPELINE)
+    timings = {"rows": db.category_sales.estimated_document_count(), "seconds": time.perf_counter() - started}
+    print(f"  category_sales: {timings['rows']} categories from {len(product_sales)} products in {timings['seconds']:.2f}s")
+    return timings
+
+
+def parse_report_limit(args):
+    limit = args.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_LIMIT}")
+    return limit
+
+def report_query(report, limited=False, placeholder='%s'):
+    view, order = REPORTS[report]
+    return f"SELECT * FROM {view} ORDER BY {order}" + (f" LIMIT {placeholder}" if limited else "")
+
+def _report_value(value):
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    return str(value) if isinstance(value, Decimal) else value
+
+def report_document(doc):
+    return {k: _report_value(v) for k, v in doc.items()}
+
+def postgres_report_response(report, args, get_conn, release_conn):
+    try:
+        limit = parse_report_limit(args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    conn = get_conn()
+    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
+    try:
+        cur = conn.cursor()
+        cur.execute(report_query(report, limit is not None), (limit,) if limit is not None else None)
+        columns = [c.name for c in cur.description]
+        rows = cur.fetchall()
+        cur.close()
+        return jsonify([report_document(dict(zip(columns, row))) for row in rows])
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return jsonify({"error": "Analytics views do not exist yet; run the data loader"}), 503
+    except Exception as e:
+        print(f"Error fetching {report}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        if conn: release_conn(conn)
+
+def mongo_report_response(collection, args, sort, label):
+    try:
+        limit = parse_report_limit(args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        cursor = collection.find({}, {"_id": 0}).sort(sort)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return jsonify([report_document(doc) for doc in cursor])
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
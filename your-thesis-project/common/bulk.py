@@ -0,0 +1,261 @@
+# Batch writes for POST /<collection>/_bulk. The body is a JSON array or NDJSON
+# (one object per line) of items such as
+#   {"op": "create", "customer_id": "c1", "customer_city": "Recife"}   (op defaults to create)
+#   {"op": "update", "customer_id": "c1", "customer_city": "Natal"}
+#   {"op": "delete", "customer_id": "c1"}
+# Each key may appear once per request. Items are applied independently: the
+# response lists a status per item (201/200, 404, 409, 400) in request order and
+# "errors" tells whether any item failed.
+#   PostgreSQL - one transaction: the items of each kind go into a temporary
+#                staging table with one execute_values and are applied with one
+#                set-based INSERT/UPDATE/DELETE. When such a statement fails on
+#                bad data, that group is retried item by item under savepoints
+#                to find the offending items.
+#   MongoDB    - one unordered bulk_write; existence for update/delete comes from
+#                one $in query beforehand.
+import json
+import uuid
+
+import psycopg2
+import psycopg2.errors
+from flask import jsonify
+from psycopg2.extras import execute_values
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from common.documents import PRODUCT_FIELDS, product_document_from_fields, product_update
+from common.pg_crud import delete_row, insert_row, update_row
+
+BULK_MAX_ITEMS = 10000
+BULK_OPS = ('create', 'update', 'delete')
+# Column values an item may carry; objects and arrays have no column to go to.
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def parse_bulk_body(data, mimetype):
+    # Returns the list of items; a line of NDJSON that is not JSON becomes an
+    # item of its own and is reported as invalid.
+    text = data.decode('utf-8') if isinstance(data, bytes) else data
+    if mimetype != 'application/x-ndjson' and text.lstrip().startswith('['):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Request body must be a JSON array or NDJSON")
+        return items
+    items = []
+    for line in text.splitlines():
+        if line.strip():
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(f"Invalid JSON: {e}"))
+    return items
+
+def _result(results, position, status, error=None):
+    results[position]["status"] = status
+    if error is not None:
+        results[position]["error"] = error
+
+def prepare_bulk_items(items, key_column, columns, key_type=str):
+    # Returns (results, [(position, op, key, data)]) for the items that passed
+    # validation; the others already carry their 400 in results.
+    results, operations, seen = [], [], set()
+    for position, item in enumerate(items):
+        op = item.get('op', 'create') if isinstance(item, dict) else None
+        results.append({"op": op, key_column: item.get(key_column) if isinstance(item, dict) else None, "status": None})
+        if isinstance(item, ValueError):
+            _result(results, position, 400, str(item))
+            continue
+        if not isinstance(item, dict):
+            _result(results, position, 400, "Item must be a JSON object")
+            continue
+        if op not in BULK_OPS:
+            _result(results, position, 400, f"op must be one of {', '.join(BULK_OPS)}")
+            continue
+        key = item.get(key_column)
+        if key is None:
+            if op != 'create':
+                _result(results, position, 400, f"{key_column} is required for {op}")
+                continue
+            key = uuid.uuid4().hex
+        if isinstance(key, bool) or not isinstance(key, (str, int, float)):
+            results[position][key_column] = None
+            _result(results, position, 400, f"{key_column} must be a string or a number")
+            continue
+        try:
+            key = key_type(key)
+        except ValueError as e:
+            _result(results, position, 400, f"Invalid {key_column}: {e}")
+            continue
+        results[position][key_column] = key
+        if key in seen:
+            _result(results, position, 400, f"{key_column} '{key}' appears more than once in the request")
+            continue
+        seen.add(key)
+        data = {c: item[c] for c in columns if c in item and c != key_column}
+        invalid = [c for c, value in data.items() if not isinstance(value, SCALAR_TYPES)]
+        if invalid:
+            _result(results, position, 400, f"{', '.join(invalid)} must be a string, number, boolean or null")
+            continue
+        operations.append((position, op, key, data))
+    return results, operations
+
+def _read_items(data, mimetype):
+    # (items, None) or (None, error response).
+    try:
+        items = parse_bulk_body(data, mimetype)
+    except ValueError as e:
+        return None, (jsonify({"error": f"Invalid bulk request body: {e}"}), 400)
+    if len(items) > BULK_MAX_ITEMS:
+        return None, (jsonify({"error": f"At most {BULK_MAX_ITEMS} items per request"}), 413)
+    return items, None
+
+def bulk_response(results):
+    return jsonify({"errors": any(r["status"] >= 400 for r in results), "items": results}), 200
+
+
+# --- PostgreSQL ---
+
+def _stage(cur, stage, columns, operations):
+    cur.execute(f"TRUNCATE {stage};")
+    execute_values(
+        cur, f"INSERT INTO {stage} ({', '.join(columns)}) VALUES %s",
+        [[key] + [data.get(c) for c in columns[1:]] for _, _, key, data in operations]
+    )
+
+def _apply_group(cur, resource, stage, op, columns, operations):
+    # One set-based statement for the group; returns the keys it affected.
+    table, key = resource['table'], resource['key']
+    if op == 'create':
+        _stage(cur, stage, columns, operations)
+        cur.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {stage} "
+                    f"ON CONFLICT ({key}) DO NOTHING RETURNING {key};")
+    elif op == 'update' and len(columns) > 1:
+        _stage(cur, stage, columns, operations)
+        assignments = ", ".join(f"{c} = s.{c}" for c in columns[1:])
+        cur.execute(f"UPDATE {table} t SET {assignments} FROM {stage} s WHERE t.{key} = s.{key} RETURNING t.{key};")
+    elif op == 'update':
+        cur.execute(f"SELECT {key} FROM {table} WHERE {key} = ANY(%s);", ([k for _, _, k, _ in operations],))
+    else:
+        keys = [k for _, _, k, _ in operations]
+        for child_table, child_column in resource.get('children', ()):
+            cur.execute(f"DELETE FROM {child_table} WHERE {child_column} = ANY(%s);", (keys,))
+        cur.execute(f"DELETE FROM {table} WHERE {key} = ANY(%s) RETURNING {key};", (keys,))
+    return {row[0] for row in cur.fetchall()}
+
+def _apply_one(cur, resource, op, key, data, label):
+    # Item-by-item fallback; mirrors postgres_item_response. Returns (status, error).
+    cur.execute("SAVEPOINT bulk_item;")
+    try:
+        if op == 'create':
+            insert_row(cur, resource, key, data)
+            found = True
+        elif op == 'update':
+            found = update_row(cur, resource, key, data) is not None
+        else:
+            found = delete_row(cur, resource, key)
+        cur.execute("RELEASE SAVEPOINT bulk_item;")
+    except psycopg2.errors.UniqueViolation:
+        cur.execute("ROLLBACK TO SAVEPOINT bulk_item;")
+        return 409, f"{label.capitalize()} '{key}' already exists"
+    except psycopg2.errors.ForeignKeyViolation as e:
+        cur.execute("ROLLBACK TO SAVEPOINT bulk_item;")
+        return 409, f"{label.capitalize()} '{key}' violates a reference: {e.diag.message_detail}"
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        # NOT NULL, CHECK and other constraints the data itself violates.
+        cur.execute("ROLLBACK TO SAVEPOINT bulk_item;")
+        return 400, f"Invalid {label} data: {e.diag.message_primary}"
+    if not found:
+        return 404, f"{label.capitalize()} '{key}' not found"
+    return (201 if op == 'create' else 200), None
+
+def postgres_bulk_response(resource, data, mimetype, get_conn, release_conn, label):
+    # data: raw request body.
+    items, error = _read_items(data, mimetype)
+    if error: return error
+    results, operations = prepare_bulk_items(items, resource['key'], resource['columns'], resource['key_type'])
+    # Creates, then updates grouped by the columns they set, then deletes.
+    groups = {}
+    for operation in operations:
+        position, op, key, data = operation
+        columns = [resource['key']] + ([c for c in resource['columns'] if c != resource['key']] if op == 'create' else sorted(data))
+        groups.setdefault((BULK_OPS.index(op), op, tuple(columns)), []).append(operation)
+    if not groups:
+        return bulk_response(results)
+
+    conn = get_conn()
+    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
+    stage = f"bulk_{resource['table']}"
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+                    f"SELECT {', '.join(resource['columns'])} FROM {resource['table']} WITH NO DATA;")
+        for (_, op, columns), group in sorted(groups.items()):
+            cur.execute("SAVEPOINT bulk_group;")
+            try:
+                affected = _apply_group(cur, resource, stage, op, list(columns), group)
+                cur.execute("RELEASE SAVEPOINT bulk_group;")
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                cur.execute("ROLLBACK TO SAVEPOINT bulk_group;")
+                print(f"Bulk {op} of {len(group)} {label}s failed ({e.diag.message_primary}); retrying item by item")
+                for position, op, key, data in group:
+                    _result(results, position, *_apply_one(cur, resource, op, key, data, label))
+                continue
+            for position, op, key, data in group:
+                if key in affected:
+                    _result(results, position, 201 if op == 'create' else 200)
+                elif op == 'create':
+                    _result(results, position, 409, f"{label.capitalize()} '{key}' already exists")
+                else:
+                    _result(results, position, 404, f"{label.capitalize()} '{key}' not found")
+        conn.commit()
+        cur.close()
+        return bulk_response(results)
+    except Exception as e:
+        conn.rollback()
+        print(f"Error handling bulk {label} request: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        if conn: release_conn(conn)
+
+
+# --- MongoDB ---
+
+def mongo_products_bulk_response(products, data, mimetype):
+    items, error = _read_items(data, mimetype)
+    if error: return error
+    results, operations = prepare_bulk_items(items, 'product_id', PRODUCT_FIELDS)
+    try:
+        keys = [key for _, op, key, _ in operations if op != 'create']
+        existing = {doc["product_id"] for doc in products.find({"product_id": {"$in": keys}}, {"product_id": 1, "_id": 0})} if keys else set()
+        requests, positions = [], []
+        for position, op, key, data in operations:
+            if op != 'create' and key not in existing:
+                _result(results, position, 404, f"Product '{key}' not found")
+                continue
+            if op == 'create':
+                requests.append(InsertOne(product_document_from_fields({**data, "product_id": key})))
+            elif op == 'update':
+                update = product_update(data)
+                if not update:
+                    _result(results, position, 200)
+                    continue
+                requests.append(UpdateOne({"product_id": key}, {"$set": update}))
+            else:
+                requests.append(DeleteOne({"product_id": key}))
+            positions.append(position)
+            _result(results, position, 201 if op == 'create' else 200)
+        if requests:
+            try:
+                products.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', ()):
+                    position = positions[error['index']]
+                    key = results[position]['product_id']
+                    if error.get('code') == 11000:
+                        _result(results, position, 409, f"Product '{key}' already exists")
+                    else:
+                        _result(results, position, 400, f"Invalid product data: {error.get('errmsg')}")
+        return bulk_response(results)
+    except Exception as e:
+        print(f"Error handling bulk product request: {e}")
+        return jsonify({"error": "Internal server error"}), 500
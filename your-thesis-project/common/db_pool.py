@@ -0,0 +1,238 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from pymongo import MongoClient
+from pymongo import monitoring
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PostgresPool:
+    # Thread-safe psycopg2 pool shared by every route of a process. Connections are
+    # opened lazily up to max_size; a borrower waits at most acquire_timeout seconds
+    # for a free one. A connection that sat idle longer than health_check_interval
+    # is pinged with SELECT 1 before being handed out (0 = ping on every borrow).
+    def __init__(self, min_size=1, max_size=10, acquire_timeout=5.0, check_on_borrow=True,
+                 health_check_interval=5.0, max_idle=300.0, **connect_kwargs):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError("PostgresPool requires 0 <= min_size <= max_size and max_size >= 1")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.check_on_borrow = check_on_borrow
+        self.health_check_interval = health_check_interval
+        self.max_idle = max_idle
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, returned_at), most recently returned on the right
+        self._size = 0        # idle + in use + being opened
+        self._in_use = 0
+        self._closed = False
+        self._counters = {
+            "connections_created": 0, "connections_closed": 0,
+            "acquired": 0, "released": 0, "timeouts": 0,
+            "connect_errors": 0, "failed_health_checks": 0,
+            "waits": 0, "wait_seconds_total": 0.0,
+        }
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    # Connects and closes happen outside the lock; only their counters take it
+    # (the Condition's lock is reentrant).
+    def _connect(self):
+        try:
+            conn = psycopg2.connect(**self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._counters["connect_errors"] += 1
+            raise
+        with self._cond:
+            self._counters["connections_created"] += 1
+        return conn
+
+    def _close_conn(self, conn):
+        with self._cond:
+            self._counters["connections_closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if not self.check_on_borrow or time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1;")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("PostgreSQL pool is closed")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Reserve the slot, then open the connection outside the lock.
+                        self._size += 1
+                        conn, returned_at = None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(f"No PostgreSQL connection available within {timeout}s")
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, returned_at):
+                self._close_conn(conn)
+                with self._cond:
+                    self._counters["failed_health_checks"] += 1
+                    self._size -= 1
+                continue
+
+            with self._cond:
+                self._in_use += 1
+                self._counters["acquired"] += 1
+                if waited:
+                    self._counters["waits"] += 1
+                    self._counters["wait_seconds_total"] += time.monotonic() - started
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        to_close = []
+        with self._cond:
+            self._in_use -= 1
+            self._counters["released"] += 1
+            if discard or conn.closed or self._closed:
+                to_close.append(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, now))
+            # Shrink back towards min_size once connections have been idle for max_idle.
+            while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+                to_close.append(self._idle.popleft()[0])
+                self._size -= 1
+            self._cond.notify()
+        for c in to_close:
+            self._close_conn(c)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update({
+                "min_size": self.min_size, "max_size": self.max_size,
+                "size": self._size, "idle": len(self._idle), "in_use": self._in_use,
+                "acquire_timeout": self.acquire_timeout,
+            })
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for c in idle:
+            self._close_conn(c)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    # MongoClient already pools sockets internally; this listener only counts the
+    # pool events so the pool can be sized from /pool_stats.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "connections_created": 0, "connections_closed": 0,
+            "checked_out": 0, "checked_in": 0, "check_out_failed": 0,
+            "in_use": 0, "open": 0, "pool_cleared": 0,
+        }
+
+    def _bump(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.counters[key] += delta
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): self._bump(pool_cleared=1)
+    def pool_closed(self, event): pass
+    def connection_created(self, event): self._bump(connections_created=1, open=1)
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): self._bump(connections_closed=1, open=-1)
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): self._bump(check_out_failed=1)
+    def connection_checked_out(self, event): self._bump(checked_out=1, in_use=1)
+    def connection_checked_in(self, event): self._bump(checked_in=1, in_use=-1)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+# Pools and clients opened before a fork (e.g. in a gunicorn --preload master)
+# share their sockets with the parent. A forked worker must not use them, and
+# must not close them either: closing sends a terminate message that ends the
+# parent's sessions. They are parked here for the life of the worker instead.
+_inherited_after_fork = []
+
+def abandon_after_fork(*objects):
+    _inherited_after_fork.extend(o for o in objects if o is not None)
+
+def create_mongo_client(host, port, min_size=0, max_size=100, acquire_timeout=5.0, event_listeners=(), **kwargs):
+    listener = MongoPoolListener()
+    client = MongoClient(
+        f'mongodb://{host}:{port}/',
+        minPoolSize=min_size, maxPoolSize=max_size,
+        waitQueueTimeoutMS=int(acquire_timeout * 1000),
+        event_listeners=[listener, *event_listeners], **kwargs
+    )
+    # Fail fast on startup instead of on the first request.
+    client.admin.command('ping')
+    return client, listener
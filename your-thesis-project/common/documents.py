@@ -0,0 +1,143 @@
+# Shape of the product, review and user profile documents, shared by the hybrid
+# loader and API (MongoDB) and the PostgreSQL-only backend's JSONB document mode
+# (common/pg_documents.py), so that documents written through either API look
+# like loaded ones and both backends serve the same bodies.
+from datetime import datetime
+
+PRODUCT_FIELDS = ['product_id', 'product_category_name', 'product_name_length', 'product_description_length',
+                  'product_photos_qty', 'product_weight_g', 'product_length_cm', 'product_height_cm', 'product_width_cm']
+# Top-level fields of a product document.
+PRODUCT_DOCUMENT_FIELDS = PRODUCT_FIELDS + ['specs', 'tags', 'rating']
+
+# Denormalized copies of the flat fields inside each document.
+_DERIVED_PATHS = {
+    'product_weight_g': 'specs.weight_g',
+    'product_length_cm': 'specs.dimensions_cm.length',
+    'product_height_cm': 'specs.dimensions_cm.height',
+    'product_width_cm': 'specs.dimensions_cm.width',
+}
+
+RATING_SCORES = (1, 2, 3, 4, 5)
+
+def empty_product_rating():
+    # Review summary of a product without reviews. The summaries are computed
+    # from the reviews of the product's orders by common/ratings.py; scores
+    # counts the reviews per star.
+    return {"average": None, "count": 0, "scores": {str(s): 0 for s in RATING_SCORES}}
+
+def product_document(product_id, category=None, name_length=None, description_length=None, photos_qty=None,
+                     weight=None, length=None, height=None, width=None):
+    return {
+        "product_id": product_id,
+        "product_category_name": category,
+        "product_name_length": name_length,
+        "product_description_length": description_length,
+        "product_photos_qty": photos_qty,
+        "product_weight_g": weight,
+        "product_length_cm": length,
+        "product_height_cm": height,
+        "product_width_cm": width,
+        "specs": {"weight_g": weight, "dimensions_cm": {"length": length, "height": height, "width": width}},
+        "tags": [category] if category else ["unknown"],
+        "rating": empty_product_rating()
+    }
+
+# Columns of the Olist reviews CSV, i.e. the fields of a loaded review document.
+REVIEW_FIELDS = ['review_id', 'order_id', 'review_score', 'review_comment_title', 'review_comment_message',
+                 'review_creation_date', 'review_answer_timestamp']
+_REVIEW_DATES = ('review_creation_date', 'review_answer_timestamp')
+
+def review_update(fields):
+    # The review fields of a request body but review_id, validated and with the
+    # dates parsed like the loader's; raises ValueError.
+    update = {f: fields[f] for f in REVIEW_FIELDS[1:] if f in fields}
+    if 'order_id' in update and not isinstance(update['order_id'], str):
+        raise ValueError("order_id must be a string")
+    score = update.get('review_score')
+    if 'review_score' in update and (type(score) is not int or score not in RATING_SCORES):
+        raise ValueError(f"review_score must be one of {', '.join(map(str, RATING_SCORES))}")
+    for field in _REVIEW_DATES:
+        if isinstance(update.get(field), str):
+            try:
+                update[field] = datetime.fromisoformat(update[field])
+            except ValueError:
+                raise ValueError(f"{field} must be an ISO 8601 date")
+    return update
+
+def review_document_from_fields(fields):
+    return {f: fields.get(f) for f in REVIEW_FIELDS}
+
+def user_profile_document(customer_id):
+    return {"customer_id": customer_id, "preferences": {"newsletter": False, "notifications": True}, "last_activity": None}
+
+def product_document_from_fields(fields):
+    return product_document(*(fields.get(f) for f in PRODUCT_FIELDS))
+
+def product_update(fields):
+    # $set for a partial update that keeps specs/tags consistent with the flat fields.
+    update = {f: fields[f] for f in PRODUCT_FIELDS[1:] if f in fields}
+    for field, path in _DERIVED_PATHS.items():
+        if field in update:
+            update[path] = update[field]
+    if 'product_category_name' in update:
+        category = update['product_category_name']
+        update['tags'] = [category] if category else ["unknown"]
+    return update
+
+
+# --- Builders used by the loaders (DataFrames from common.snapshots.read_olist_csv) ---
+
+def _column_values(df, column):
+    # Plain Python values for one column, with NaN/NaT mapped to None.
+    values = df[column].astype(object)
+    return values.where(df[column].notna(), None).tolist()
+
+def build_product_documents(products_df):
+    product_id = _column_values(products_df, 'product_id')
+    category = _column_values(products_df, 'product_category_name')
+    # CORRECTED: source columns are spelled 'lenght'
+    name_length = _column_values(products_df, 'product_name_lenght')
+    description_length = _column_values(products_df, 'product_description_lenght')
+    photos_qty = _column_values(products_df, 'product_photos_qty')
+    weight = _column_values(products_df, 'product_weight_g')
+    length = _column_values(products_df, 'product_length_cm')
+    height = _column_values(products_df, 'product_height_cm')
+    width = _column_values(products_df, 'product_width_cm')
+    return [product_document(*values) for values in zip(
+        product_id, category, name_length, description_length, photos_qty, weight, length, height, width)]
+
+def row_documents(df):
+    columns = {col: _column_values(df, col) for col in df.columns}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+def build_review_documents(reviews_df):
+    # The timestamp columns come parsed from read_olist_csv. (review_id, order_id)
+    # is unique in MongoDB; of repeated pairs the last row wins, as in a sync.
+    return row_documents(reviews_df.drop_duplicates(subset=['review_id', 'order_id'], keep='last'))
+
+def build_category_translation_documents(translations_df):
+    return row_documents(translations_df.drop_duplicates(subset='product_category_name'))
+
+def build_user_profile_documents(customers_df):
+    return [user_profile_document(cust_id) for cust_id in customers_df['customer_id'].unique().tolist()]
+
+
+# List filters of the document routes (/products, /reviews): query parameter ->
+# (document field, parser). An array field such as tags matches documents that
+# contain the value. The PostgreSQL JSONB equivalents are in common/pg_documents.py.
+DOCUMENT_FILTERS = {
+    "products": {
+        "product_category_name": ("product_category_name", str),
+        "tag": ("tags", str),
+    },
+    "reviews": {
+        "order_id": ("order_id", str),
+        "review_score": ("review_score", int),
+    },
+}
+
+# Sparse fieldsets of the document list routes (?fields=a,b): the selectable
+# top-level fields, the first of which (the key) is always sent.
+DOCUMENT_FIELDS = {
+    "products": PRODUCT_DOCUMENT_FIELDS,
+}
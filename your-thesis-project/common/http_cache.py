@@ -0,0 +1,271 @@
+# Conditional GET and compression for the collection routes (/products, /reviews,
+# /orders, ...), which otherwise re-serialize and send megabytes of JSON on every
+# poll even when nothing changed since the load.
+#   versions - each table / collection has a change version. PostgreSQL keeps them
+#              in the change_log table, appended to by a statement-level trigger on
+#              every table (pg_loader.CHANGE_VERSIONS_DDL), so loaders, API writes
+#              and manual SQL all count. MongoDB has no triggers; the hybrid loader
+#              and write routes bump the change_versions collection themselves.
+#   ETag     - W/"<versions of the tables the route reads>", with Last-Modified set
+#              to their newest change. A matching If-None-Match (or, without one,
+#              If-Modified-Since) is answered 304 Not Modified right after the
+#              version lookup, without reading any rows. If-Modified-Since only
+#              has one-second resolution; clients that poll faster should use
+#              the ETag.
+#   encoding - br (when the brotli package is installed) or gzip, negotiated from
+#              Accept-Encoding; bodies under min_compress_bytes are sent as they
+#              are. Finished bodies are kept in an LRU per version, URL and
+#              encoding, so each variant is serialized and compressed once per
+#              data version. ?stream= responses are compressed chunk by chunk and
+#              not kept.
+# The version is read before the body, so a kept body is never older than the
+# ETag it is filed under; a write in between only costs one more download. The
+# read-through response cache below keys its entries by the same version, so a
+# body it replays is never an older version's either.
+import gzip
+import json
+import threading
+import zlib
+from datetime import timezone
+from functools import wraps
+
+from flask import Response, g, make_response, request
+from werkzeug.http import is_resource_modified
+
+from common.pg_loader import CHANGE_LOG_FOLD_SQL
+from common.response_cache import CACHED_HEADERS, LocalLRUCache
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip needs no extra packages.
+    brotli = None
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # 11 compresses a little better at several times the CPU
+COMPRESS_MIN_BYTES = 1024
+# Bodies are addressed by data version, so only the LRU bound retires them.
+BODY_TTL = 24 * 60 * 60
+# A version lookup that sums more change_log rows than this for a table folds
+# them into one, so the lookup stays cheap however many writes the API serves.
+CHANGE_LOG_FOLD_ROWS = 256
+
+
+def version_tag(versions):
+    # versions: [(version, changed_at)] in a fixed order -> (etag, last_modified).
+    # changed_at is part of the tag so a recreated database, whose counters start
+    # over, cannot match an ETag handed out before.
+    changed = [c if c.tzinfo else c.replace(tzinfo=timezone.utc) for _, c in versions]
+    etag = "-".join(f"{v}.{int(c.timestamp() * 1000000):x}" for (v, _), c in zip(versions, changed))
+    return etag, max(changed)
+
+def postgres_change_version(get_conn, release_conn, tables):
+    # None when a table has no version yet (e.g. loaded before the triggers
+    # existed): its writes might not be counted, so no ETag is safe.
+    conn = get_conn()
+    if not conn: raise RuntimeError("Failed to connect to PostgreSQL")
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT table_name, sum(bumps)::bigint, max(changed_at), count(*) FROM change_log "
+                    "WHERE table_name = ANY(%s) GROUP BY table_name;", (list(tables),))
+        fetched = cur.fetchall()
+        rows = {name: (version, changed_at) for name, version, changed_at, _ in fetched}
+        crowded = [name for name, _, _, count in fetched if count > CHANGE_LOG_FOLD_ROWS]
+        if crowded:
+            _fold_change_log(conn, cur, crowded)
+        cur.close()
+    finally:
+        release_conn(conn)
+    if len(rows) < len(tables):
+        return None
+    return version_tag([rows[t] for t in tables])
+
+def _fold_change_log(conn, cur, tables):
+    # One lookup folds at a time; the others skip instead of waiting for it. The
+    # sums, and so the versions just read, are unchanged by a fold.
+    try:
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('change_log'));")
+        if cur.fetchone()[0]:
+            cur.execute(CHANGE_LOG_FOLD_SQL, (tables,))
+        conn.commit()
+    except Exception as e:
+        print(f"Change log fold error ({', '.join(tables)}): {e}")
+        conn.rollback()
+
+def mongo_change_version(db, collections):
+    docs = {doc["_id"]: doc for doc in db.change_versions.find({"_id": {"$in": list(collections)}})}
+    if len(docs) < len(collections):
+        return None
+    return version_tag([(docs[c]["version"], docs[c]["changed_at"]) for c in collections])
+
+_MONGO_VERSION_BUMP = {"$inc": {"version": 1}, "$currentDate": {"changed_at": True}}
+
+def bump_mongo_change_version(db, *collections):
+    for collection in collections:
+        db.change_versions.update_one({"_id": collection}, _MONGO_VERSION_BUMP, upsert=True)
+
+async def bump_mongo_change_version_async(db, *collections):
+    # The same through an AsyncMongoClient database (app_hybrid_async.py).
+    for collection in collections:
+        await db.change_versions.update_one({"_id": collection}, _MONGO_VERSION_BUMP, upsert=True)
+
+def bump_on_write(bump):
+    # For write routes of stores without triggers: calls bump() after every
+    # successful non-GET request.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if request.method != 'GET' and response.status_code < 400:
+                try:
+                    bump()
+                except Exception as e:
+                    print(f"Change version bump error ({request.path}): {e}")
+            return response
+        return wrapper
+    return decorator
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def _compressed_chunks(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip framing
+        process, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+    try:
+        for chunk in chunks:
+            # Flushed per chunk so the client still receives rows as they are read.
+            data = process(chunk.encode() if isinstance(chunk, str) else chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Lets the inner generator release its connection on a client disconnect.
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def _pack(response, body, encoding):
+    meta = json.dumps({
+        "mimetype": response.mimetype, "encoding": encoding,
+        "headers": {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers},
+    }).encode()
+    return len(meta).to_bytes(4, 'big') + meta + body
+
+def _unpack(entry):
+    header_len = int.from_bytes(entry[:4], 'big')
+    meta = json.loads(entry[4:4 + header_len])
+    response = Response(entry[4 + header_len:], mimetype=meta["mimetype"])
+    response.headers.update(meta["headers"])
+    if meta["encoding"]:
+        response.headers['Content-Encoding'] = meta["encoding"]
+    return response
+
+
+class HttpCache:
+    def __init__(self, bodies=None, min_compress_bytes=COMPRESS_MIN_BYTES, enabled=True):
+        self.enabled = enabled
+        self.bodies = bodies  # LocalLRUCache or None (no kept bodies)
+        self.min_compress_bytes = min_compress_bytes
+        self._lock = threading.Lock()
+        self._counters = {}  # namespace -> {"not_modified", "hits", "misses", "errors"}
+
+    def _count(self, namespace, counter):
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {"not_modified": 0, "hits": 0, "misses": 0, "errors": 0})
+            counters[counter] += 1
+
+    def _key(self, namespace, etag):
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return f"{namespace}:{etag}:{request.path}?{query}"
+
+    def _finish(self, response, version):
+        response.vary.add('Accept-Encoding')
+        if version is not None:
+            etag, last_modified = version
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            # Clients may keep the body but must revalidate before every reuse.
+            response.cache_control.no_cache = True
+        return response
+
+    def _encode(self, response, encoding):
+        # Compresses a buffered body in place; returns the bytes sent.
+        body = response.get_data()
+        if encoding is None or len(body) < self.min_compress_bytes:
+            return body, None
+        body = compress(body, encoding)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return body, encoding
+
+    def conditional(self, namespace, get_version):
+        # get_version() -> (etag, last_modified) or None; see *_change_version.
+        def decorator(view):
+            if not self.enabled:
+                return view
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+                encoding = request.accept_encodings.best_match(ENCODINGS)
+                try:
+                    version = get_version()
+                except Exception as e:
+                    print(f"Change version lookup error ({namespace}): {e}")
+                    self._count(namespace, "errors")
+                    version = None
+                # Lets common/single_flight.py keep requests of different versions apart.
+                g.http_cache_etag = version[0] if version is not None else None
+
+                key = None
+                if version is not None:
+                    if not is_resource_modified(request.environ, etag=version[0], last_modified=version[1]):
+                        self._count(namespace, "not_modified")
+                        return self._finish(Response(status=304), version)
+                    if self.bodies is not None:
+                        key = self._key(namespace, version[0])
+                        entry = self.bodies.get(f"{key}:{encoding or 'identity'}")
+                        if entry is not None:
+                            self._count(namespace, "hits")
+                            return self._finish(_unpack(entry), version)
+                        self._count(namespace, "misses")
+
+                # Another encoding of the same version can skip the view.
+                entry = self.bodies.get(f"{key}:identity") if key and encoding else None
+                response = _unpack(entry) if entry is not None else make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if response.is_streamed:
+                    if encoding is not None:
+                        response.response = _compressed_chunks(response.response, encoding)
+                        response.headers['Content-Encoding'] = encoding
+                    return self._finish(response, version)
+
+                if key and entry is None:
+                    self.bodies.set(f"{key}:identity", _pack(response, response.get_data(), None), BODY_TTL)
+                body, used = self._encode(response, encoding)
+                if key and used:
+                    self.bodies.set(f"{key}:{used}", _pack(response, body, used), BODY_TTL)
+                return self._finish(response, version)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            namespaces = {ns: dict(c) for ns, c in self._counters.items()}
+        return {"enabled": True, "encodings": list(ENCODINGS), "namespaces": namespaces,
+                "bodies": self.bodies.info() if self.bodies is not None else None}
+
+
+def create_http_cache(enabled=True, max_entries=64, max_bytes=256 * 1024 * 1024, min_compress_bytes=COMPRESS_MIN_BYTES):
+    bodies = LocalLRUCache(max_entries=max_entries, max_bytes=max_bytes) if enabled and max_entries else None
+    return HttpCache(bodies, min_compress_bytes=min_compress_bytes, enabled=enabled)
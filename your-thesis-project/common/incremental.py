@@ -0,0 +1,226 @@
+# Incremental reload for both loaders. Every CSV is fingerprinted (SHA-256 of
+# the file) and the fingerprint stored next to the data it was loaded into: the
+# load_fingerprints table in PostgreSQL, the load_fingerprints collection in
+# MongoDB. A rerun skips files whose fingerprint and row count are unchanged and
+# applies only the row-level delta of the others:
+#   PostgreSQL - COPY into a temporary staging table, then INSERT ... ON CONFLICT
+#                DO UPDATE for new/changed rows and DELETE for vanished ones, in
+#                one transaction
+#   MongoDB    - diff against the stored documents, then one unordered bulk_write
+#                of upserts and deletes
+# The full (drop and recreate) loads reset the fingerprints, so the first
+# incremental run after any full load only compares.
+import os
+import time
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from common.pg_loader import (CATEGORY_TRANSLATION_COLUMNS, CUSTOMER_COLUMNS, FINGERPRINT_TABLE_DDL, ORDER_COLUMNS, ORDER_ITEM_COLUMNS,
+                              POSTGRES_TABLE_SOURCES, PRODUCT_COLUMNS, PRODUCTS_TABLE_SOURCES, add_change_version_triggers, add_postgres_indexes,
+                              bulk_load_postgres_data, copy_dataframe, save_postgres_fingerprints)
+from common.snapshots import file_fingerprint
+
+MONGO_WRITE_BATCH_SIZE = 5000
+
+# table -> (natural key, CSV columns). order_items has a surrogate key, so it is
+# diffed per order instead (see _sync_order_items).
+POSTGRES_TABLE_KEYS = {
+    'customers': ('customer_id', CUSTOMER_COLUMNS),
+    'orders': ('order_id', ORDER_COLUMNS),
+    'order_items': (None, ORDER_ITEM_COLUMNS),
+    'products': ('product_id', PRODUCT_COLUMNS),
+    'product_category_translations': ('product_category_name', CATEGORY_TRANSLATION_COLUMNS),
+}
+# Rows removed with a parent that disappears from its CSV.
+POSTGRES_CHILDREN = {'orders': [('order_items', 'order_id')]}
+
+
+def _report(target, counts, seconds):
+    if counts is None:
+        print(f"  {target}: unchanged, skipped")
+    else:
+        print(f"  {target}: +{counts['inserted']} ~{counts['updated']} -{counts['deleted']} rows in {seconds:.2f}s")
+
+
+# --- PostgreSQL ---
+
+def _postgres_tables_exist(cursor, tables):
+    cursor.execute("SELECT count(*) FROM unnest(%s::text[]) t WHERE to_regclass(t) IS NULL;", (list(tables),))
+    return cursor.fetchone()[0] == 0
+
+def _stored_postgres_fingerprints(cursor):
+    cursor.execute(FINGERPRINT_TABLE_DDL)
+    cursor.execute("SELECT target, sha256, row_count FROM load_fingerprints;")
+    return {target: (sha256, rows) for target, sha256, rows in cursor.fetchall()}
+
+def _stage(cursor, table, columns, df):
+    cursor.execute(f"CREATE TEMP TABLE stage_{table} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA;")
+    copy_dataframe(cursor, f"stage_{table}", df[columns])
+
+def _upsert_keyed(cursor, table, key, columns):
+    values = [c for c in columns if c != key]
+    cursor.execute(f"""
+        WITH upserted AS (
+            INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM stage_{table}
+            ON CONFLICT ({key}) DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in values)}
+            WHERE ({', '.join(f'{table}.{c}' for c in values)}) IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in values)})
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted;
+    """)
+    inserted, updated = cursor.fetchone()
+    return {"inserted": inserted, "updated": updated, "deleted": 0}
+
+def _delete_vanished(cursor, table, key):
+    vanished = f"SELECT {key} FROM {table} t WHERE NOT EXISTS (SELECT 1 FROM stage_{table} s WHERE s.{key} = t.{key})"
+    for child_table, child_column in POSTGRES_CHILDREN.get(table, ()):
+        cursor.execute(f"DELETE FROM {child_table} WHERE {child_column} IN ({vanished});")
+    cursor.execute(f"DELETE FROM {table} WHERE {key} IN ({vanished});")
+    return cursor.rowcount
+
+def _sync_order_items(cursor, columns):
+    # The CSV carries no stable row key, so every order whose multiset of item
+    # rows differs gets its items replaced; items of other orders are untouched.
+    column_list = ', '.join(columns)
+    cursor.execute(f"""
+        CREATE TEMP TABLE changed_orders ON COMMIT DROP AS
+        SELECT DISTINCT order_id FROM (
+            (SELECT {column_list} FROM stage_order_items EXCEPT ALL SELECT {column_list} FROM order_items)
+            UNION ALL
+            (SELECT {column_list} FROM order_items EXCEPT ALL SELECT {column_list} FROM stage_order_items)
+        ) d;
+    """)
+    cursor.execute("DELETE FROM order_items WHERE order_id IN (SELECT order_id FROM changed_orders);")
+    deleted = cursor.rowcount
+    cursor.execute(f"INSERT INTO order_items ({column_list}) SELECT {column_list} FROM stage_order_items "
+                   f"WHERE order_id IN (SELECT order_id FROM changed_orders);")
+    return {"inserted": cursor.rowcount, "updated": 0, "deleted": deleted}
+
+def incremental_load_postgres_data(conn, data_path, include_products=False, method='copy'):
+    # Returns {table: {"rows": changed rows, "seconds": s, "skipped": bool}}.
+    # Falls back to a full bulk load when the tables do not exist yet.
+    # Load order: parents before children.
+    sources = POSTGRES_TABLE_SOURCES + (PRODUCTS_TABLE_SOURCES if include_products else [])
+    cursor = conn.cursor()
+    if not _postgres_tables_exist(cursor, [table for table, *_ in sources]):
+        cursor.close()
+        conn.rollback()
+        print("PostgreSQL tables missing; running a full load instead.")
+        return bulk_load_postgres_data(conn, data_path, method=method, include_products=include_products)
+
+    print("Incremental PostgreSQL load...")
+    timings = {}
+    fingerprints = {}
+    try:
+        # Databases loaded before the triggers existed get them before any change.
+        add_change_version_triggers(cursor, include_products)
+        stored = _stored_postgres_fingerprints(cursor)
+        changed = []
+        for table, source, reader in sources:
+            key, columns = POSTGRES_TABLE_KEYS[table]
+            sha256 = file_fingerprint(os.path.join(data_path, source))
+            cursor.execute(f"SELECT count(*) FROM {table};")
+            if stored.get(table) == (sha256, cursor.fetchone()[0]):
+                timings[table] = {"rows": 0, "seconds": 0.0, "skipped": True}
+                _report(table, None, 0)
+            else:
+                changed.append((table, source, reader, key, columns, sha256))
+
+        # Upserts parents-first so new children find their parents, deletes
+        # children-first so no foreign key is violated in between.
+        counts = {}
+        for table, source, reader, key, columns, sha256 in changed:
+            started = time.perf_counter()
+            df = reader(data_path)
+            _stage(cursor, table, columns, df)
+            counts[table] = _sync_order_items(cursor, columns) if key is None else _upsert_keyed(cursor, table, key, columns)
+            timings[table] = {"rows": None, "seconds": time.perf_counter() - started, "skipped": False}
+            fingerprints[table] = (source, sha256, len(df))
+        for table, source, reader, key, columns, sha256 in reversed(changed):
+            if key is not None:
+                started = time.perf_counter()
+                counts[table]["deleted"] = _delete_vanished(cursor, table, key)
+                timings[table]["seconds"] += time.perf_counter() - started
+        for table, *_ in changed:
+            timings[table]["rows"] = sum(counts[table].values())
+            _report(table, counts[table], timings[table]["seconds"])
+
+        add_postgres_indexes(cursor)
+        save_postgres_fingerprints(cursor, fingerprints)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    if fingerprints:
+        cursor = conn.cursor()
+        cursor.execute(f"ANALYZE {', '.join(fingerprints)};")
+        conn.commit()
+        cursor.close()
+    return timings
+
+
+# --- MongoDB ---
+
+def stored_mongo_fingerprint(db, target):
+    doc = db.load_fingerprints.find_one({"_id": target})
+    return (doc["sha256"], doc["row_count"]) if doc else None
+
+def save_mongo_fingerprint(db, target, source, sha256, rows):
+    db.load_fingerprints.replace_one(
+        {"_id": target},
+        {"source": source, "sha256": sha256, "row_count": rows, "loaded_at": time.time()},
+        upsert=True
+    )
+
+def sync_collection(collection, documents, key_fields, replace=True, derived=(), batch_size=MONGO_WRITE_BATCH_SIZE):
+    # Brings the collection in line with documents, keyed by key_fields. With
+    # replace=False existing documents are left as they are (only missing ones
+    # are inserted), for collections the application writes to. derived fields
+    # (products.rating) are maintained by a later load stage, so they do not
+    # count as a change; a replaced document gets them back from that stage.
+    def key_of(doc):
+        return tuple(doc.get(f) for f in key_fields)
+
+    def compared(doc):
+        return {k: v for k, v in doc.items() if k not in derived}
+
+    wanted = {key_of(doc): doc for doc in documents}
+    projection = {"_id": 0} | {f: 0 for f in derived} if replace else {f: 1 for f in key_fields} | {"_id": 0}
+    existing = {key_of(doc): doc for doc in collection.find({}, projection)}
+
+    requests = []
+    counts = {"inserted": 0, "updated": 0, "deleted": 0}
+    for key, doc in wanted.items():
+        current = existing.get(key)
+        selector = dict(zip(key_fields, key))
+        if current is None:
+            counts["inserted"] += 1
+            requests.append(ReplaceOne(selector, doc, upsert=True) if replace else UpdateOne(selector, {"$setOnInsert": doc}, upsert=True))
+        elif replace and current != compared(doc):
+            counts["updated"] += 1
+            requests.append(ReplaceOne(selector, doc, upsert=True))
+    for key in existing.keys() - wanted.keys():
+        counts["deleted"] += 1
+        requests.append(DeleteOne(dict(zip(key_fields, key))))
+
+    for i in range(0, len(requests), batch_size):
+        collection.bulk_write(requests[i:i + batch_size], ordered=False)
+    return counts
+
+def incremental_sync_mongo_source(db, target, source_path, build, key_fields, replace=True, derived=()):
+    # One collection of the hybrid loader; returns {"rows", "seconds", "skipped"}.
+    # build(path) -> documents.
+    started = time.perf_counter()
+    sha256 = file_fingerprint(source_path)
+    if stored_mongo_fingerprint(db, target) == (sha256, db[target].estimated_document_count()):
+        _report(target, None, 0)
+        return {"rows": 0, "seconds": time.perf_counter() - started, "skipped": True}
+    documents = build(source_path)
+    counts = sync_collection(db[target], documents, key_fields, replace=replace, derived=derived)
+    seconds = time.perf_counter() - started
+    _report(target, counts, seconds)
+    save_mongo_fingerprint(db, target, os.path.basename(source_path), sha256, db[target].estimated_document_count())
+    return {"rows": sum(counts.values()), "seconds": seconds, "skipped": False}
@@ -0,0 +1,383 @@
+# Shared implementation of the collection GET routes:
+#   no parameters        -> whole collection as one JSON array (original behaviour)
+#   ?limit=N[&after=KEY] -> one keyset page ordered by primary key; the key to pass
+#                           as ?after= for the next page is in the X-Next-After header
+#   ?stream=json|ndjson  -> whole collection (or from ?after= / up to ?limit=) written
+#                           out in chunks, so memory stays bounded by STREAM_BATCH_SIZE
+#   &cursor=keyset|server   -> how a PostgreSQL stream reads the table: one LIMIT
+#                           query per batch (default), or a single query read through
+#                           a named server-side cursor, which holds one connection and
+#                           snapshot for the whole response but skips the ORDER BY when
+#                           neither ?after= nor ?limit= is given
+#   &<filter>=VALUE      -> resources with "filters" (orders, order_items and the
+#                           document routes) return only matching rows; filters
+#                           combine with AND and with all of the above
+#   &fields=a,b          -> resources with selectable fields (the product documents)
+#                           send only those top-level fields of each document, plus
+#                           its key, e.g. ?fields=product_category_name,rating
+# PostgreSQL rows are serialized according to the json_mode argument (see
+# serializers.JSON_MODES); the faster modes skip the per-row dicts entirely.
+# Resources with a "document" column (common/pg_documents.py) send that JSONB
+# value as the row's body; the fast modes take its text straight from PostgreSQL.
+import uuid
+from itertools import chain, islice
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response, current_app, json, jsonify, stream_with_context
+
+from common.serializers import ascii_json, document_text_encoder, json_select_list, orjson_row_encoder
+
+STREAM_BATCH_SIZE = 1000
+MAX_PAGE_LIMIT = 10000
+STREAM_FORMATS = {"json": "application/json", "ndjson": "application/x-ndjson"}
+STREAM_CURSORS = ('keyset', 'server')
+# Ends a stream that failed after its headers were sent: an unterminated object,
+# which neither a JSON array nor an NDJSON reader accepts, so the client cannot
+# take a truncated body for a complete one.
+STREAM_ABORTED = '\n{"error": "Internal server error, response truncated"'
+
+
+def object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise ValueError(f"'{value}' is not a valid ObjectId")
+
+def parse_list_args(args, key_type=str):
+    limit = args.get('limit')
+    after = args.get('after')
+    stream = args.get('stream')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 1 <= limit <= MAX_PAGE_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_LIMIT}")
+    if after is not None:
+        try:
+            after = key_type(after)
+        except ValueError as e:
+            raise ValueError(f"Invalid after: {e}")
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise ValueError(f"stream must be one of {', '.join(STREAM_FORMATS)}")
+    return limit, after, stream
+
+def parse_fields_arg(fields, args):
+    # fields: the selectable fields, key first (documents.DOCUMENT_FIELDS). Returns
+    # the fields to send, or None to send whole rows; like other unknown
+    # parameters, ?fields= is ignored by resources without selectable fields.
+    value = args.get('fields')
+    if value is None or not fields:
+        return None
+    selected = [f for f in value.split(',') if f]
+    if not selected or any(f not in fields for f in selected):
+        raise ValueError(f"fields must list some of {', '.join(fields)}")
+    return list(dict.fromkeys(fields[:1] + selected))
+
+def projected_document_resource(resource, fields):
+    # The resource with its "document" narrowed to the given top-level keys; the
+    # names come from the resource's own "fields", so they are safe to inline.
+    keys = ", ".join(f"'{f}'" for f in fields)
+    document = f"(SELECT jsonb_object_agg(key, value) FROM jsonb_each({resource['document']}) WHERE key IN ({keys}))"
+    return {**resource, "document": document, "columns": [resource['key'], f"{document} AS doc"]}
+
+def parse_cursor_arg(args):
+    cursor = args.get('cursor', STREAM_CURSORS[0])
+    if cursor not in STREAM_CURSORS:
+        raise ValueError(f"cursor must be one of {', '.join(STREAM_CURSORS)}")
+    return cursor
+
+def parse_filter_args(resource, args):
+    # Returns [(condition, value)] in the order of resource['filters'].
+    filters = []
+    for name, (condition, parse) in resource.get('filters', {}).items():
+        value = args.get(name)
+        if value is None:
+            continue
+        try:
+            filters.append((condition, parse(value)))
+        except ValueError as e:
+            raise ValueError(f"Invalid {name}: {e}")
+    return filters
+
+def _encode_json_array(docs, batch_size, dumps):
+    yield '['
+    separator = ''
+    chunk = []
+    for doc in docs:
+        chunk.append(dumps(doc))
+        if len(chunk) >= batch_size:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    yield ']'
+
+def _encode_ndjson(docs, batch_size, dumps):
+    chunk = []
+    for doc in docs:
+        chunk.append(dumps(doc))
+        if len(chunk) >= batch_size:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+def _abort_on_stream_errors(body, label):
+    # Headers are already sent once streaming starts, so a failure ends the body
+    # with STREAM_ABORTED and is re-raised, which makes the server drop the
+    # connection instead of finishing the chunked response.
+    try:
+        yield from body
+    except Exception as e:
+        print(f"Error streaming {label}: {e}")
+        yield STREAM_ABORTED
+        raise
+
+def _already_encoded(doc):
+    return doc
+
+def streamed_response(docs, stream_format, label, batch_size=STREAM_BATCH_SIZE, encoded=False):
+    # encoded: docs are JSON strings already. The first batch is read before the
+    # response starts, so a query that fails right away still gets a 500.
+    docs = iter(docs)
+    try:
+        first = list(islice(docs, batch_size))
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    docs = chain(first, docs)
+    # One line per document, compact when jsonify is (JSON_COMPACT), which is
+    # also what the encoded fast modes give.
+    if encoded:
+        dumps = _already_encoded
+    elif current_app.json.compact:
+        dumps = lambda doc: json.dumps(doc, separators=(',', ':'))
+    else:
+        dumps = json.dumps
+    if stream_format == 'ndjson':
+        body = _encode_ndjson(docs, batch_size, dumps)
+    else:
+        body = _encode_json_array(docs, batch_size, dumps)
+    return Response(stream_with_context(_abort_on_stream_errors(body, label)), mimetype=STREAM_FORMATS[stream_format])
+
+def _list_query(resource, json_mode, after=False, ordered=False, limited=False, filters=()):
+    # Rows are the resource columns in 'python' mode, (document, key) in
+    # 'postgres' mode and the json_columns() in 'orjson' mode; document resources
+    # give (document text, key) in both fast modes. Parameters go in the order:
+    # filter values, after, limit.
+    key = resource['key']
+    document = resource.get('document')
+    if json_mode == 'python':
+        select = ", ".join(resource['columns'])
+    elif document:
+        select = f"{document}::text, {key}"
+    else:
+        select = json_select_list(resource)
+    query = f"SELECT {select} FROM {resource['table']}"
+    conditions = [condition for condition, _ in filters] + ([f"{key} > %s"] if after else [])
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if ordered:
+        query += f" ORDER BY {key}"
+    if limited:
+        query += " LIMIT %s"
+    if json_mode == 'postgres' and not document:
+        query = f"SELECT row_to_json(r)::text, r.{key} FROM ({query}) r"
+    return query
+
+def _key_index(resource, json_mode):
+    if json_mode == 'postgres' or (json_mode != 'python' and resource.get('document')):
+        return 1
+    columns = resource['columns'] if json_mode == 'python' else sorted(resource['columns'])
+    return columns.index(resource['key'])
+
+def _row_encoder(resource, json_mode):
+    # Row -> JSON text for the fast modes; None for 'python' (to_dict + Flask JSON).
+    if json_mode == 'python':
+        return None
+    if resource.get('document'):
+        encode = document_text_encoder()
+        return lambda row: encode(row[0])
+    if json_mode == 'postgres':
+        return lambda row: ascii_json(row[0])
+    return orjson_row_encoder(resource)
+
+def iter_postgres_rows(get_conn, release_conn, resource, after=None, limit=None, batch_size=STREAM_BATCH_SIZE, json_mode='python',
+                       filters=()):
+    # Walks the table in primary-key order one keyset batch at a time; the pooled
+    # connection is only held while a batch is fetched.
+    key_index = _key_index(resource, json_mode)
+    values = [value for _, value in filters]
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        conn = get_conn()
+        if not conn: raise RuntimeError("Failed to connect to PostgreSQL")
+        try:
+            cur = conn.cursor()
+            if after is None:
+                cur.execute(_list_query(resource, json_mode, ordered=True, limited=True, filters=filters), values + [size])
+            else:
+                cur.execute(_list_query(resource, json_mode, after=True, ordered=True, limited=True, filters=filters),
+                            values + [after, size])
+            rows = cur.fetchall()
+            cur.close()
+        finally:
+            release_conn(conn)
+        yield from rows
+        if len(rows) < size:
+            return
+        after = rows[-1][key_index]
+        if remaining is not None:
+            remaining -= len(rows)
+
+def iter_postgres_cursor_rows(get_conn, release_conn, resource, after=None, limit=None, batch_size=STREAM_BATCH_SIZE, json_mode='python',
+                              filters=()):
+    # One SELECT read through a named (server-side) cursor: PostgreSQL keeps the
+    # result and hands it over batch_size rows per fetchmany(), so neither side
+    # materializes the whole table and the first rows leave before the scan ends.
+    query = _list_query(resource, json_mode, after=after is not None,
+                        ordered=after is not None or limit is not None, limited=limit is not None, filters=filters)
+    params = [value for _, value in filters] + [p for p in (after, limit) if p is not None]
+    conn = get_conn()
+    if not conn: raise RuntimeError("Failed to connect to PostgreSQL")
+    try:
+        cur = conn.cursor(name=f"stream_{resource['table']}_{uuid.uuid4().hex}")
+        cur.itersize = batch_size
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cur.close()
+    finally:
+        # Also reached when the client disconnects mid-stream; ending the
+        # transaction closes the cursor if it is still open. A connection that
+        # cannot even roll back (e.g. it dropped) is discarded, not pooled.
+        discard = False
+        try:
+            conn.rollback()
+        except Exception as e:
+            print(f"Error ending the {resource['table']} stream transaction: {e}")
+            discard = True
+        finally:
+            release_conn(conn, discard=discard)
+
+def postgres_list_response(resource, args, get_conn, release_conn, label, json_mode='python'):
+    try:
+        limit, after, stream = parse_list_args(args, resource['key_type'])
+        cursor = parse_cursor_arg(args)
+        filters = parse_filter_args(resource, args)
+        fields = parse_fields_arg(resource.get('fields'), args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if fields:
+        resource = projected_document_resource(resource, fields)
+    values = [value for _, value in filters]
+    to_dict = resource['to_dict']
+    encode = _row_encoder(resource, json_mode)
+
+    def list_response(rows):
+        if encode is None:
+            return jsonify([to_dict(r) for r in rows])
+        # Same framing as jsonify's compact output, trailing newline included.
+        return Response('[' + ','.join([encode(r) for r in rows]) + ']\n', mimetype='application/json')
+
+    if stream:
+        iter_rows = iter_postgres_cursor_rows if cursor == 'server' else iter_postgres_rows
+        rows = iter_rows(get_conn, release_conn, resource, after=after, limit=limit, json_mode=json_mode, filters=filters)
+        if encode is None:
+            return streamed_response((to_dict(r) for r in rows), stream, label)
+        return streamed_response((encode(r) for r in rows), stream, label, encoded=True)
+
+    if limit is not None:
+        try:
+            rows = list(iter_postgres_rows(get_conn, release_conn, resource, after=after, limit=limit, batch_size=limit,
+                                           json_mode=json_mode, filters=filters))
+        except Exception as e:
+            print(f"Error fetching {label}: {e}")
+            return jsonify({"error": "Internal server error"}), 500
+        response = list_response(rows)
+        if len(rows) == limit:
+            response.headers['X-Next-After'] = str(rows[-1][_key_index(resource, json_mode)])
+        return response
+
+    conn = get_conn()
+    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
+    try:
+        cur = conn.cursor()
+        if after is None:
+            cur.execute(_list_query(resource, json_mode, filters=filters), values)
+        else:
+            cur.execute(_list_query(resource, json_mode, after=True, ordered=True, filters=filters), values + [after])
+        rows = cur.fetchall()
+        cur.close()
+        return list_response(rows)
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        if conn: release_conn(conn)
+
+def parse_mongo_filter_args(filters, args):
+    # filters: {parameter: (field, parser)}, e.g. documents.DOCUMENT_FILTERS.
+    query = {}
+    for name, (field, parse) in (filters or {}).items():
+        value = args.get(name)
+        if value is None:
+            continue
+        try:
+            query[field] = parse(value)
+        except ValueError as e:
+            raise ValueError(f"Invalid {name}: {e}")
+    return query
+
+def mongo_projection(fields, with_id=False):
+    # find() projection for parse_fields_arg's result.
+    projection = {f: 1 for f in fields or ()}
+    if not with_id:
+        projection["_id"] = 0
+    return projection or None
+
+def mongo_list_response(collection, args, label, batch_size=STREAM_BATCH_SIZE, filters=None, fields=None):
+    # MongoDB documents are paged on _id, the collection's primary key.
+    try:
+        limit, after, stream = parse_list_args(args, object_id)
+        query = parse_mongo_filter_args(filters, args)
+        fields = parse_fields_arg(fields, args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    projection = mongo_projection(fields)
+    try:
+        if stream:
+            cursor = collection.find(query, projection, batch_size=batch_size)
+            if after is not None or limit is not None:
+                cursor = cursor.sort("_id", 1)
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            return streamed_response(cursor, stream, label, batch_size)
+
+        if limit is not None:
+            docs = list(collection.find(query, mongo_projection(fields, with_id=True)).sort("_id", 1).limit(limit))
+            last_id = docs[-1]["_id"] if docs else None
+            for doc in docs:
+                del doc["_id"]
+            response = jsonify(docs)
+            if len(docs) == limit:
+                response.headers['X-Next-After'] = str(last_id)
+            return response
+
+        cursor = collection.find(query, projection)
+        if after is not None:
+            cursor = cursor.sort("_id", 1)
+        return jsonify(list(cursor))
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
@@ -0,0 +1,263 @@
+# Per-request phase timings for the Flask apps, aggregated into histograms per
+# route and exported in the Prometheus text format on /metrics. Phases:
+#   postgres/mongo acquire  - waiting for a pooled connection
+#   postgres/mongo execute  - running statements / commands
+#   postgres/mongo fetch    - reading result rows (fetch*, getMore)
+#   app serialize           - JSON encoding (jsonify and the streaming encoder)
+#   app python              - the rest of the view: row -> dict loops, validation, ...
+#   app send                - from the view returning until the body is written,
+#                             minus database/serialize time spent by a streamed body
+#   app total               - whole request
+# Histograms are per process; with several workers scrape each one or sum them.
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2.extensions
+from flask import Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from pymongo import monitoring
+
+PHASE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_QUERIES_PER_REQUEST = 100 # statements kept for the slow-request log
+SLOW_QUERY_TEXT_LIMIT = 500
+
+
+class _RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.handler_done = None
+        self.attributed_in_handler = 0.0
+        self.phases = {}   # (backend, phase) -> seconds
+        self.queries = []  # (seconds, backend, statement) for the slow-request log
+        self.pending = {}  # MongoDB request_id -> command summary
+
+    def add(self, backend, phase, seconds, statement=None):
+        key = (backend, phase)
+        self.phases[key] = self.phases.get(key, 0.0) + seconds
+        if statement is not None and len(self.queries) < MAX_QUERIES_PER_REQUEST:
+            self.queries.append((seconds, backend, statement))
+
+    def attributed(self):
+        return sum(self.phases.values())
+
+
+def _current_timing():
+    return g.get('_request_timing') if has_request_context() else None
+
+def record_phase(backend, phase, seconds, statement=None):
+    timing = _current_timing()
+    if timing is not None:
+        timing.add(backend, phase, seconds, statement)
+
+@contextmanager
+def timed_phase(backend, phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(backend, phase, time.perf_counter() - started)
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    # cursor_factory for the pools: times execute/fetch calls made while serving a
+    # request. For named (server-side) cursors execute only declares the cursor and
+    # the scan shows up as fetch time.
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_phase('postgres', 'execute', time.perf_counter() - started, self.query or query)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_phase('postgres', 'execute', time.perf_counter() - started, query)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_phase('postgres', 'execute', time.perf_counter() - started, sql)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_phase('postgres', 'fetch', time.perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            record_phase('postgres', 'fetch', time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_phase('postgres', 'fetch', time.perf_counter() - started)
+
+
+class MongoTimingListener(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    # Synchronous PyMongo publishes events on the thread running the operation,
+    # so they can be attributed to the current request.
+    def started(self, event):
+        timing = _current_timing()
+        if timing is not None:
+            command = event.command
+            timing.pending[event.request_id] = (
+                f"{event.command_name} {command.get(event.command_name)} {command.get('filter', '')}"
+            )
+
+    def _finished(self, event):
+        timing = _current_timing()
+        if timing is not None:
+            statement = timing.pending.pop(event.request_id, event.command_name)
+            phase = 'fetch' if event.command_name == 'getMore' else 'execute'
+            timing.add('mongo', phase, event.duration_micros / 1e6, statement)
+
+    def succeeded(self, event): self._finished(event)
+    def failed(self, event): self._finished(event)
+
+    def connection_checked_out(self, event):
+        if event.duration is not None:
+            record_phase('mongo', 'acquire', event.duration)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            record_phase('app', 'serialize', time.perf_counter() - started)
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+class RequestMetrics:
+    def __init__(self, slow_request_seconds=None, buckets=PHASE_BUCKETS, prefix='ecom'):
+        self.slow_request_seconds = slow_request_seconds
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}  # (route, method, backend, phase) -> [count per bucket..., +Inf, sum]
+        self._requests = {}    # (route, method, status) -> count
+        self.slow_requests = 0
+
+    def init_app(self, app, path='/metrics'):
+        provider = TimedJSONProvider(app)
+        for setting in ('sort_keys', 'compact', 'ensure_ascii', 'mimetype'):
+            setattr(provider, setting, getattr(app.json, setting))
+        app.json = provider
+        app.before_request(self._start)
+        app.after_request(self._after)
+        app.add_url_rule(path, 'metrics', self.metrics_view)
+
+    def _start(self):
+        if request.endpoint != 'metrics':
+            g._request_timing = _RequestTiming()
+
+    def _after(self, response):
+        timing = g.get('_request_timing')
+        if timing is None or timing.handler_done is not None:
+            return response
+        timing.handler_done = time.perf_counter()
+        timing.attributed_in_handler = timing.attributed()
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        method, path = request.method, request.full_path.rstrip('?')
+        # Runs once the server has written (or streamed) the whole body.
+        response.call_on_close(lambda: self._finish(timing, route, method, path, response.status_code))
+        return response
+
+    def _finish(self, timing, route, method, path, status):
+        finished = time.perf_counter()
+        total = finished - timing.started
+        in_handler = timing.handler_done - timing.started
+        after_handler = timing.attributed() - timing.attributed_in_handler
+        phases = dict(timing.phases)
+        phases[('app', 'python')] = max(0.0, in_handler - timing.attributed_in_handler)
+        phases[('app', 'send')] = max(0.0, finished - timing.handler_done - after_handler)
+        phases[('app', 'total')] = total
+        with self._lock:
+            for (backend, phase), seconds in phases.items():
+                self._observe((route, method, backend, phase), seconds)
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+        if self.slow_request_seconds is not None and total >= self.slow_request_seconds:
+            self._log_slow(timing, method, path, status, total, phases)
+
+    def _observe(self, key, seconds):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[len(self.buckets)] += 1
+        histogram[-1] += seconds
+
+    def _log_slow(self, timing, method, path, status, total, phases):
+        with self._lock:
+            self.slow_requests += 1
+        breakdown = ", ".join(f"{backend} {phase} {seconds * 1000:.1f}"
+                              for (backend, phase), seconds in sorted(phases.items()) if phase != 'total')
+        message = f"Slow request: {method} {path} -> {status} in {total * 1000:.1f} ms ({breakdown})"
+        if timing.queries:
+            seconds, backend, statement = max(timing.queries, key=lambda q: q[0])
+            if isinstance(statement, bytes):
+                statement = statement.decode('utf-8', 'replace')
+            statement = " ".join(str(statement).split())[:SLOW_QUERY_TEXT_LIMIT]
+            message += f"; slowest {backend} query {seconds * 1000:.1f} ms: {statement}"
+        print(message)
+
+    def render(self):
+        name = f"{self.prefix}_request_phase_seconds"
+        lines = [f"# HELP {name} Time spent in each phase of a request.", f"# TYPE {name} histogram"]
+        with self._lock:
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+            requests = dict(self._requests)
+            slow_requests = self.slow_requests
+        for (route, method, backend, phase), histogram in sorted(histograms.items()):
+            labels = _labels(route=route, method=method, backend=backend, phase=phase)
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram[len(self.buckets)]}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram[-1]}")
+            lines.append(f"{name}_count{{{labels}}} {histogram[len(self.buckets)]}")
+        name = f"{self.prefix}_requests_total"
+        lines += [f"# HELP {name} Requests served, by route and status.", f"# TYPE {name} counter"]
+        for (route, method, status), count in sorted(requests.items()):
+            lines.append(f"{name}{{{_labels(route=route, method=method, status=status)}}} {count}")
+        name = f"{self.prefix}_slow_requests_total"
+        lines += [f"# HELP {name} Requests slower than the slow-request threshold.", f"# TYPE {name} counter",
+                  f"{name} {slow_requests}"]
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
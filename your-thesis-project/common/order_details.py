@@ -0,0 +1,125 @@
+# Cross-store order details for the hybrid backend: orders and their items come
+# from PostgreSQL in one query, the products and reviews they reference from
+# MongoDB in one $in query each. A request therefore costs three round trips no
+# matter how many orders or items it covers.
+import threading
+import time
+from collections import OrderedDict
+
+from common.serializers import POSTGRES_RESOURCES, order_item_row_to_dict, order_row_to_dict
+
+_ORDER_COLUMNS = POSTGRES_RESOURCES['orders']['columns']
+_ITEM_COLUMNS = POSTGRES_RESOURCES['order_items']['columns']
+
+ORDER_DETAILS_SQL = f"""
+    SELECT {', '.join('o.' + c for c in _ORDER_COLUMNS)}, {', '.join('oi.' + c for c in _ITEM_COLUMNS)}
+    FROM orders o
+    LEFT JOIN order_items oi ON oi.order_id = o.order_id
+    WHERE o.order_id = ANY(%s)
+    ORDER BY o.order_id, oi.order_item_id;
+"""
+# asyncpg uses numbered placeholders.
+ORDER_DETAILS_SQL_ASYNC = ORDER_DETAILS_SQL.replace('%s', '$1')
+
+
+class ProductLRU:
+    # Bounded in-process cache of product documents keyed by product_id. The
+    # API's own product writes discard their entries, but other processes,
+    # loaders and rating refreshes do not reach this one, so entries also expire
+    # after ttl seconds.
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # product_id -> (expires_at, product)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, product_ids):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for product_id in product_ids:
+                entry = self._entries.get(product_id)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    del self._entries[product_id]
+                    continue
+                self._entries.move_to_end(product_id)
+                found[product_id] = entry[1]
+            self.hits += len(found)
+            self.misses += len(product_ids) - len(found)
+        return found
+
+    def put_many(self, products):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for product_id, product in products.items():
+                self._entries[product_id] = (expires_at, product)
+                self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, product_id=None):
+        # No id: drop everything (e.g. after a bulk write).
+        with self._lock:
+            if product_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(product_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses}
+
+
+def group_order_rows(rows):
+    # Returns {order_id: order dict with an "items" list}, ordered by order_id.
+    orders = {}
+    width = len(_ORDER_COLUMNS)
+    for row in rows:
+        order = orders.get(row[0])
+        if order is None:
+            order = orders[row[0]] = order_row_to_dict(row[:width])
+            order["items"] = []
+        if row[width] is not None:  # LEFT JOIN row of an order without items
+            order["items"].append(order_item_row_to_dict(row[width:]))
+    return orders
+
+def fetch_orders_with_items(cur, order_ids):
+    cur.execute(ORDER_DETAILS_SQL, (list(order_ids),))
+    return group_order_rows(cur.fetchall())
+
+def referenced_product_ids(orders):
+    return {item["product_id"] for order in orders.values() for item in order["items"] if item["product_id"]}
+
+def attach_products(orders, products):
+    for order in orders.values():
+        for item in order["items"]:
+            item["product"] = products.get(item["product_id"])
+
+def attach_reviews(orders, reviews):
+    for order in orders.values():
+        order["reviews"] = []
+    for review in reviews:
+        if review["order_id"] in orders:
+            orders[review["order_id"]]["reviews"].append(review)
+
+def fetch_products(db, product_ids, product_cache=None):
+    product_ids = list(product_ids)
+    products = product_cache.get_many(product_ids) if product_cache is not None else {}
+    missing = [p for p in product_ids if p not in products]
+    if missing:
+        fetched = {p["product_id"]: p for p in db.products.find({"product_id": {"$in": missing}}, {"_id": 0})}
+        if product_cache is not None:
+            product_cache.put_many(fetched)
+        products.update(fetched)
+    return products
+
+def attach_products_and_reviews(orders, db, product_cache=None):
+    product_ids = referenced_product_ids(orders)
+    attach_products(orders, fetch_products(db, product_ids, product_cache) if product_ids else {})
+    attach_reviews(orders, db.reviews.find({"order_id": {"$in": list(orders)}}, {"_id": 0}) if orders else [])
+    return orders
@@ -0,0 +1,95 @@
+# Single-record GET/POST/PUT/DELETE for the PostgreSQL resources in
+# serializers.POSTGRES_RESOURCES. Every statement is a primary-key lookup, so
+# each request is one index probe plus (for writes) one commit.
+import uuid
+
+import psycopg2
+import psycopg2.errors
+from flask import jsonify
+
+
+def _clean_body(resource, body, key=None):
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    data = {c: body[c] for c in resource['columns'] if c in body and c != resource['key']}
+    if key is not None and body.get(resource['key']) not in (None, key):
+        raise ValueError(f"{resource['key']} in body does not match the URL")
+    return data
+
+def fetch_row(cur, resource, key):
+    cur.execute(f"SELECT {', '.join(resource['columns'])} FROM {resource['table']} WHERE {resource['key']} = %s;", (key,))
+    return cur.fetchone()
+
+def insert_row(cur, resource, key, data):
+    values = dict(data)
+    values[resource['key']] = key
+    columns = list(values)
+    cur.execute(
+        f"INSERT INTO {resource['table']} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"RETURNING {', '.join(resource['columns'])};",
+        [values[c] for c in columns]
+    )
+    return cur.fetchone()
+
+def update_row(cur, resource, key, data):
+    if not data:
+        return fetch_row(cur, resource, key)
+    assignments = ", ".join(f"{c} = %s" for c in data)
+    cur.execute(
+        f"UPDATE {resource['table']} SET {assignments} WHERE {resource['key']} = %s RETURNING {', '.join(resource['columns'])};",
+        list(data.values()) + [key]
+    )
+    return cur.fetchone()
+
+def delete_row(cur, resource, key):
+    for child_table, child_column in resource.get('children', ()):
+        cur.execute(f"DELETE FROM {child_table} WHERE {child_column} = %s;", (key,))
+    cur.execute(f"DELETE FROM {resource['table']} WHERE {resource['key']} = %s RETURNING {resource['key']};", (key,))
+    return cur.fetchone() is not None
+
+def postgres_item_response(resource, key, method, body, get_conn, release_conn, label):
+    # POST without a key in the URL takes it from the body or generates one.
+    if method == 'POST' and key is None:
+        key = (body or {}).get(resource['key']) if isinstance(body, dict) else None
+        key = key or uuid.uuid4().hex
+    try:
+        key = resource['key_type'](key)
+        data = _clean_body(resource, body, key) if method in ('POST', 'PUT') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_conn()
+    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
+    try:
+        cur = conn.cursor()
+        if method == 'GET':
+            row = fetch_row(cur, resource, key)
+            result = (jsonify(resource['to_dict'](row)), 200) if row else None
+        elif method == 'POST':
+            row = insert_row(cur, resource, key, data)
+            result = jsonify(resource['to_dict'](row)), 201
+        elif method == 'PUT':
+            row = update_row(cur, resource, key, data)
+            result = (jsonify(resource['to_dict'](row)), 200) if row else None
+        else:
+            result = (jsonify({"message": f"{label.capitalize()} deleted", resource['key']: key}), 200) if delete_row(cur, resource, key) else None
+        conn.commit()
+        cur.close()
+        if result is None:
+            return jsonify({"error": f"{label.capitalize()} '{key}' not found"}), 404
+        return result
+    except psycopg2.errors.UniqueViolation:
+        conn.rollback()
+        return jsonify({"error": f"{label.capitalize()} '{key}' already exists"}), 409
+    except psycopg2.errors.ForeignKeyViolation as e:
+        conn.rollback()
+        return jsonify({"error": f"{label.capitalize()} '{key}' violates a reference: {e.diag.message_detail}"}), 409
+    except (psycopg2.DataError, psycopg2.errors.NotNullViolation) as e:
+        conn.rollback()
+        return jsonify({"error": f"Invalid {label} data: {e.diag.message_primary}"}), 400
+    except Exception as e:
+        conn.rollback()
+        print(f"Error handling {method} {label} {key}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        if conn: release_conn(conn)
@@ -0,0 +1,363 @@
+# JSONB document mode of the PostgreSQL-only backend: the product, review and
+# user profile documents of the hybrid backend's MongoDB collections (built by
+# common/documents.py), stored one per row in a JSONB column, so document
+# workloads run against both engines with the same clients and bodies.
+#   product_documents      - primary key product_id, generated from the document
+#   review_documents       - surrogate doc_id (a few Olist orders carry several
+#                            reviews, and review_id repeats across orders)
+#   user_profile_documents - primary key customer_id, generated from the document
+# The list filters of /products and /reviews (documents.DOCUMENT_FILTERS) are
+# containment queries, doc @> '{"tags": ["x"]}', served by a GIN jsonb_path_ops
+# index like MongoDB's multikey indexes; the reviews' order_id lookup gets a
+# B-tree expression index instead. Datetimes are stored as Flask renders them
+# (HTTP dates), so the routes send doc as it is; JSONB keeps object keys ordered
+# by length rather than alphabetically, which only the fast JSON modes show.
+# Every load ends by recomputing the products' review summaries ("rating", see
+# common/ratings.py) from review_documents and order_items.
+import json
+import os
+import time
+import uuid
+from datetime import date
+
+import pandas as pd
+import psycopg2
+import psycopg2.errors
+from flask import jsonify
+from psycopg2.extras import Json, execute_values
+from werkzeug.http import http_date
+
+from common.bulk import _read_items, _result, bulk_response, prepare_bulk_items
+from common.documents import (PRODUCT_DOCUMENT_FIELDS, PRODUCT_FIELDS, build_product_documents, build_review_documents,
+                              build_user_profile_documents, empty_product_rating, product_document_from_fields,
+                              user_profile_document)
+from common.pg_loader import (CHANGE_VERSION_TRIGGER, CHANGE_VERSIONS_DDL, LOAD_METHODS, copy_dataframe, insert_dataframe_values,
+                              save_postgres_fingerprints)
+from common.ratings import PRODUCT_RATINGS_SQL
+from common.snapshots import file_fingerprint, read_olist_csv
+
+DOCUMENT_TABLE_DDL = {
+    'product_documents': """
+        CREATE TABLE product_documents (
+            product_id VARCHAR(50) GENERATED ALWAYS AS (doc->>'product_id') STORED, doc JSONB NOT NULL
+        );
+    """,
+    'review_documents': """
+        CREATE TABLE review_documents (doc_id BIGSERIAL, doc JSONB NOT NULL);
+    """,
+    'user_profile_documents': """
+        CREATE TABLE user_profile_documents (
+            customer_id VARCHAR(50) GENERATED ALWAYS AS (doc->>'customer_id') STORED, doc JSONB NOT NULL
+        );
+    """,
+}
+# Keys and indexes, created after the COPY like the relational tables'.
+DOCUMENT_INDEXES = {
+    'product_documents': [
+        "ALTER TABLE product_documents ADD CONSTRAINT product_documents_pkey PRIMARY KEY (product_id);",
+        "CREATE INDEX product_documents_doc_idx ON product_documents USING GIN (doc jsonb_path_ops);",
+    ],
+    'review_documents': [
+        "ALTER TABLE review_documents ADD CONSTRAINT review_documents_pkey PRIMARY KEY (doc_id);",
+        "CREATE INDEX review_documents_doc_idx ON review_documents USING GIN (doc jsonb_path_ops);",
+        "CREATE INDEX review_documents_order_id_idx ON review_documents ((doc->>'order_id'));",
+    ],
+    'user_profile_documents': [
+        "ALTER TABLE user_profile_documents ADD CONSTRAINT user_profile_documents_pkey PRIMARY KEY (customer_id);",
+    ],
+}
+# (table, source CSV, document builder) in load order. As in the hybrid loader,
+# an incremental load only adds and removes user profiles, never overwrites
+# them, since the API owns their contents once created.
+DOCUMENT_SOURCES = [
+    ('product_documents', 'olist_products_dataset.csv', build_product_documents),
+    ('review_documents', 'olist_order_reviews_dataset.csv', build_review_documents),
+    ('user_profile_documents', 'olist_customers_dataset.csv', build_user_profile_documents),
+]
+
+
+def _document(row):
+    return row[1]
+
+# List routes of document mode; the "document" column is sent as the body of
+# each row (see common/listing.py).
+DOCUMENT_RESOURCES = {
+    "products": {
+        "table": "product_documents", "key": "product_id", "key_type": str, "document": "doc",
+        "columns": ["product_id", "doc"], "to_dict": _document, "fields": PRODUCT_DOCUMENT_FIELDS,
+        "filters": {
+            "product_category_name": ("doc @> %s", lambda value: Json({"product_category_name": value})),
+            "tag": ("doc @> %s", lambda value: Json({"tags": [value]})),
+        },
+    },
+    "reviews": {
+        "table": "review_documents", "key": "doc_id", "key_type": int, "document": "doc",
+        "columns": ["doc_id", "doc"], "to_dict": _document,
+        "filters": {
+            "order_id": ("doc->>'order_id' = %s", str),
+            "review_score": ("doc @> %s", lambda value: Json({"review_score": int(value)})),
+        },
+    },
+    "user_profiles": {
+        "table": "user_profile_documents", "key": "customer_id", "key_type": str, "document": "doc",
+        "columns": ["customer_id", "doc"], "to_dict": _document,
+    },
+}
+
+
+def _json_default(value):
+    # Same rendering as Flask's JSON provider, so loaded and served bodies match.
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def document_json(document):
+    return json.dumps(document, default=_json_default)
+
+def _documents_frame(documents):
+    return pd.DataFrame({"doc": [document_json(d) for d in documents]}, dtype=object)
+
+def _report(table, rows, seconds):
+    rate = rows / seconds if seconds > 0 else float('inf')
+    print(f"  {table}: {rows} documents in {seconds:.2f}s ({rate:,.0f} documents/s)")
+
+def _stored_fingerprints(cursor):
+    cursor.execute("SELECT to_regclass('load_fingerprints') IS NOT NULL;")
+    if not cursor.fetchone()[0]:
+        return {}
+    cursor.execute("SELECT target, sha256, row_count FROM load_fingerprints;")
+    return {target: (sha256, rows) for target, sha256, rows in cursor.fetchall()}
+
+def _sync_user_profiles(cursor, write, df):
+    # Adds profiles of new customers and removes those of vanished ones.
+    cursor.execute("CREATE TEMP TABLE stage_user_profile_documents (doc JSONB NOT NULL) ON COMMIT DROP;")
+    write(cursor, 'stage_user_profile_documents', df)
+    cursor.execute("INSERT INTO user_profile_documents (doc) SELECT doc FROM stage_user_profile_documents "
+                   "ON CONFLICT (customer_id) DO NOTHING;")
+    cursor.execute("DELETE FROM user_profile_documents p WHERE NOT EXISTS ("
+                   "SELECT 1 FROM stage_user_profile_documents s WHERE s.doc->>'customer_id' = p.customer_id);")
+
+_REVIEW_SCORES = "(SELECT doc->>'order_id' AS order_id, (doc->>'review_score')::int AS review_score FROM review_documents)"
+
+def refresh_product_document_ratings(cursor):
+    # Sets the rating of every product document whose summary changed; returns
+    # the number of documents updated.
+    cursor.execute(f"""
+        WITH ratings AS ({PRODUCT_RATINGS_SQL.format(reviews=_REVIEW_SCORES, where='')})
+        UPDATE product_documents p SET doc = jsonb_set(p.doc, ARRAY['rating'], coalesce(r.rating, %(empty)s::jsonb))
+        FROM product_documents d LEFT JOIN ratings r ON r.product_id = d.product_id
+        WHERE p.product_id = d.product_id AND p.doc->'rating' IS DISTINCT FROM coalesce(r.rating, %(empty)s::jsonb);
+    """, {"empty": Json(empty_product_rating())})
+    return cursor.rowcount
+
+def load_postgres_documents(conn, data_path, method='copy', incremental=False):
+    # Recreates and fills the document tables in one transaction. With
+    # incremental=True existing tables are kept, unchanged CSVs skipped and the
+    # documents of changed ones replaced. Returns {table: {"rows", "seconds", "skipped"}}.
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Unknown load method '{method}', expected one of {LOAD_METHODS}")
+    write = copy_dataframe if method == 'copy' else insert_dataframe_values
+    timings = {}
+    fingerprints = {}
+    cursor = conn.cursor()
+    try:
+        for ddl in CHANGE_VERSIONS_DDL:
+            cursor.execute(ddl)
+        stored = _stored_fingerprints(cursor) if incremental else {}
+        print(f"Loading PostgreSQL document tables ({method}{', incremental' if incremental else ''})...")
+        for table, source, build in DOCUMENT_SOURCES:
+            started = time.perf_counter()
+            path = os.path.join(data_path, source)
+            sha256 = file_fingerprint(path)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+            exists = incremental and cursor.fetchone()[0]
+            if exists:
+                cursor.execute(f"SELECT count(*) FROM {table};")
+                if stored.get(table) == (sha256, cursor.fetchone()[0]):
+                    timings[table] = {"rows": 0, "seconds": 0.0, "skipped": True}
+                    print(f"  {table}: unchanged, skipped")
+                    continue
+
+            df = _documents_frame(build(read_olist_csv(path)))
+            if exists and table == 'user_profile_documents':
+                _sync_user_profiles(cursor, write, df)
+            elif exists:
+                cursor.execute(f"TRUNCATE {table};")
+                write(cursor, table, df)
+            else:
+                cursor.execute(f"DROP TABLE IF EXISTS {table};")
+                cursor.execute(DOCUMENT_TABLE_DDL[table])
+                cursor.execute(CHANGE_VERSION_TRIGGER.format(table=table))
+                write(cursor, table, df)
+                for statement in DOCUMENT_INDEXES[table]:
+                    cursor.execute(statement)
+            cursor.execute(f"SELECT count(*) FROM {table};")
+            fingerprints[table] = (source, sha256, cursor.fetchone()[0])
+            timings[table] = {"rows": len(df), "seconds": time.perf_counter() - started, "skipped": False}
+            _report(table, len(df), timings[table]["seconds"])
+        started = time.perf_counter()
+        rows = refresh_product_document_ratings(cursor)
+        timings["product_ratings"] = {"rows": rows, "seconds": time.perf_counter() - started, "skipped": False}
+        print(f"  product ratings: {rows} documents updated in {timings['product_ratings']['seconds']:.2f}s")
+        if fingerprints:
+            save_postgres_fingerprints(cursor, fingerprints)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    if fingerprints:
+        cursor = conn.cursor()
+        cursor.execute(f"ANALYZE {', '.join(fingerprints)};")
+        conn.commit()
+        cursor.close()
+    return timings
+
+
+# --- Product documents (GET/POST/PUT/DELETE /products/<id>, POST /products/_bulk) ---
+
+def _merged_product(document, fields):
+    # Flat fields changed, specs/tags rebuilt from them; the rating and other
+    # keys are kept.
+    values = {f: document.get(f) for f in PRODUCT_FIELDS}
+    values.update({f: fields[f] for f in PRODUCT_FIELDS[1:] if f in fields})
+    merged = {**document, **product_document_from_fields(values)}
+    merged["rating"] = document.get("rating", merged["rating"])
+    return merged
+
+def postgres_product_document_response(product_id, method, body, get_conn, release_conn):
+    # Mirrors the hybrid backend's MongoDB product_item route.
+    if method in ('POST', 'PUT') and not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    if method == 'POST':
+        product_id = product_id or body.get('product_id') or uuid.uuid4().hex
+    if body and body.get('product_id') not in (None, product_id):
+        return jsonify({"error": "product_id in body does not match the URL"}), 400
+
+    conn = get_conn()
+    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
+    try:
+        cur = conn.cursor()
+        if method == 'GET':
+            cur.execute("SELECT doc FROM product_documents WHERE product_id = %s;", (product_id,))
+        elif method == 'POST':
+            cur.execute("INSERT INTO product_documents (doc) VALUES (%s) RETURNING doc;",
+                        (Json(product_document_from_fields({**body, "product_id": product_id})),))
+        elif method == 'PUT':
+            cur.execute("SELECT doc FROM product_documents WHERE product_id = %s FOR UPDATE;", (product_id,))
+        else:
+            cur.execute("DELETE FROM product_documents WHERE product_id = %s RETURNING product_id;", (product_id,))
+        row = cur.fetchone()
+        if method == 'PUT' and row and any(f in body for f in PRODUCT_FIELDS[1:]):
+            cur.execute("UPDATE product_documents SET doc = %s WHERE product_id = %s RETURNING doc;",
+                        (Json(_merged_product(row[0], body)), product_id))
+            row = cur.fetchone()
+        conn.commit()
+        cur.close()
+        if row is None:
+            return jsonify({"error": f"Product '{product_id}' not found"}), 404
+        if method == 'DELETE':
+            return jsonify({"message": "Product deleted", "product_id": product_id}), 200
+        return jsonify(row[0]), 201 if method == 'POST' else 200
+    except psycopg2.errors.UniqueViolation:
+        conn.rollback()
+        return jsonify({"error": f"Product '{product_id}' already exists"}), 409
+    except psycopg2.DataError as e:
+        conn.rollback()
+        return jsonify({"error": f"Invalid product data: {e.diag.message_primary}"}), 400
+    except Exception as e:
+        conn.rollback()
+        print(f"Error handling {method} product {product_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        if conn: release_conn(conn)
+
+def postgres_product_documents_bulk_response(data, mimetype, get_conn, release_conn):
+    # One transaction: existing documents are locked and read with one query,
+    # then one multi-row INSERT, UPDATE and DELETE apply the items.
+    items, error = _read_items(data, mimetype)
+    if error: return error
+    results, operations = prepare_bulk_items(items, 'product_id', PRODUCT_FIELDS)
+    if not operations:
+        return bulk_response(results)
+
+    conn = get_conn()
+    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
+    try:
+        cur = conn.cursor()
+        keys = [key for _, op, key, _ in operations if op != 'create']
+        cur.execute("SELECT product_id, doc FROM product_documents WHERE product_id = ANY(%s) FOR UPDATE;", (keys,))
+        existing = dict(cur.fetchall())
+        creates, updates, deletes = [], [], []
+        for position, op, key, data in operations:
+            if op != 'create' and key not in existing:
+                _result(results, position, 404, f"Product '{key}' not found")
+            elif op == 'create':
+                creates.append((position, key, Json(product_document_from_fields({**data, "product_id": key}))))
+            elif op == 'update' and data:
+                updates.append((position, key, Json(_merged_product(existing[key], data))))
+            elif op == 'update':
+                _result(results, position, 200)
+            else:
+                deletes.append((position, key))
+
+        created = set()
+        if creates:
+            created = {row[0] for row in execute_values(
+                cur, "INSERT INTO product_documents (doc) VALUES %s ON CONFLICT (product_id) DO NOTHING RETURNING product_id",
+                [(doc,) for _, _, doc in creates], page_size=len(creates), fetch=True
+            )}
+        if updates:
+            execute_values(cur, "UPDATE product_documents t SET doc = v.doc FROM (VALUES %s) v (product_id, doc) "
+                                "WHERE t.product_id = v.product_id",
+                           [(key, doc) for _, key, doc in updates], template="(%s, %s::jsonb)", page_size=len(updates))
+        if deletes:
+            cur.execute("DELETE FROM product_documents WHERE product_id = ANY(%s);", ([key for _, key in deletes],))
+        conn.commit()
+        cur.close()
+    except psycopg2.DataError as e:
+        conn.rollback()
+        return jsonify({"error": f"Invalid product data: {e.diag.message_primary}"}), 400
+    except Exception as e:
+        conn.rollback()
+        print(f"Error handling bulk product request: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        if conn: release_conn(conn)
+
+    for position, key, _ in creates:
+        if key in created:
+            _result(results, position, 201)
+        else:
+            _result(results, position, 409, f"Product '{key}' already exists")
+    for position, *_ in updates + deletes:
+        _result(results, position, 200)
+    return bulk_response(results)
+
+
+# --- User profile documents, paired with the relational customers ---
+
+def sync_user_profile_documents(get_conn, release_conn, created=(), deleted=()):
+    # Every customer has a profile document (see DOCUMENT_SOURCES); the customer
+    # routes call this after their own commit, as the hybrid backend does for its
+    # MongoDB profiles.
+    if not created and not deleted:
+        return
+    conn = get_conn()
+    if not conn: raise RuntimeError("Failed to connect to PostgreSQL")
+    try:
+        cur = conn.cursor()
+        if created:
+            execute_values(cur, "INSERT INTO user_profile_documents (doc) VALUES %s ON CONFLICT (customer_id) DO NOTHING",
+                           [(Json(user_profile_document(customer_id)),) for customer_id in created])
+        if deleted:
+            cur.execute("DELETE FROM user_profile_documents WHERE customer_id = ANY(%s);", (list(deleted),))
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
@@ -0,0 +1,353 @@
+# PostgreSQL schema and bulk load path shared by data_loader.py and
+# data_loader_hybrid.py. Tables are created without keys, filled with COPY FROM
+# STDIN (or batched execute_values), and only then get their primary/foreign
+# keys, so PostgreSQL builds each index once instead of row by row.
+import os
+import time
+
+from psycopg2.extras import execute_values
+
+from common.serializers import POSTGRES_RESOURCES
+from common.snapshots import file_fingerprint, read_olist_csv
+
+LOAD_METHODS = ('copy', 'values')
+COPY_CHUNK_ROWS = 50000
+VALUES_PAGE_SIZE = 5000
+
+TABLE_DDL = [
+    """
+    CREATE TABLE customers (
+        customer_id VARCHAR(50) NOT NULL, customer_unique_id VARCHAR(50) NOT NULL,
+        customer_zip_code_prefix VARCHAR(10), customer_city VARCHAR(100), customer_state VARCHAR(50)
+    );
+    """,
+    """
+    CREATE TABLE orders (
+        order_id VARCHAR(50) NOT NULL, customer_id VARCHAR(50),
+        order_status VARCHAR(50), order_purchase_timestamp TIMESTAMP, order_approved_at TIMESTAMP,
+        order_delivered_carrier_date TIMESTAMP, order_delivered_customer_date TIMESTAMP,
+        order_estimated_delivery_date TIMESTAMP
+    );
+    """,
+    """
+    CREATE TABLE order_items (
+        order_item_id SERIAL, order_id VARCHAR(50),
+        product_id VARCHAR(50), seller_id VARCHAR(50), shipping_limit_date TIMESTAMP,
+        price DECIMAL(10, 2), freight_value DECIMAL(10, 2)
+    );
+    """,
+]
+
+# Only the PostgreSQL-only backend keeps the product catalogue in PostgreSQL; the
+# hybrid backend stores it in MongoDB.
+PRODUCTS_TABLE_DDL = """
+    CREATE TABLE products (
+        product_id VARCHAR(50) NOT NULL, product_category_name VARCHAR(100),
+        product_name_length INTEGER, product_description_length INTEGER, product_photos_qty INTEGER,
+        product_weight_g INTEGER, product_length_cm INTEGER, product_height_cm INTEGER, product_width_cm INTEGER
+    );
+"""
+CATEGORY_TRANSLATIONS_TABLE_DDL = """
+    CREATE TABLE product_category_translations (
+        product_category_name VARCHAR(100) NOT NULL, product_category_name_english VARCHAR(100)
+    );
+"""
+PRODUCTS_CONSTRAINTS = [
+    "ALTER TABLE products ADD CONSTRAINT products_pkey PRIMARY KEY (product_id);",
+    "ALTER TABLE product_category_translations ADD CONSTRAINT product_category_translations_pkey PRIMARY KEY (product_category_name);",
+]
+
+# Same constraint names PostgreSQL generates for inline PRIMARY KEY / REFERENCES.
+TABLE_CONSTRAINTS = [
+    "ALTER TABLE customers ADD CONSTRAINT customers_pkey PRIMARY KEY (customer_id);",
+    "ALTER TABLE orders ADD CONSTRAINT orders_pkey PRIMARY KEY (order_id);",
+    "ALTER TABLE orders ADD CONSTRAINT orders_customer_id_fkey FOREIGN KEY (customer_id) REFERENCES customers(customer_id);",
+    "ALTER TABLE order_items ADD CONSTRAINT order_items_pkey PRIMARY KEY (order_item_id);",
+    "ALTER TABLE order_items ADD CONSTRAINT order_items_order_id_fkey FOREIGN KEY (order_id) REFERENCES orders(order_id);",
+]
+
+# Secondary indexes behind the /orders and /order_items filters
+# (serializers.ORDER_FILTERS / ORDER_ITEM_FILTERS); order_items.order_id also
+# serves the order detail routes. IF NOT EXISTS so incremental loads add them to
+# databases loaded before they existed.
+FILTER_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS orders_customer_id_idx ON orders (customer_id);",
+    "CREATE INDEX IF NOT EXISTS orders_order_status_purchase_idx ON orders (order_status, order_purchase_timestamp);",
+    "CREATE INDEX IF NOT EXISTS orders_order_purchase_timestamp_idx ON orders (order_purchase_timestamp);",
+    "CREATE INDEX IF NOT EXISTS order_items_order_id_idx ON order_items (order_id);",
+    "CREATE INDEX IF NOT EXISTS order_items_product_id_idx ON order_items (product_id);",
+    "CREATE INDEX IF NOT EXISTS order_items_seller_id_idx ON order_items (seller_id);",
+]
+
+# Change version per table behind the ETags of the list routes (common/http_cache.py).
+# A statement-level trigger counts every INSERT/UPDATE/DELETE/TRUNCATE/COPY,
+# whoever runs it; statements that end up changing no rows count as well, which
+# only costs clients one extra download. Each statement appends its own
+# change_log row instead of incrementing a shared one, so concurrent writers
+# never wait on (or deadlock over) the version rows of the tables they touch,
+# and a table's version, the sum of its committed rows, only moves once a write
+# commits. Loads, and version lookups that find more than a few hundred rows
+# for a table (common/http_cache.py), fold the rows of each table into one (the
+# sum is unchanged), so the log stays small under a steady write load; the table
+# is never dropped, so versions keep growing across full reloads.
+CHANGE_VERSIONS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS change_log (
+        table_name VARCHAR(100) NOT NULL, bumps BIGINT NOT NULL DEFAULT 1,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_change_log_table ON change_log (table_name) INCLUDE (bumps, changed_at);",
+    # Carries the versions of the former one-row-per-table change_versions over.
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('change_versions') IS NOT NULL THEN
+            INSERT INTO change_log (table_name, bumps, changed_at) SELECT table_name, version, changed_at FROM change_versions;
+            DROP TABLE change_versions;
+        END IF;
+    END;
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bump_change_version() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO change_log (table_name) VALUES (TG_TABLE_NAME);
+        RETURN NULL;
+    END;
+    $$;
+    """,
+    """
+    WITH folded AS (DELETE FROM change_log RETURNING table_name, bumps, changed_at)
+    INSERT INTO change_log (table_name, bumps, changed_at)
+    SELECT table_name, sum(bumps), max(changed_at) FROM folded GROUP BY table_name;
+    """,
+]
+# The runtime fold, for some tables only (%s: a list of table names).
+CHANGE_LOG_FOLD_SQL = """
+    WITH folded AS (DELETE FROM change_log WHERE table_name = ANY(%s) RETURNING table_name, bumps, changed_at)
+    INSERT INTO change_log (table_name, bumps, changed_at)
+    SELECT table_name, sum(bumps), max(changed_at) FROM folded GROUP BY table_name;
+"""
+CHANGE_VERSION_TRIGGER = ("CREATE OR REPLACE TRIGGER {table}_change_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+                          "FOR EACH STATEMENT EXECUTE FUNCTION bump_change_version();")
+
+# SHA-256 of each CSV as last loaded, per table; see common/incremental.py.
+FINGERPRINT_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS load_fingerprints (
+        target VARCHAR(100) PRIMARY KEY, source VARCHAR(255) NOT NULL,
+        sha256 CHAR(64) NOT NULL, row_count INTEGER NOT NULL, loaded_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+"""
+
+CUSTOMER_COLUMNS = ['customer_id', 'customer_unique_id', 'customer_zip_code_prefix', 'customer_city', 'customer_state']
+ORDER_TIMESTAMP_COLUMNS = ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date',
+                           'order_delivered_customer_date', 'order_estimated_delivery_date']
+ORDER_COLUMNS = ['order_id', 'customer_id', 'order_status'] + ORDER_TIMESTAMP_COLUMNS
+PRODUCT_COLUMNS = ['product_id', 'product_category_name', 'product_name_length', 'product_description_length',
+                   'product_photos_qty', 'product_weight_g', 'product_length_cm', 'product_height_cm', 'product_width_cm']
+ORDER_ITEM_COLUMNS = ['order_id', 'product_id', 'seller_id', 'shipping_limit_date', 'price', 'freight_value']
+CATEGORY_TRANSLATION_COLUMNS = ['product_category_name', 'product_category_name_english']
+
+
+def drop_postgres_tables(cursor, include_products=False):
+    cursor.execute("DROP TABLE IF EXISTS order_items CASCADE; DROP TABLE IF EXISTS orders CASCADE; DROP TABLE IF EXISTS customers CASCADE;")
+    cursor.execute("DROP TABLE IF EXISTS load_fingerprints;")
+    if include_products:
+        cursor.execute("DROP TABLE IF EXISTS products CASCADE; DROP TABLE IF EXISTS product_category_translations CASCADE;")
+
+def create_postgres_tables(cursor, with_constraints=True, include_products=False):
+    drop_postgres_tables(cursor, include_products)
+    for ddl in TABLE_DDL + ([PRODUCTS_TABLE_DDL, CATEGORY_TRANSLATIONS_TABLE_DDL] if include_products else []):
+        cursor.execute(ddl)
+    add_change_version_triggers(cursor, include_products)
+    if with_constraints:
+        add_postgres_constraints(cursor, include_products)
+        add_postgres_indexes(cursor)
+
+def add_postgres_constraints(cursor, include_products=False):
+    for statement in TABLE_CONSTRAINTS + (PRODUCTS_CONSTRAINTS if include_products else []):
+        cursor.execute(statement)
+
+def add_change_version_triggers(cursor, include_products=False):
+    for ddl in CHANGE_VERSIONS_DDL:
+        cursor.execute(ddl)
+    tables = ['customers', 'orders', 'order_items'] + (['products', 'product_category_translations'] if include_products else [])
+    for table in tables:
+        cursor.execute(CHANGE_VERSION_TRIGGER.format(table=table))
+
+def add_postgres_indexes(cursor):
+    for statement in FILTER_INDEXES:
+        cursor.execute(statement)
+
+def save_postgres_fingerprints(cursor, fingerprints):
+    # fingerprints: {table: (source file name, sha256, rows)}
+    cursor.execute(FINGERPRINT_TABLE_DDL)
+    for table, (source, sha256, rows) in fingerprints.items():
+        cursor.execute(
+            "INSERT INTO load_fingerprints (target, source, sha256, row_count) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (target) DO UPDATE SET source = EXCLUDED.source, sha256 = EXCLUDED.sha256, "
+            "row_count = EXCLUDED.row_count, loaded_at = now();",
+            (table, source, sha256, rows)
+        )
+
+# The readers go through the snapshot cache (common/snapshots.py), which also
+# parses the timestamp columns.
+def read_customers(data_path):
+    df = read_olist_csv(os.path.join(data_path, 'olist_customers_dataset.csv'))
+    return df[CUSTOMER_COLUMNS].drop_duplicates(subset='customer_id')
+
+def read_orders(data_path):
+    df = read_olist_csv(os.path.join(data_path, 'olist_orders_dataset.csv'))
+    return df[ORDER_COLUMNS].drop_duplicates(subset='order_id')
+
+def read_products(data_path):
+    df = read_olist_csv(os.path.join(data_path, 'olist_products_dataset.csv'))
+    # The source file spells these columns 'lenght'.
+    df = df.rename(columns={'product_name_lenght': 'product_name_length', 'product_description_lenght': 'product_description_length'})
+    for col in PRODUCT_COLUMNS[2:]:
+        df[col] = df[col].astype('Int64')
+    return df[PRODUCT_COLUMNS].drop_duplicates(subset='product_id')
+
+def read_order_items(data_path):
+    df = read_olist_csv(os.path.join(data_path, 'olist_order_items_dataset.csv'))
+    return df[ORDER_ITEM_COLUMNS]
+
+def read_category_translations(data_path):
+    df = read_olist_csv(os.path.join(data_path, 'product_category_name_translation.csv'))
+    return df[CATEGORY_TRANSLATION_COLUMNS].drop_duplicates(subset='product_category_name')
+
+# (table, source CSV, reader) in load order.
+POSTGRES_TABLE_SOURCES = [
+    ('customers', 'olist_customers_dataset.csv', read_customers),
+    ('orders', 'olist_orders_dataset.csv', read_orders),
+    ('order_items', 'olist_order_items_dataset.csv', read_order_items),
+]
+PRODUCTS_TABLE_SOURCES = [
+    ('products', 'olist_products_dataset.csv', read_products),
+    ('product_category_translations', 'product_category_name_translation.csv', read_category_translations),
+]
+
+
+class DataFrameCsvStream:
+    # File-like object for cursor.copy_expert(): renders the DataFrame to CSV a
+    # chunk at a time, so the whole table never exists as one string.
+    def __init__(self, df, chunk_rows=COPY_CHUNK_ROWS):
+        self._chunks = (df.iloc[i:i + chunk_rows].to_csv(header=False, index=False)
+                        for i in range(0, len(df), chunk_rows))
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+def copy_dataframe(cursor, table, df, chunk_rows=COPY_CHUNK_ROWS):
+    # Unquoted empty CSV fields (NaN/NaT/None) are read back as NULL.
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)",
+        DataFrameCsvStream(df, chunk_rows)
+    )
+
+def insert_dataframe_values(cursor, table, df, page_size=VALUES_PAGE_SIZE):
+    values = df.astype(object).where(df.notna(), None)
+    execute_values(
+        cursor, f"INSERT INTO {table} ({', '.join(df.columns)}) VALUES %s",
+        values.itertuples(index=False, name=None), page_size=page_size
+    )
+
+def _report(table, rows, seconds):
+    rate = rows / seconds if seconds > 0 else float('inf')
+    print(f"  {table}: {rows} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+def bulk_load_postgres_data(conn, data_path, method='copy', include_products=False):
+    # Recreates the tables and loads all three CSVs in one transaction.
+    # Returns {table: {"rows": n, "seconds": s}}.
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Unknown load method '{method}', expected one of {LOAD_METHODS}")
+    write = copy_dataframe if method == 'copy' else insert_dataframe_values
+    timings = {}
+    cursor = conn.cursor()
+    try:
+        create_postgres_tables(cursor, with_constraints=False, include_products=include_products)
+        print(f"Bulk loading PostgreSQL tables ({method})...")
+        fingerprints = {}
+        for table, source, reader in POSTGRES_TABLE_SOURCES + (PRODUCTS_TABLE_SOURCES if include_products else []):
+            started = time.perf_counter()
+            df = reader(data_path)
+            write(cursor, table, df)
+            timings[table] = {"rows": len(df), "seconds": time.perf_counter() - started}
+            fingerprints[table] = (source, file_fingerprint(os.path.join(data_path, source)), len(df))
+            _report(table, len(df), timings[table]["seconds"])
+
+        started = time.perf_counter()
+        add_postgres_constraints(cursor, include_products)
+        add_postgres_indexes(cursor)
+        print(f"  keys, constraints and indexes created in {time.perf_counter() - started:.2f}s")
+        save_postgres_fingerprints(cursor, fingerprints)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    # Fresh planner statistics so the first benchmark queries do not run on defaults.
+    cursor = conn.cursor()
+    cursor.execute(f"ANALYZE {', '.join(timings)};")
+    conn.commit()
+    cursor.close()
+    return timings
+
+def _plan_scans(plan, scans=None):
+    # (node type, relation, index) of every scan node in an EXPLAIN (FORMAT JSON) plan.
+    scans = [] if scans is None else scans
+    if 'Scan' in plan['Node Type']:
+        scans.append((plan['Node Type'], plan.get('Relation Name'), plan.get('Index Name')))
+    for child in plan.get('Plans', ()):
+        _plan_scans(child, scans)
+    return scans
+
+def _explain_scans(cursor, query):
+    cursor.execute(f"EXPLAIN (GENERIC_PLAN, FORMAT JSON) {query}")
+    plan = cursor.fetchone()[0]
+    return _plan_scans((plan[0] if isinstance(plan, list) else plan)['Plan'])
+
+def check_filter_indexes(conn, resources=('orders', 'order_items')):
+    # EXPLAINs the query behind every list filter (generic plan, so no sample
+    # values are needed; PostgreSQL 16+) and reports the scans it uses. Filters
+    # PostgreSQL cannot serve from an index even with sequential scans disabled
+    # lack an index and are returned as (resource, filter) pairs. On small
+    # tables the planner may still prefer a sequential scan; that is reported
+    # but not a problem.
+    print("Checking the list filter query plans...")
+    missing = []
+    cursor = conn.cursor()
+    try:
+        for name in resources:
+            resource = POSTGRES_RESOURCES[name]
+            for param, (condition, _) in resource['filters'].items():
+                parts = condition.split('%s')
+                condition = "".join(f"{part}${i}" for i, part in enumerate(parts[:-1], start=1)) + parts[-1]
+                query = f"SELECT {', '.join(resource['columns'])} FROM {resource['table']} WHERE {condition}"
+                scans = _explain_scans(cursor, query)
+                cursor.execute("SET LOCAL enable_seqscan = off;")
+                forced = _explain_scans(cursor, query)
+                cursor.execute("RESET enable_seqscan;")
+                used = ", ".join(node + (f" on {relation}" if relation else "") + (f" using {index}" if index else "")
+                                 for node, relation, index in scans)
+                if any(node == 'Seq Scan' for node, _, _ in forced):
+                    missing.append((name, param))
+                    print(f"  WARNING /{name}?{param}=: no usable index ({used})")
+                else:
+                    print(f"  /{name}?{param}=: {used}")
+    finally:
+        conn.rollback()
+        cursor.close()
+    return missing
@@ -0,0 +1,85 @@
+# Per-product review summaries, denormalized into the product documents as
+#   "rating": {"average": 4.33, "count": 3, "scores": {"1": 0, ..., "5": 2}}
+# so that listing products with their rating is one read instead of a join of
+# /products, /order_items and /reviews on the client. Olist reviews rate an
+# order, so a review counts once for every distinct product of its order.
+# PostgreSQL does the aggregation in both backends: the hybrid one copies the
+# review scores from MongoDB into a temporary table joined with order_items,
+# the PostgreSQL-only one joins review_documents directly (see pg_documents.py).
+# Both write only the summaries that changed, so a rerun is cheap and leaves the
+# change versions alone when nothing moved. Refreshes of a few products (after a
+# review write) hold a PostgreSQL advisory lock per product from reading the
+# reviews to writing the summary, so concurrent review writes of one product
+# recompute it one after the other and an older summary never overwrites a newer.
+import time
+
+from psycopg2.extras import execute_values
+from pymongo import UpdateOne
+
+from common.documents import RATING_SCORES, empty_product_rating
+from common.incremental import MONGO_WRITE_BATCH_SIZE
+from common.pg_loader import VALUES_PAGE_SIZE
+
+_SCORES = ", ".join(f"'{s}', count(*) FILTER (WHERE r.review_score = {s})" for s in RATING_SCORES)
+
+# {reviews}: a relation of (order_id, review_score); {where}: a condition on the
+# order items, e.g. to limit the summaries to a few products.
+PRODUCT_RATINGS_SQL = f"""
+    SELECT i.product_id, jsonb_build_object(
+        'average', round(avg(r.review_score), 2)::float8, 'count', count(*), 'scores', jsonb_build_object({_SCORES})
+    ) AS rating
+    FROM (SELECT DISTINCT order_id, product_id FROM order_items {{where}}) i
+    JOIN {{reviews}} r ON r.order_id = i.order_id
+    WHERE r.review_score IS NOT NULL
+    GROUP BY i.product_id
+"""
+
+
+def order_products(cursor, order_ids):
+    # {order_id: [product_id, ...]} for the orders that exist, items or not.
+    cursor.execute("SELECT o.order_id, i.product_id FROM orders o LEFT JOIN order_items i ON i.order_id = o.order_id "
+                   "WHERE o.order_id = ANY(%s);", (list(order_ids),))
+    products = {}
+    for order_id, product_id in cursor.fetchall():
+        products.setdefault(order_id, [])
+        if product_id is not None and product_id not in products[order_id]:
+            products[order_id].append(product_id)
+    return products
+
+def refresh_product_ratings(conn, db, product_ids=None, batch_size=MONGO_WRITE_BATCH_SIZE):
+    # Recomputes products.rating in MongoDB: for all products after a load, or
+    # only product_ids after a review was written through the API. Returns
+    # {"rows": products updated, "seconds"}.
+    started = time.perf_counter()
+    products = {} if product_ids is None else {"product_id": {"$in": list(product_ids)}}
+    requests = []
+    cursor = conn.cursor()
+    try:
+        if product_ids is None:
+            reviews, where = {}, ""
+        else:
+            # Released by the rollback below; taken in order so that two refreshes
+            # cannot wait on each other.
+            for product_id in sorted(product_ids):
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('product_ratings'), hashtext(%s));", (product_id,))
+            cursor.execute("SELECT DISTINCT order_id FROM order_items WHERE product_id = ANY(%s);", (list(product_ids),))
+            reviews, where = {"order_id": {"$in": [row[0] for row in cursor.fetchall()]}}, "WHERE product_id = ANY(%s)"
+        cursor.execute("CREATE TEMP TABLE review_scores (order_id VARCHAR(50), review_score INTEGER) ON COMMIT DROP;")
+        execute_values(cursor, "INSERT INTO review_scores (order_id, review_score) VALUES %s",
+                       ((r.get("order_id"), r.get("review_score"))
+                        for r in db.reviews.find(reviews, {"_id": 0, "order_id": 1, "review_score": 1})),
+                       page_size=VALUES_PAGE_SIZE)
+        cursor.execute(PRODUCT_RATINGS_SQL.format(reviews="review_scores", where=where),
+                       None if product_ids is None else (list(product_ids),))
+        ratings = dict(cursor.fetchall())
+
+        for product in db.products.find(products, {"_id": 0, "product_id": 1, "rating": 1}):
+            rating = ratings.get(product["product_id"]) or empty_product_rating()
+            if product.get("rating") != rating:
+                requests.append(UpdateOne({"product_id": product["product_id"]}, {"$set": {"rating": rating}}))
+        for i in range(0, len(requests), batch_size):
+            db.products.bulk_write(requests[i:i + batch_size], ordered=False)
+    finally:
+        conn.rollback()
+        cursor.close()
+    return {"rows": len(requests), "seconds": time.perf_counter() - started}
@@ -0,0 +1,210 @@
+# Read-through cache for serialized GET responses. Entries are keyed by
+# namespace + path + query string and stored as raw response bytes, either in
+# Redis (shared by all worker processes) or in a bounded in-process LRU when no
+# Redis URL is configured. Each namespace carries a version number that is bumped
+# by successful POST/PUT/DELETE requests routed through the same decorator, so
+# invalidating e.g. every cached /products page is a single increment; stale
+# entries simply stop being addressed and age out.
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+try:
+    import redis
+except ImportError:  # Redis is optional; the local LRU needs no extra packages.
+    redis = None
+
+# Response headers worth replaying on a cache hit.
+CACHED_HEADERS = ('X-Next-After',)
+
+
+class LocalLRUCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._versions = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def bump_version(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            # Entries of older versions can never be hit again; free them now.
+            prefix = f"{namespace}:"
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+
+    def info(self):
+        with self._lock:
+            return {"backend": "local", "entries": len(self._entries), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class RedisCache:
+    # Size bounds are enforced by Redis itself (maxmemory + an LRU eviction
+    # policy); values larger than max_item_bytes are not cached at all.
+    def __init__(self, url, key_prefix='ecom', max_item_bytes=16 * 1024 * 1024):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a Redis cache URL")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.key_prefix = key_prefix
+        self.max_item_bytes = max_item_bytes
+
+    def get(self, key):
+        return self.client.get(f"{self.key_prefix}:{key}")
+
+    def set(self, key, value, ttl):
+        if len(value) <= self.max_item_bytes:
+            self.client.set(f"{self.key_prefix}:{key}", value, ex=max(1, int(ttl)))
+
+    def version(self, namespace):
+        return int(self.client.get(f"{self.key_prefix}:version:{namespace}") or 0)
+
+    def bump_version(self, namespace):
+        self.client.incr(f"{self.key_prefix}:version:{namespace}")
+
+    def info(self):
+        memory = self.client.info('memory')
+        return {"backend": "redis", "used_memory": memory.get('used_memory'),
+                "maxmemory": memory.get('maxmemory'), "maxmemory_policy": memory.get('maxmemory_policy')}
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {}  # namespace -> {"hits", "misses", "invalidations", "errors"}
+
+    def _count(self, namespace, counter):
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0})
+            counters[counter] += 1
+
+    def _key(self, namespace):
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        # Below common/http_cache.py the data version is part of the key too: the
+        # namespace version only counts writes of this API, so without it an entry
+        # cached before a load or a manual change would be served, and kept by the
+        # HTTP cache, under the new ETag.
+        etag = g.get('http_cache_etag')
+        return f"{namespace}:v{self.backend.version(namespace)}:{etag or ''}:{request.path}?{query}"
+
+    def cached(self, namespace):
+        def decorator(view):
+            if self.backend is None:
+                return view
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    # Writes go straight through and, when they succeed, drop every
+                    # cached page of the namespace.
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code < 400:
+                        self.invalidate(namespace)
+                    return response
+                try:
+                    key = self._key(namespace)
+                    entry = self.backend.get(key)
+                except Exception as e:
+                    print(f"Cache read error ({namespace}): {e}")
+                    self._count(namespace, "errors")
+                    return view(*args, **kwargs)
+
+                if entry is not None:
+                    self._count(namespace, "hits")
+                    header_len = int.from_bytes(entry[:4], 'big')
+                    meta = json.loads(entry[4:4 + header_len])
+                    response = Response(entry[4 + header_len:], mimetype=meta["mimetype"])
+                    response.headers.update(meta["headers"])
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count(namespace, "misses")
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                meta = json.dumps({
+                    "mimetype": response.mimetype,
+                    "headers": {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers},
+                }).encode()
+                try:
+                    self.backend.set(key, len(meta).to_bytes(4, 'big') + meta + response.get_data(), self.ttl)
+                except Exception as e:
+                    print(f"Cache write error ({namespace}): {e}")
+                    self._count(namespace, "errors")
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, namespace):
+        if self.backend is None:
+            return
+        try:
+            self.backend.bump_version(namespace)
+            self._count(namespace, "invalidations")
+        except Exception as e:
+            print(f"Cache invalidation error ({namespace}): {e}")
+            self._count(namespace, "errors")
+
+    def stats(self):
+        with self._lock:
+            namespaces = {ns: dict(c) for ns, c in self._counters.items()}
+        hits = sum(c["hits"] for c in namespaces.values())
+        misses = sum(c["misses"] for c in namespaces.values())
+        if self.backend is None:
+            return {"enabled": False}
+        try:
+            backend = self.backend.info()
+        except Exception as e:
+            backend = {"error": str(e)}
+        return {"enabled": True, "ttl": self.ttl, "hits": hits, "misses": misses,
+                "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+                "namespaces": namespaces, "backend": backend}
+
+
+def create_response_cache(enabled=True, redis_url=None, ttl=60, max_entries=256, max_bytes=64 * 1024 * 1024):
+    if not enabled:
+        return ResponseCache(None, ttl=ttl)
+    if redis_url:
+        return ResponseCache(RedisCache(redis_url, max_item_bytes=max_bytes), ttl=ttl)
+    return ResponseCache(LocalLRUCache(max_entries=max_entries, max_bytes=max_bytes), ttl=ttl)
@@ -0,0 +1,151 @@
+# Column lists and row -> dict conversions for the PostgreSQL tables. Both
+# backends serve customers/orders with exactly the same shape, so they share these.
+import json
+import re
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # only needed for the 'orjson' JSON mode
+    orjson = None
+
+# How the PostgreSQL list routes turn rows into JSON. Every mode yields the
+# documents of the *_row_to_dict functions with jsonify's sorted keys:
+#   python   - row -> dict -> Flask's JSON encoder (original)
+#   postgres - PostgreSQL renders each row with row_to_json
+#   orjson   - rows go straight to orjson, which formats datetimes itself
+# The fast modes write jsonify's compact form only (JSON_COMPACT=1): indenting
+# their output would cost the time they save, so check_json_mode rejects them
+# with the indented default the JMeter regexes rely on.
+JSON_MODES = ('python', 'postgres', 'orjson')
+
+_NON_ASCII = re.compile(r'[^\x00-\x7f]')
+
+def check_json_mode(json_mode, compact):
+    # Called by the apps at startup; raises ValueError.
+    if json_mode not in JSON_MODES:
+        raise ValueError(f"POSTGRES_JSON_MODE must be one of {', '.join(JSON_MODES)}")
+    if json_mode != 'python' and not compact:
+        raise ValueError(f"POSTGRES_JSON_MODE={json_mode} writes compact JSON; set JSON_COMPACT=1 or use 'python'")
+
+def ascii_json(text):
+    # jsonify escapes non-ASCII characters (ensure_ascii); PostgreSQL and orjson
+    # write them as UTF-8.
+    return text if text.isascii() else _NON_ASCII.sub(lambda m: json.dumps(m.group())[1:-1], text)
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+def customer_row_to_dict(c):
+    return {"customer_id": c[0], "customer_unique_id": c[1], "customer_zip_code_prefix": c[2], "customer_city": c[3], "customer_state": c[4]}
+
+def order_row_to_dict(o):
+    return {
+        "order_id": o[0],
+        "customer_id": o[1],
+        "order_status": o[2],
+        "order_purchase_timestamp": _iso(o[3]),
+        "order_approved_at": _iso(o[4]),
+        "order_delivered_carrier_date": _iso(o[5]),
+        "order_delivered_customer_date": _iso(o[6]),
+        "order_estimated_delivery_date": _iso(o[7])
+    }
+
+def order_item_row_to_dict(oi):
+    return {
+        "order_item_id": oi[0], "order_id": oi[1], "product_id": oi[2],
+        "seller_id": oi[3], "shipping_limit_date": _iso(oi[4]),
+        "price": str(oi[5]), "freight_value": str(oi[6])
+    }
+
+def product_row_to_dict(p):
+    return {
+        "product_id": p[0], "product_category_name": p[1],
+        "product_name_length": p[2], "product_description_length": p[3], "product_photos_qty": p[4],
+        "product_weight_g": p[5], "product_length_cm": p[6], "product_height_cm": p[7], "product_width_cm": p[8]
+    }
+
+# List filters shared by /orders and /order_items: query parameter -> (condition,
+# parser). Conditions on the other table go through a semi-join, so every filter
+# is served by one of the FILTER_INDEXES created by the loaders (common.pg_loader).
+_ORDERS_OF_ITEMS = "order_id IN (SELECT order_id FROM order_items WHERE {})"
+_ITEMS_OF_ORDERS = "order_id IN (SELECT order_id FROM orders WHERE {})"
+ORDER_FILTERS = {
+    "customer_id": ("customer_id = %s", str),
+    "order_status": ("order_status = %s", str),
+    "purchased_from": ("order_purchase_timestamp >= %s", datetime.fromisoformat),
+    "purchased_to": ("order_purchase_timestamp < %s", datetime.fromisoformat),
+    "product_id": (_ORDERS_OF_ITEMS.format("product_id = %s"), str),
+    "seller_id": (_ORDERS_OF_ITEMS.format("seller_id = %s"), str),
+}
+ORDER_ITEM_FILTERS = {
+    "order_id": ("order_id = %s", str),
+    "product_id": ("product_id = %s", str),
+    "seller_id": ("seller_id = %s", str),
+    "customer_id": (_ITEMS_OF_ORDERS.format("customer_id = %s"), str),
+    "order_status": (_ITEMS_OF_ORDERS.format("order_status = %s"), str),
+    "purchased_from": (_ITEMS_OF_ORDERS.format("order_purchase_timestamp >= %s"), datetime.fromisoformat),
+    "purchased_to": (_ITEMS_OF_ORDERS.format("order_purchase_timestamp < %s"), datetime.fromisoformat),
+}
+
+# key: primary key, used for keyset pagination and single-record routes; key_type:
+# how ?after= / URL keys are parsed; children: (table, column) rows deleted first;
+# timestamps: TIMESTAMP columns (drivers without text input need datetimes);
+# decimals: NUMERIC columns, served as strings; filters: accepted list filters.
+POSTGRES_RESOURCES = {
+    "customers": {
+        "table": "customers", "key": "customer_id", "key_type": str,
+        "columns": ["customer_id", "customer_unique_id", "customer_zip_code_prefix", "customer_city", "customer_state"],
+        "to_dict": customer_row_to_dict,
+    },
+    "orders": {
+        "table": "orders", "key": "order_id", "key_type": str,
+        "columns": ["order_id", "customer_id", "order_status",
+                    "order_purchase_timestamp", "order_approved_at",
+                    "order_delivered_carrier_date", "order_delivered_customer_date",
+                    "order_estimated_delivery_date"],
+        "to_dict": order_row_to_dict,
+        "children": [("order_items", "order_id")],
+        "timestamps": ["order_purchase_timestamp", "order_approved_at", "order_delivered_carrier_date",
+                       "order_delivered_customer_date", "order_estimated_delivery_date"],
+        "filters": ORDER_FILTERS,
+    },
+    "order_items": {
+        "table": "order_items", "key": "order_item_id", "key_type": int,
+        "columns": ["order_item_id", "order_id", "product_id", "seller_id", "shipping_limit_date", "price", "freight_value"],
+        "to_dict": order_item_row_to_dict,
+        "timestamps": ["shipping_limit_date"],
+        "decimals": ["price", "freight_value"],
+        "filters": ORDER_ITEM_FILTERS,
+    },
+    # Relational product catalogue of the PostgreSQL-only backend.
+    "products": {
+        "table": "products", "key": "product_id", "key_type": str,
+        "columns": ["product_id", "product_category_name", "product_name_length", "product_description_length",
+                    "product_photos_qty", "product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm"],
+        "to_dict": product_row_to_dict,
+    },
+}
+
+def json_columns(resource):
+    # Columns in jsonify's sorted key order, which is also the order row_to_json
+    # and orjson write them in.
+    return sorted(resource['columns'])
+
+def json_select_list(resource):
+    # NUMERIC::text is exactly what str(Decimal) gives for these columns.
+    decimals = resource.get('decimals', ())
+    return ", ".join(f"{c}::text AS {c}" if c in decimals else c for c in json_columns(resource))
+
+def orjson_row_encoder(resource):
+    if orjson is None:
+        raise RuntimeError("The orjson package is required for the 'orjson' JSON mode")
+    columns = json_columns(resource)
+    return lambda row: ascii_json(orjson.dumps(dict(zip(columns, row))).decode())
+
+def document_text_encoder():
+    # JSONB text has its own key order (shorter keys first) and ", " / ": "
+    # separators, so documents are re-encoded in jsonify's compact form.
+    if orjson is not None:
+        return lambda text: ascii_json(orjson.dumps(orjson.loads(text), option=orjson.OPT_SORT_KEYS).decode())
+    return lambda text: json.dumps(json.loads(text), sort_keys=True, separators=(',', ':'))
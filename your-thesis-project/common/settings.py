@@ -0,0 +1,24 @@
+# Settings read from the environment, so one image serves every benchmark
+# configuration (docker-compose, gunicorn.conf.py). Apps and loaders keep their
+# module constants, with the old hard-coded values as defaults; a variable of the
+# same name overrides them, e.g. POSTGRES_HOST=postgresql POSTGRES_POOL_MAX_SIZE=8.
+import os
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def env_str(name, default=None):
+    # Empty values count as unset, so REDIS_URL= keeps the default None.
+    return os.environ.get(name) or default
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    return value.strip().lower() in TRUE_VALUES if value else default
@@ -0,0 +1,132 @@
+# Request coalescing ("single flight") for the collection GET routes. Under a
+# JMeter plan with hundreds of threads polling GET /customers or /products, the
+# identical requests that arrive while one is being served do not run their own
+# query: the first (the leader) runs the view, the others (followers) wait for it
+# and are answered with a copy of its status, headers and body, so one scan and
+# one JSON encoding serve them all.
+#   key       - namespace, path and sorted query string, plus the data version
+#               the conditional GET layer looked up (common/http_cache.py), so a
+#               request that saw a newer version never joins an older flight
+#   writes    - routes decorated with invalidates() start a new generation of
+#               their namespaces on success; requests after a write in this
+#               process only join flights started after it
+#   streams   - ?stream= responses are produced while they are sent and cannot
+#               be shared; they bypass coalescing
+# A follower that waits longer than the timeout, or whose leader failed or
+# answered anything but 200, runs the view itself. Coalescing is per process; each gunicorn worker has its own.
+import threading
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+# Headers every response recomputes itself.
+SKIPPED_HEADERS = ('Content-Length',)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None  # (status, headers, body), None when the leader failed or did not answer 200
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, timeout=30.0, enabled=True):
+        self.enabled = enabled
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._flights = {}       # key -> _Flight
+        self._generations = {}   # namespace -> int
+        self._counters = {}      # namespace -> {"leaders", "coalesced", "fallbacks", "max_followers"}
+
+    def _count(self, namespace, counter, value=1):
+        # Called with self._lock held.
+        counters = self._counters.setdefault(namespace, {"leaders": 0, "coalesced": 0, "fallbacks": 0, "max_followers": 0})
+        if counter == "max_followers":
+            counters[counter] = max(counters[counter], value)
+        else:
+            counters[counter] += value
+
+    def _key(self, namespace):
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return (f"{namespace}:g{self._generations.get(namespace, 0)}:{g.get('http_cache_etag')}:"
+                f"{request.path}?{query}")
+
+    def _lead(self, namespace, key, flight, view, args, kwargs):
+        try:
+            response = make_response(view(*args, **kwargs))
+            # Errors (a 500 from a dropped connection, a 503 from an exhausted
+            # pool) are not shared; each follower retries the view itself.
+            if response.status_code == 200 and not response.is_streamed:
+                headers = [(k, v) for k, v in response.headers.items() if k not in SKIPPED_HEADERS]
+                flight.response = (response.status_code, headers, response.get_data())
+            return response
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                self._count(namespace, "max_followers", flight.followers)
+            flight.done.set()
+
+    def _follow(self, namespace, flight, view, args, kwargs):
+        if flight.done.wait(self.timeout) and flight.response is not None:
+            status, headers, body = flight.response
+            return Response(body, status=status, headers=headers)
+        with self._lock:
+            self._count(namespace, "fallbacks")
+        return view(*args, **kwargs)
+
+    def coalesced(self, namespace):
+        # For GET routes; decorate below the caches so that only their misses
+        # are coalesced.
+        def decorator(view):
+            if not self.enabled:
+                return view
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or 'stream' in request.args:
+                    return view(*args, **kwargs)
+                with self._lock:
+                    key = self._key(namespace)
+                    flight = self._flights.get(key)
+                    if flight is None:
+                        flight = self._flights[key] = _Flight()
+                        leader = True
+                        self._count(namespace, "leaders")
+                    else:
+                        flight.followers += 1
+                        leader = False
+                        self._count(namespace, "coalesced")
+                if leader:
+                    return self._lead(namespace, key, flight, view, args, kwargs)
+                return self._follow(namespace, flight, view, args, kwargs)
+            return wrapper
+        return decorator
+
+    def invalidates(self, *namespaces):
+        # For write routes: after a successful non-GET request, reads of these
+        # namespaces stop joining flights that started before it.
+        def decorator(view):
+            if not self.enabled:
+                return view
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                response = make_response(view(*args, **kwargs))
+                if request.method != 'GET' and response.status_code < 400:
+                    with self._lock:
+                        for namespace in namespaces:
+                            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            namespaces = {ns: dict(c) for ns, c in self._counters.items()}
+            in_flight = len(self._flights)
+        return {"enabled": True, "timeout": self.timeout, "in_flight": in_flight,
+                "coalesced": sum(c["coalesced"] for c in namespaces.values()), "namespaces": namespaces}
@@ -0,0 +1,124 @@
+# Parsed-CSV snapshot cache shared by both loaders. The first read of a CSV
+# parses it (timestamp columns included) and writes the typed DataFrame to
+# SNAPSHOT_DIR_NAME next to the data, named after the file's SHA-256; later
+# reads of an unchanged file load that snapshot instead of re-parsing. Parquet
+# is used when pyarrow is installed, a pickle otherwise. Within one process a
+# file is also parsed only once, even when several loaders ask for it at the
+# same time (the hybrid loader reads the customers CSV for PostgreSQL and for
+# the user profiles); that in-process memo keeps the most recently read frames
+# up to MEMO_MAX_BYTES and drops the rest, which the on-disk snapshot still
+# makes cheap to read again.
+import glob
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine)
+    SNAPSHOT_FORMAT = 'parquet'
+except ImportError:
+    SNAPSHOT_FORMAT = 'pickle'
+
+SNAPSHOTS_ENABLED = True
+SNAPSHOT_DIR_NAME = '.snapshot_cache'
+# Bump when the parsing below changes, so old snapshots are not reused.
+SNAPSHOT_VERSION = 1
+MEMO_MAX_BYTES = 512 * 1024 * 1024
+
+# Timestamp columns per Olist file, parsed with errors='coerce'.
+OLIST_DATE_COLUMNS = {
+    'olist_orders_dataset.csv': ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date',
+                                 'order_delivered_customer_date', 'order_estimated_delivery_date'],
+    'olist_order_items_dataset.csv': ['shipping_limit_date'],
+    'olist_order_reviews_dataset.csv': ['review_creation_date', 'review_answer_timestamp'],
+}
+
+_lock = threading.Lock()
+_path_locks = {}
+_frames = OrderedDict()  # path -> (sha256, DataFrame, bytes), least recently read first
+_hashes = {}   # path -> ((size, mtime_ns), sha256)
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    # SHA-256 of the file; remembered per (size, mtime) so that the snapshot cache
+    # and the incremental loader hash each file once per run.
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _hashes.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    _hashes[path] = (signature, digest.hexdigest())
+    return _hashes[path][1]
+
+def parse_olist_csv(path):
+    df = pd.read_csv(path)
+    for col in OLIST_DATE_COLUMNS.get(os.path.basename(path), ()):
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+def _snapshot_path(path, sha256):
+    suffix = 'parquet' if SNAPSHOT_FORMAT == 'parquet' else 'pkl'
+    cache_dir = os.path.join(os.path.dirname(path), SNAPSHOT_DIR_NAME)
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.v{SNAPSHOT_VERSION}.{sha256[:16]}.{suffix}")
+
+def _read_snapshot(snapshot):
+    return pd.read_parquet(snapshot) if SNAPSHOT_FORMAT == 'parquet' else pd.read_pickle(snapshot)
+
+def _write_snapshot(df, snapshot):
+    os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+    tmp = f"{snapshot}.{os.getpid()}.tmp"
+    if SNAPSHOT_FORMAT == 'parquet':
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, snapshot)
+    # Snapshots of earlier versions of the same file are dead weight.
+    prefix = os.path.join(os.path.dirname(snapshot), os.path.basename(snapshot).split('.v')[0] + '.v')
+    for old in glob.glob(glob.escape(prefix) + '*'):
+        if old != snapshot and not old.endswith('.tmp'):
+            os.remove(old)
+
+def read_olist_csv(path):
+    # Returns the parsed CSV; callers get their own (shallow) copy.
+    if not SNAPSHOTS_ENABLED:
+        return parse_olist_csv(path)
+    with _lock:
+        path_lock = _path_locks.setdefault(path, threading.Lock())
+    with path_lock:
+        sha256 = file_fingerprint(path)
+        with _lock:
+            cached = _frames.get(path)
+        if cached is None or cached[0] != sha256:
+            snapshot = _snapshot_path(path, sha256)
+            df = None
+            if os.path.exists(snapshot):
+                try:
+                    df = _read_snapshot(snapshot)
+                except Exception as e:
+                    print(f"Ignoring unreadable snapshot {snapshot}: {e}")
+            if df is None:
+                df = parse_olist_csv(path)
+                try:
+                    _write_snapshot(df, snapshot)
+                except OSError as e:
+                    print(f"Could not write snapshot {snapshot}: {e}")
+            cached = (sha256, df, int(df.memory_usage(index=True).sum()))
+        with _lock:
+            _frames[path] = cached
+            _frames.move_to_end(path)
+            _evict_frames()
+    return cached[1].copy(deep=False)
+
+def _evict_frames():
+    # Called with _lock held; always keeps the frame just read.
+    total = sum(entry[2] for entry in _frames.values())
+    while len(_frames) > 1 and total > MEMO_MAX_BYTES:
+        _, (_, _, size) = _frames.popitem(last=False)
+        total -= size
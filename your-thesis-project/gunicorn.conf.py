@@ -0,0 +1,41 @@
+# Production serving for the Flask apps: a pre-forked gunicorn master with
+# WEB_CONCURRENCY worker processes of WEB_THREADS threads each, e.g.
+#   gunicorn -c gunicorn.conf.py --chdir hybrid_only app_hybrid:app
+#   gunicorn -c gunicorn.conf.py --chdir postgres_only_backend app:app
+# Every worker has its own PostgreSQL / MongoDB pools, opened after the fork (see
+# open_pools in the apps); all other settings come from the environment too
+# (common/settings.py).
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+threads = int(os.environ.get('WEB_THREADS') or 8)
+worker_class = 'gthread'
+# Long enough for an unpaginated /products or /order_items on a slow disk.
+timeout = int(os.environ.get('WEB_TIMEOUT') or 120)
+keepalive = 5
+# Import the app once in the master so workers share its pages; no pool is opened
+# at import time, so nothing database-related crosses the fork.
+preload_app = os.environ.get('WEB_PRELOAD', '1') == '1'
+accesslog = os.environ.get('WEB_ACCESS_LOG') or None
+errorlog = '-'
+
+# A worker thread holds at most one connection of each pool, so per-worker pools
+# sized to the thread count keep workers * threads within max_connections
+# (PostgreSQL's default is 100) instead of workers * 20.
+os.environ.setdefault('POSTGRES_POOL_MAX_SIZE', str(threads))
+os.environ.setdefault('POSTGRES_POOL_MIN_SIZE', str(min(2, threads)))
+os.environ.setdefault('MONGO_POOL_MAX_SIZE', str(threads))
+# Lets the apps turn off their per-process caches when several workers would
+# each keep their own copy (see LOCAL_CACHES in app_hybrid.py).
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+
+def post_worker_init(worker):
+    # Open this worker's pools before it accepts requests, so the first requests
+    # after a (re)start do not pay for the connects.
+    open_pools = getattr(sys.modules.get(worker.wsgi.import_name), 'open_pools', None)
+    if open_pools is not None:
+        open_pools()
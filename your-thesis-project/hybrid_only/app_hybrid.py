@@ -1,137 +1,554 @@
-from flask import Flask, jsonify
-import psycopg2
-from pymongo import MongoClient
-from flask_cors import CORS
-
-app = Flask(__name__)
-CORS(app)
-
-POSTGRES_HOST = 'localhost'
-POSTGRES_PORT = '5433'
-POSTGRES_DB = 'ecom_hybrid_db'
-POSTGRES_USER = 'user'
-POSTGRES_PASSWORD = 'password'
-
-MONGO_HOST = 'localhost'
-MONGO_PORT = 27017
-
-def get_postgres_connection():
-    try:
-        conn = psycopg2.connect(
-            host=POSTGRES_HOST, port=POSTGRES_PORT,
-            database=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD
-        )
-        return conn
-    except Exception as e:
-        print(f"PostgreSQL connection error: {e}")
-        return None
-
-def get_mongo_client():
-    try:
-        client = MongoClient(f'mongodb://{MONGO_HOST}:{MONGO_PORT}/')
-        client.admin.command('ismaster')
-        return client
-    except Exception as e:
-        print(f"MongoDB connection error: {e}")
-        return None
-
-@app.route('/')
-def home():
-    return "E-commerce Hybrid Backend is running!"
-
-@app.route('/customers', methods=['GET'])
-def get_customers():
-    conn = get_postgres_connection()
-    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT customer_id, customer_unique_id, customer_zip_code_prefix, customer_city, customer_state FROM customers;")
-        customers = cur.fetchall()
-        cur.close()
-        return jsonify([{"customer_id": c[0], "customer_unique_id": c[1], "customer_zip_code_prefix": c[2], "customer_city": c[3], "customer_state": c[4]} for c in customers])
-    except Exception as e:
-        print(f"Error fetching customers: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if conn: conn.close()
-
-@app.route('/orders', methods=['GET'])
-def get_orders():
-    conn = get_postgres_connection()
-    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT 
-                order_id, customer_id, order_status, 
-                order_purchase_timestamp, order_approved_at, 
-                order_delivered_carrier_date, order_delivered_customer_date, 
-                order_estimated_delivery_date 
-            FROM orders;
-        """)
-        orders = cur.fetchall()
-        cur.close()
-        
-        return jsonify([
-            {
-                "order_id": o[0], 
-                "customer_id": o[1], 
-                "order_status": o[2], 
-                "order_purchase_timestamp": o[3].isoformat() if o[3] else None, 
-                "order_approved_at": o[4].isoformat() if o[4] else None,
-                "order_delivered_carrier_date": o[5].isoformat() if o[5] else None,
-                "order_delivered_customer_date": o[6].isoformat() if o[6] else None,
-                "order_estimated_delivery_date": o[7].isoformat() if o[7] else None
-            } 
-            for o in orders
-        ])
-    except Exception as e:
-        print(f"Error fetching orders: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if conn: conn.close()
-
-@app.route('/products', methods=['GET'])
-def get_products():
-    client = get_mongo_client()
-    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
-    try:
-        db = client.ecom_hybrid_db
-        products = list(db.products.find({}, {"_id": 0}))
-        return jsonify(products)
-    except Exception as e:
-        print(f"Error fetching products: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if client: client.close()
-
-@app.route('/reviews', methods=['GET'])
-def get_reviews():
-    client = get_mongo_client()
-    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
-    try:
-        db = client.ecom_hybrid_db
-        reviews = list(db.reviews.find({}, {"_id": 0}))
-        return jsonify(reviews)
-    except Exception as e:
-        print(f"Error fetching reviews: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if client: client.close()
-
-@app.route('/user_profiles', methods=['GET'])
-def get_user_profiles():
-    client = get_mongo_client()
-    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
-    try:
-        db = client.ecom_hybrid_db
-        user_profiles = list(db.user_profiles.find({}, {"_id": 0}))
-        return jsonify(user_profiles)
-    except Exception as e:
-        print(f"Error fetching user profiles: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if client: client.close()
-
-if __name__ == '__main__':
-    app.run(debug=True, port=5000, host='0.0.0.0')
+from flask import Flask, jsonify, request
+import os
+import sys
+import threading
+import uuid
+from datetime import datetime
+from flask_cors import CORS
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.analytics import CATEGORY_SALES_SORT, mongo_report_response, postgres_report_response
+from common.bulk import mongo_products_bulk_response, postgres_bulk_response
+from common.db_pool import PostgresPool, abandon_after_fork, create_mongo_client
+from common.documents import (DOCUMENT_FIELDS, DOCUMENT_FILTERS, product_document_from_fields, product_update,
+                              review_document_from_fields, review_update)
+from common.http_cache import bump_mongo_change_version, bump_on_write, create_http_cache, mongo_change_version, postgres_change_version
+from common.metrics import MongoTimingListener, RequestMetrics, TimedCursor, timed_phase
+from common.listing import mongo_list_response, postgres_list_response
+from common.order_details import ProductLRU, attach_products_and_reviews, fetch_orders_with_items
+from common.pg_crud import postgres_item_response
+from common.ratings import order_products, refresh_product_ratings
+from common.response_cache import create_response_cache
+from common.serializers import POSTGRES_RESOURCES, check_json_mode
+from common.single_flight import SingleFlight
+from common.settings import env_bool, env_float, env_int, env_str
+
+app = Flask(__name__)
+CORS(app)
+
+POSTGRES_HOST = env_str('POSTGRES_HOST', 'localhost')
+POSTGRES_PORT = env_str('POSTGRES_PORT', '5433')
+POSTGRES_DB = env_str('POSTGRES_DB', 'ecom_hybrid_db')
+POSTGRES_USER = env_str('POSTGRES_USER', 'user')
+POSTGRES_PASSWORD = env_str('POSTGRES_PASSWORD', 'password')
+
+MONGO_HOST = env_str('MONGO_HOST', 'localhost')
+MONGO_PORT = env_int('MONGO_PORT', 27017)
+
+# Process-wide pools shared by all routes (sized for the JMeter thread groups).
+POSTGRES_POOL_MIN_SIZE = env_int('POSTGRES_POOL_MIN_SIZE', 2)
+POSTGRES_POOL_MAX_SIZE = env_int('POSTGRES_POOL_MAX_SIZE', 20)
+POSTGRES_POOL_TIMEOUT = env_float('POSTGRES_POOL_TIMEOUT', 5.0) # seconds a request waits for a free connection
+POSTGRES_POOL_HEALTH_CHECK = env_bool('POSTGRES_POOL_HEALTH_CHECK', True)
+MONGO_POOL_MIN_SIZE = env_int('MONGO_POOL_MIN_SIZE', 0)
+MONGO_POOL_MAX_SIZE = env_int('MONGO_POOL_MAX_SIZE', 100)
+MONGO_POOL_TIMEOUT = env_float('MONGO_POOL_TIMEOUT', 5.0)
+
+# Per-route phase timings (pool acquire, query, fetch, serialize, send) on
+# /metrics. Requests slower than SLOW_REQUEST_SECONDS are logged together with
+# their slowest query; SLOW_REQUEST_SECONDS=0 turns the log off.
+METRICS_ENABLED = env_bool('METRICS_ENABLED', True)
+SLOW_REQUEST_SECONDS = env_float('SLOW_REQUEST_SECONDS', 1.0) or None
+
+request_metrics = RequestMetrics(slow_request_seconds=SLOW_REQUEST_SECONDS)
+if METRICS_ENABLED:
+    request_metrics.init_app(app)
+
+# jsonify formatting. The JMeter plans extract ids with regexes such as
+# "customer_id": "(.+?)", which only match the indented output the debug server
+# produced, so production serving keeps it unless JSON_COMPACT=1.
+JSON_COMPACT = env_bool('JSON_COMPACT', False)
+app.json.compact = JSON_COMPACT
+
+# How the PostgreSQL list routes serialize rows: 'python' (row -> dict -> jsonify),
+# 'postgres' (row_to_json in the query) or 'orjson'; see common.serializers.
+# The last two write compact JSON only and refuse to start without JSON_COMPACT=1.
+POSTGRES_JSON_MODE = env_str('POSTGRES_JSON_MODE', 'python')
+check_json_mode(POSTGRES_JSON_MODE, JSON_COMPACT)
+
+# Read-through cache for the hot GET routes. Without a REDIS_URL an in-process
+# LRU bounded by CACHE_MAX_ENTRIES / CACHE_MAX_BYTES is used instead.
+CACHE_ENABLED = env_bool('CACHE_ENABLED', True)
+REDIS_URL = env_str('REDIS_URL', None) # e.g. 'redis://localhost:6379/0'
+CACHE_TTL = env_int('CACHE_TTL', 60) # seconds
+CACHE_MAX_ENTRIES = env_int('CACHE_MAX_ENTRIES', 256)
+CACHE_MAX_BYTES = env_int('CACHE_MAX_BYTES', 256 * 1024 * 1024)
+# Worker processes serving this app (gunicorn.conf.py exports its count). The
+# in-process LRU and the product LRU below only see their own worker's writes,
+# so with several workers and no REDIS_URL both are turned off instead of
+# serving data another worker already changed.
+WEB_CONCURRENCY = env_int('WEB_CONCURRENCY', 1)
+LOCAL_CACHES = REDIS_URL is not None or WEB_CONCURRENCY == 1
+if not LOCAL_CACHES:
+    print(f"{WEB_CONCURRENCY} workers without a REDIS_URL: response cache and product LRU disabled")
+
+response_cache = create_response_cache(
+    enabled=CACHE_ENABLED and LOCAL_CACHES, redis_url=REDIS_URL, ttl=CACHE_TTL,
+    max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES
+)
+
+# Conditional GET (ETag / Last-Modified from per-table change versions, 304 Not
+# Modified) and gzip/brotli compression for the collection routes; see
+# common/http_cache.py. Compressed bodies are kept per data version in an LRU
+# bounded by HTTP_CACHE_MAX_ENTRIES / HTTP_CACHE_MAX_BYTES.
+HTTP_CACHE_ENABLED = env_bool('HTTP_CACHE_ENABLED', True)
+HTTP_CACHE_MAX_ENTRIES = env_int('HTTP_CACHE_MAX_ENTRIES', 64)
+HTTP_CACHE_MAX_BYTES = env_int('HTTP_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+http_cache = create_http_cache(enabled=HTTP_CACHE_ENABLED, max_entries=HTTP_CACHE_MAX_ENTRIES, max_bytes=HTTP_CACHE_MAX_BYTES)
+
+# Single flight for the collection GET routes: identical requests that arrive
+# while one is running wait for it and share its response instead of running the
+# same query; see common/single_flight.py. A follower waits at most
+# SINGLE_FLIGHT_TIMEOUT seconds before running the query itself.
+SINGLE_FLIGHT_ENABLED = env_bool('SINGLE_FLIGHT_ENABLED', True)
+SINGLE_FLIGHT_TIMEOUT = env_float('SINGLE_FLIGHT_TIMEOUT', 30.0)
+
+single_flight = SingleFlight(timeout=SINGLE_FLIGHT_TIMEOUT, enabled=SINGLE_FLIGHT_ENABLED)
+
+# /orders/full accepts at most this many ids per request.
+ORDER_DETAILS_MAX_IDS = env_int('ORDER_DETAILS_MAX_IDS', 100)
+# Product documents kept in-process for the order detail routes (0 disables),
+# for at most PRODUCT_LRU_TTL seconds.
+PRODUCT_LRU_SIZE = env_int('PRODUCT_LRU_SIZE', 10000)
+PRODUCT_LRU_TTL = env_float('PRODUCT_LRU_TTL', 60.0)
+
+product_cache = ProductLRU(PRODUCT_LRU_SIZE, PRODUCT_LRU_TTL) if PRODUCT_LRU_SIZE and LOCAL_CACHES else None
+
+_pool_lock = threading.Lock()
+_postgres_pool = None
+_mongo_client = None
+_mongo_pool_listener = None
+
+def get_postgres_pool():
+    global _postgres_pool
+    if _postgres_pool is None:
+        with _pool_lock:
+            if _postgres_pool is None:
+                _postgres_pool = PostgresPool(
+                    min_size=POSTGRES_POOL_MIN_SIZE, max_size=POSTGRES_POOL_MAX_SIZE,
+                    acquire_timeout=POSTGRES_POOL_TIMEOUT, check_on_borrow=POSTGRES_POOL_HEALTH_CHECK,
+                    host=POSTGRES_HOST, port=POSTGRES_PORT,
+                    database=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD,
+                    cursor_factory=TimedCursor
+                )
+    return _postgres_pool
+
+def get_postgres_connection():
+    try:
+        with timed_phase('postgres', 'acquire'):
+            return get_postgres_pool().getconn()
+    except Exception as e:
+        print(f"PostgreSQL connection error: {e}")
+        return None
+
+def release_postgres_connection(conn, discard=False):
+    get_postgres_pool().putconn(conn, discard=discard)
+
+def get_mongo_client():
+    global _mongo_client, _mongo_pool_listener
+    if _mongo_client is None:
+        with _pool_lock:
+            if _mongo_client is None:
+                try:
+                    _mongo_client, _mongo_pool_listener = create_mongo_client(
+                        MONGO_HOST, MONGO_PORT, min_size=MONGO_POOL_MIN_SIZE,
+                        max_size=MONGO_POOL_MAX_SIZE, acquire_timeout=MONGO_POOL_TIMEOUT,
+                        event_listeners=[MongoTimingListener()]
+                    )
+                except Exception as e:
+                    print(f"MongoDB connection error: {e}")
+                    return None
+    return _mongo_client
+
+def open_pools():
+    # Run by gunicorn.conf.py in every worker before it accepts requests.
+    get_postgres_pool()
+    get_mongo_client()
+
+def _reset_pools_after_fork():
+    # Each pre-forked worker opens its own pools on first use (or open_pools).
+    global _pool_lock, _postgres_pool, _mongo_client, _mongo_pool_listener
+    abandon_after_fork(_postgres_pool, _mongo_client)
+    _pool_lock = threading.Lock()
+    _postgres_pool = _mongo_client = _mongo_pool_listener = None
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+def postgres_version(*tables):
+    return lambda: postgres_change_version(get_postgres_connection, release_postgres_connection, tables)
+
+def mongo_version(*collections):
+    # No client: no ETag; the route itself answers that MongoDB is unavailable.
+    def version():
+        client = get_mongo_client()
+        return mongo_change_version(client.ecom_hybrid_db, collections) if client else None
+    return version
+
+def bumps_mongo_version(*collections):
+    # MongoDB has no triggers; successful writes bump the versions themselves.
+    # Without a client the write cannot have reached MongoDB, so there is
+    # nothing to bump.
+    def bump():
+        client = get_mongo_client()
+        if client:
+            bump_mongo_change_version(client.ecom_hybrid_db, *collections)
+    return bump_on_write(bump)
+
+@app.route('/')
+def home():
+    return "E-commerce Hybrid Backend is running!"
+
+@app.route('/customers', methods=['GET'])
+@http_cache.conditional('customers', postgres_version('customers'))
+@response_cache.cached('customers')
+@single_flight.coalesced('customers')
+def get_customers():
+    return postgres_list_response(POSTGRES_RESOURCES['customers'], request.args, get_postgres_connection, release_postgres_connection, "customers", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/customers', methods=['POST'])
+@app.route('/customers/<customer_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@bumps_mongo_version('user_profiles')
+@response_cache.cached('customers')
+@single_flight.invalidates('customers', 'user_profiles')
+def customer_item(customer_id=None):
+    response, status = postgres_item_response(
+        POSTGRES_RESOURCES['customers'], customer_id, request.method, request.get_json(silent=True),
+        get_postgres_connection, release_postgres_connection, "customer"
+    )
+    # Every customer has a MongoDB user profile (see the loader); keep them paired.
+    if request.method in ('POST', 'DELETE') and status in (200, 201):
+        client = get_mongo_client()
+        try:
+            customer_id = response.get_json()["customer_id"]
+            if request.method == 'POST':
+                client.ecom_hybrid_db.user_profiles.update_one(
+                    {"customer_id": customer_id},
+                    {"$setOnInsert": {"preferences": {"newsletter": False, "notifications": True}, "last_activity": None}},
+                    upsert=True
+                )
+            else:
+                client.ecom_hybrid_db.user_profiles.delete_one({"customer_id": customer_id})
+        except Exception as e:
+            print(f"Error syncing user profile for customer {customer_id}: {e}")
+    return response, status
+
+@app.route('/customers/_bulk', methods=['POST'])
+@bumps_mongo_version('user_profiles')
+@response_cache.cached('customers')
+@single_flight.invalidates('customers', 'user_profiles')
+def customers_bulk():
+    response, status = postgres_bulk_response(POSTGRES_RESOURCES['customers'], request.get_data(), request.mimetype,
+                                              get_postgres_connection, release_postgres_connection, "customer")
+    if status != 200:
+        return response, status
+    # Same user profile pairing as customer_item, as one unordered bulk_write.
+    requests = []
+    for item in response.get_json()["items"]:
+        if item["op"] == 'create' and item["status"] == 201:
+            requests.append(UpdateOne(
+                {"customer_id": item["customer_id"]},
+                {"$setOnInsert": {"preferences": {"newsletter": False, "notifications": True}, "last_activity": None}},
+                upsert=True
+            ))
+        elif item["op"] == 'delete' and item["status"] == 200:
+            requests.append(DeleteOne({"customer_id": item["customer_id"]}))
+    if requests:
+        client = get_mongo_client()
+        try:
+            client.ecom_hybrid_db.user_profiles.bulk_write(requests, ordered=False)
+        except Exception as e:
+            print(f"Error syncing user profiles for bulk customer request: {e}")
+    return response, status
+
+@app.route('/orders', methods=['GET'])
+@http_cache.conditional('orders', postgres_version('orders', 'order_items'))
+@single_flight.coalesced('orders')
+def get_orders():
+    return postgres_list_response(POSTGRES_RESOURCES['orders'], request.args, get_postgres_connection, release_postgres_connection, "orders", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/order_items', methods=['GET'])
+@http_cache.conditional('order_items', postgres_version('order_items', 'orders'))
+@single_flight.coalesced('order_items')
+def get_order_items():
+    return postgres_list_response(POSTGRES_RESOURCES['order_items'], request.args, get_postgres_connection, release_postgres_connection, "order items", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/orders', methods=['POST'])
+@app.route('/orders/<order_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@single_flight.invalidates('orders', 'order_items')
+def order_item(order_id=None):
+    return postgres_item_response(
+        POSTGRES_RESOURCES['orders'], order_id, request.method, request.get_json(silent=True),
+        get_postgres_connection, release_postgres_connection, "order"
+    )
+
+def order_details_response(order_ids):
+    conn = get_postgres_connection()
+    if not conn: return None, (jsonify({"error": "Failed to connect to PostgreSQL"}), 500)
+    try:
+        cur = conn.cursor()
+        orders = fetch_orders_with_items(cur, order_ids)
+        cur.close()
+    except Exception as e:
+        print(f"Error fetching order details: {e}")
+        return None, (jsonify({"error": "Internal server error"}), 500)
+    finally:
+        if conn: release_postgres_connection(conn)
+
+    client = get_mongo_client()
+    if not client: return None, (jsonify({"error": "Failed to connect to MongoDB"}), 500)
+    try:
+        return attach_products_and_reviews(orders, client.ecom_hybrid_db, product_cache), None
+    except Exception as e:
+        print(f"Error fetching order products/reviews: {e}")
+        return None, (jsonify({"error": "Internal server error"}), 500)
+
+@app.route('/orders/<order_id>/full', methods=['GET'])
+def get_order_full(order_id):
+    orders, error = order_details_response([order_id])
+    if error: return error
+    if order_id not in orders:
+        return jsonify({"error": f"Order '{order_id}' not found"}), 404
+    return jsonify(orders[order_id])
+
+@app.route('/orders/full', methods=['GET'])
+def get_orders_full():
+    order_ids = [i for i in request.args.get('ids', '').split(',') if i]
+    if not order_ids:
+        return jsonify({"error": "ids must list at least one order_id"}), 400
+    if len(order_ids) > ORDER_DETAILS_MAX_IDS:
+        return jsonify({"error": f"At most {ORDER_DETAILS_MAX_IDS} ids per request"}), 400
+    orders, error = order_details_response(order_ids)
+    if error: return error
+    # Requested order; unknown ids are skipped.
+    return jsonify([orders[i] for i in dict.fromkeys(order_ids) if i in orders])
+
+@app.route('/products', methods=['GET'])
+@http_cache.conditional('products', mongo_version('products'))
+@response_cache.cached('products')
+@single_flight.coalesced('products')
+def get_products():
+    client = get_mongo_client()
+    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
+    return mongo_list_response(client.ecom_hybrid_db.products, request.args, "products", filters=DOCUMENT_FILTERS["products"],
+                               fields=DOCUMENT_FIELDS["products"])
+
+@app.route('/products/_bulk', methods=['POST'])
+@bumps_mongo_version('products')
+@response_cache.cached('products')
+@single_flight.invalidates('products')
+def products_bulk():
+    client = get_mongo_client()
+    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
+    response, status = mongo_products_bulk_response(client.ecom_hybrid_db.products, request.get_data(), request.mimetype)
+    if product_cache and status == 200:
+        for item in response.get_json()["items"]:
+            if item["op"] in ('update', 'delete') and item["status"] == 200:
+                product_cache.discard(item["product_id"])
+    return response, status
+
+@app.route('/products', methods=['POST'])
+@app.route('/products/<product_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@bumps_mongo_version('products')
+@response_cache.cached('products')
+@single_flight.invalidates('products')
+def product_item(product_id=None):
+    # Served by the unique products.product_id index created by the loader.
+    client = get_mongo_client()
+    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
+    products = client.ecom_hybrid_db.products
+    body = request.get_json(silent=True)
+    if request.method in ('POST', 'PUT') and not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    if request.method == 'POST':
+        product_id = product_id or body.get('product_id') or uuid.uuid4().hex
+    if body and body.get('product_id') not in (None, product_id):
+        return jsonify({"error": "product_id in body does not match the URL"}), 400
+    try:
+        if request.method == 'GET':
+            product = products.find_one({"product_id": product_id}, {"_id": 0})
+        elif request.method == 'POST':
+            product = product_document_from_fields({**body, "product_id": product_id})
+            products.insert_one(product)
+            del product["_id"]
+            return jsonify(product), 201
+        elif request.method == 'PUT':
+            update = product_update(body)
+            if update:
+                product = products.find_one_and_update(
+                    {"product_id": product_id}, {"$set": update},
+                    projection={"_id": 0}, return_document=ReturnDocument.AFTER
+                )
+                if product_cache: product_cache.discard(product_id)
+            else:
+                product = products.find_one({"product_id": product_id}, {"_id": 0})
+        else:
+            if product_cache: product_cache.discard(product_id)
+            if products.delete_one({"product_id": product_id}).deleted_count:
+                return jsonify({"message": "Product deleted", "product_id": product_id})
+            product = None
+        if product is None:
+            return jsonify({"error": f"Product '{product_id}' not found"}), 404
+        return jsonify(product)
+    except DuplicateKeyError:
+        return jsonify({"error": f"Product '{product_id}' already exists"}), 409
+    except Exception as e:
+        print(f"Error handling {request.method} product {product_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/reviews', methods=['GET'])
+@http_cache.conditional('reviews', mongo_version('reviews'))
+@response_cache.cached('reviews')
+@single_flight.coalesced('reviews')
+def get_reviews():
+    client = get_mongo_client()
+    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
+    return mongo_list_response(client.ecom_hybrid_db.reviews, request.args, "reviews", filters=DOCUMENT_FILTERS["reviews"])
+
+def refresh_ratings(db, product_ids):
+    # Brings the rating of the products a review write touched up to date.
+    if not product_ids:
+        return
+    conn = get_postgres_connection()
+    if not conn:
+        print(f"Error refreshing the ratings of products {sorted(product_ids)}: failed to connect to PostgreSQL")
+        return
+    try:
+        refresh_product_ratings(conn, db, product_ids)
+        response_cache.invalidate('products')
+        if product_cache:
+            for product_id in product_ids:
+                product_cache.discard(product_id)
+    except Exception as e:
+        print(f"Error refreshing the ratings of products {sorted(product_ids)}: {e}")
+    finally:
+        release_postgres_connection(conn)
+
+@app.route('/reviews', methods=['POST'])
+@app.route('/reviews/<review_id>', methods=['GET', 'PUT', 'DELETE'])
+@bumps_mongo_version('reviews', 'products')
+@response_cache.cached('reviews')
+@single_flight.invalidates('reviews', 'products')
+def review_item(review_id=None):
+    # A few Olist review_ids repeat across orders; ?order_id= picks one of them.
+    # Writes update the rating of the products of the review's order(s).
+    client = get_mongo_client()
+    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
+    db = client.ecom_hybrid_db
+    body = request.get_json(silent=True)
+    if request.method in ('POST', 'PUT') and not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    if request.method == 'PUT' and body.get('review_id') not in (None, review_id):
+        return jsonify({"error": "review_id in body does not match the URL"}), 400
+    try:
+        fields = review_update(body or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.method == 'POST' and (not fields.get('order_id') or 'review_score' not in fields):
+        return jsonify({"error": "order_id and review_score are required"}), 400
+    if request.method == 'PUT' and 'order_id' in fields and not fields['order_id']:
+        return jsonify({"error": "order_id must not be empty"}), 400
+
+    try:
+        current = None
+        if request.method != 'POST':
+            selector = {"review_id": review_id, **({"order_id": request.args['order_id']} if 'order_id' in request.args else {})}
+            matches = list(db.reviews.find(selector, {"_id": 0}).limit(2))
+            if not matches:
+                return jsonify({"error": f"Review '{review_id}' not found"}), 404
+            if len(matches) > 1:
+                return jsonify({"error": f"Review '{review_id}' belongs to several orders; pass ?order_id="}), 409
+            current = matches[0]
+            if request.method == 'GET':
+                return jsonify(current)
+    except Exception as e:
+        print(f"Error handling {request.method} review {review_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    # The connection is only held for the order lookup, not across the MongoDB
+    # write; refresh_ratings takes its own.
+    order_ids = {fields.get('order_id'), current and current.get('order_id')} - {None}
+    conn = get_postgres_connection()
+    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
+    try:
+        cur = conn.cursor()
+        products = order_products(cur, order_ids)
+        cur.close()
+        conn.rollback()
+    except Exception as e:
+        print(f"Error handling {request.method} review {review_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        release_postgres_connection(conn)
+    if fields.get('order_id') and fields['order_id'] not in products:
+        return jsonify({"error": f"Order '{fields['order_id']}' not found"}), 404
+
+    try:
+        if request.method == 'POST':
+            review = review_document_from_fields({
+                "review_creation_date": datetime.now().replace(microsecond=0), **fields,
+                "review_id": body.get('review_id') or uuid.uuid4().hex
+            })
+            db.reviews.insert_one(review)
+            del review["_id"]
+            response = (jsonify(review), 201)
+        elif request.method == 'PUT':
+            review = {**current, **fields}
+            if fields:
+                db.reviews.update_one({"review_id": review_id, "order_id": current["order_id"]}, {"$set": fields})
+            response = (jsonify(review), 200)
+        else:
+            db.reviews.delete_one({"review_id": review_id, "order_id": current["order_id"]})
+            response = (jsonify({"message": "Review deleted", "review_id": review_id, "order_id": current["order_id"]}), 200)
+
+        if request.method != 'PUT' or fields.keys() & {'order_id', 'review_score'}:
+            refresh_ratings(db, {p for order_id in order_ids for p in products.get(order_id, [])})
+        return response
+    except DuplicateKeyError:
+        return jsonify({"error": f"Review '{review_id or body.get('review_id')}' already exists for order '{fields.get('order_id')}'"}), 409
+    except Exception as e:
+        print(f"Error handling {request.method} review {review_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/user_profiles', methods=['GET'])
+@http_cache.conditional('user_profiles', mongo_version('user_profiles'))
+@single_flight.coalesced('user_profiles')
+def get_user_profiles():
+    client = get_mongo_client()
+    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
+    return mongo_list_response(client.ecom_hybrid_db.user_profiles, request.args, "user profiles")
+
+@app.route('/analytics/revenue_by_month', methods=['GET'])
+def get_revenue_by_month():
+    return postgres_report_response('revenue_by_month', request.args, get_postgres_connection, release_postgres_connection)
+
+@app.route('/analytics/revenue_by_seller', methods=['GET'])
+def get_revenue_by_seller():
+    return postgres_report_response('revenue_by_seller', request.args, get_postgres_connection, release_postgres_connection)
+
+@app.route('/analytics/revenue_by_category', methods=['GET'])
+def get_revenue_by_category():
+    # Categories live in MongoDB; the loader aggregates them into category_sales.
+    client = get_mongo_client()
+    if not client: return jsonify({"error": "Failed to connect to MongoDB"}), 500
+    return mongo_report_response(client.ecom_hybrid_db.category_sales, request.args, CATEGORY_SALES_SORT, "revenue by category")
+
+@app.route('/pool_stats', methods=['GET'])
+def get_pool_stats():
+    return jsonify({
+        "postgres": _postgres_pool.stats() if _postgres_pool else None,
+        "mongo": _mongo_pool_listener.stats() if _mongo_pool_listener else None
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def get_cache_stats():
+    stats = response_cache.stats()
+    stats["product_lru"] = product_cache.stats() if product_cache else None
+    stats["http"] = http_cache.stats()
+    stats["single_flight"] = single_flight.stats()
+    return jsonify(stats)
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5000, host='0.0.0.0')
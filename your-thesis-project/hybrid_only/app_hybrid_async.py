@@ -0,0 +1,532 @@
+# asyncio variant of app_hybrid.py: the same routes on Quart with asyncpg and
+# PyMongo's AsyncMongoClient, so a waiting database call does not hold a thread.
+# Serve it with an ASGI server, e.g.
+#   WEB_CONCURRENCY=4 hypercorn app_hybrid_async:app --bind 0.0.0.0:5000 --workers 4
+# Every worker opens its own pools in open_pools (before_serving), after the fork.
+from quart import Quart, Response, jsonify, make_response, request
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+from functools import wraps
+import asyncpg
+from pymongo import AsyncMongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.analytics import CATEGORY_SALES_SORT, parse_report_limit, report_document, report_query
+from common.db_pool import MongoPoolListener
+from common.documents import DOCUMENT_FIELDS, DOCUMENT_FILTERS, product_document_from_fields, product_update
+from common.http_cache import bump_mongo_change_version_async
+from common.listing import (STREAM_ABORTED, STREAM_BATCH_SIZE, STREAM_FORMATS, mongo_projection, object_id, parse_cursor_arg,
+                            parse_fields_arg, parse_filter_args, parse_list_args, parse_mongo_filter_args)
+from common.order_details import (ORDER_DETAILS_SQL_ASYNC, ProductLRU, attach_products, attach_reviews,
+                                  group_order_rows, referenced_product_ids)
+from common.serializers import POSTGRES_RESOURCES
+from common.settings import env_bool, env_float, env_int, env_str
+
+app = Quart(__name__)
+
+POSTGRES_HOST = env_str('POSTGRES_HOST', 'localhost')
+POSTGRES_PORT = env_str('POSTGRES_PORT', '5433')
+POSTGRES_DB = env_str('POSTGRES_DB', 'ecom_hybrid_db')
+POSTGRES_USER = env_str('POSTGRES_USER', 'user')
+POSTGRES_PASSWORD = env_str('POSTGRES_PASSWORD', 'password')
+
+MONGO_HOST = env_str('MONGO_HOST', 'localhost')
+MONGO_PORT = env_int('MONGO_PORT', 27017)
+
+# One event loop multiplexes all requests, so the pools bound database
+# concurrency rather than request concurrency.
+POSTGRES_POOL_MIN_SIZE = env_int('POSTGRES_POOL_MIN_SIZE', 5)
+POSTGRES_POOL_MAX_SIZE = env_int('POSTGRES_POOL_MAX_SIZE', 20)
+POSTGRES_POOL_TIMEOUT = env_float('POSTGRES_POOL_TIMEOUT', 5.0) # seconds a request waits for a free connection
+MONGO_POOL_MIN_SIZE = env_int('MONGO_POOL_MIN_SIZE', 0)
+MONGO_POOL_MAX_SIZE = env_int('MONGO_POOL_MAX_SIZE', 100)
+MONGO_POOL_TIMEOUT = env_float('MONGO_POOL_TIMEOUT', 5.0)
+
+# Same jsonify formatting switch as app_hybrid.py (the JMeter regexes need the
+# indented form).
+JSON_COMPACT = env_bool('JSON_COMPACT', False)
+app.json.compact = JSON_COMPACT
+
+ORDER_DETAILS_MAX_IDS = env_int('ORDER_DETAILS_MAX_IDS', 100)
+PRODUCT_LRU_SIZE = env_int('PRODUCT_LRU_SIZE', 10000)
+PRODUCT_LRU_TTL = env_float('PRODUCT_LRU_TTL', 60.0)
+# The product LRU only sees its own worker's writes; with several workers
+# (set WEB_CONCURRENCY to hypercorn's --workers) it is turned off.
+WEB_CONCURRENCY = env_int('WEB_CONCURRENCY', 1)
+
+product_cache = ProductLRU(PRODUCT_LRU_SIZE, PRODUCT_LRU_TTL) if PRODUCT_LRU_SIZE and WEB_CONCURRENCY == 1 else None
+
+postgres_pool = None
+mongo_client = None
+mongo_pool_listener = MongoPoolListener()
+
+@app.before_serving
+async def open_pools():
+    global postgres_pool, mongo_client
+    postgres_pool = await asyncpg.create_pool(
+        host=POSTGRES_HOST, port=int(POSTGRES_PORT),
+        database=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD,
+        min_size=POSTGRES_POOL_MIN_SIZE, max_size=POSTGRES_POOL_MAX_SIZE
+    )
+    mongo_client = AsyncMongoClient(
+        f'mongodb://{MONGO_HOST}:{MONGO_PORT}/',
+        minPoolSize=MONGO_POOL_MIN_SIZE, maxPoolSize=MONGO_POOL_MAX_SIZE,
+        waitQueueTimeoutMS=int(MONGO_POOL_TIMEOUT * 1000), event_listeners=[mongo_pool_listener]
+    )
+    await mongo_client.admin.command('ping')
+
+@app.after_serving
+async def close_pools():
+    if postgres_pool: await postgres_pool.close()
+    if mongo_client: await mongo_client.close()
+
+@app.after_request
+async def allow_cors(response):
+    # Equivalent of flask_cors.CORS(app) with its defaults.
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def db():
+    return mongo_client.ecom_hybrid_db
+
+def bumps_mongo_version(*collections):
+    # Successful writes bump the MongoDB change versions behind app_hybrid.py's
+    # ETags and cache keys, as its own write routes do; both apps share the
+    # database.
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            response = await make_response(await view(*args, **kwargs))
+            if request.method != 'GET' and response.status_code < 400:
+                try:
+                    await bump_mongo_change_version_async(db(), *collections)
+                except Exception as e:
+                    print(f"Change version bump error ({request.path}): {e}")
+            return response
+        return wrapper
+    return decorator
+
+async def encode_stream(batches, stream_format, label):
+    # batches: async iterator of lists of dicts. A failure mid-stream ends the
+    # body with STREAM_ABORTED and is re-raised, so the server drops the
+    # connection (see common.listing).
+    separator = '\n' if stream_format == 'ndjson' else ','
+    # Compact documents when jsonify is, like the streams of app_hybrid.py.
+    dump_options = {"separators": (',', ':')} if app.json.compact else {}
+    first = True
+    if stream_format == 'json': yield '['
+    try:
+        async for batch in batches:
+            if not batch: continue
+            chunk = separator.join(app.json.dumps(doc, **dump_options) for doc in batch)
+            if stream_format == 'ndjson':
+                yield chunk + '\n'
+            else:
+                yield chunk if first else ',' + chunk
+            first = False
+    except Exception as e:
+        print(f"Error streaming {label}: {e}")
+        yield STREAM_ABORTED
+        raise
+    if stream_format == 'json': yield ']'
+
+async def streamed_response(batches, stream_format, label):
+    # The first batch is fetched before the response starts, so a query that
+    # fails right away still gets a 500.
+    batches = batches.__aiter__()
+    try:
+        first = await batches.__anext__()
+    except StopAsyncIteration:
+        first = []
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    async def all_batches():
+        yield first
+        async for batch in batches:
+            yield batch
+    return Response(encode_stream(all_batches(), stream_format, label), mimetype=STREAM_FORMATS[stream_format])
+
+@app.route('/')
+async def home():
+    return "E-commerce Hybrid Backend (async) is running!"
+
+async def postgres_list(name, label):
+    resource = POSTGRES_RESOURCES[name]
+    try:
+        limit, after, stream = parse_list_args(request.args, resource['key_type'])
+        cursor = parse_cursor_arg(request.args)
+        filters = parse_filter_args(resource, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    columns = ", ".join(resource['columns'])
+    key, table, to_dict = resource['key'], resource['table'], resource['to_dict']
+    key_index = resource['columns'].index(key)
+    values = [value for _, value in filters]
+
+    def select(after=False, ordered=False, limited=False):
+        # common.listing._list_query with asyncpg's $n placeholders; parameters
+        # go in the order: filter values, after, limit. Each condition has one.
+        conditions = [condition.replace('%s', f"${i}") for i, (condition, _) in enumerate(filters, start=1)]
+        if after:
+            conditions.append(f"{key} > ${len(conditions) + 1}")
+        query = f"SELECT {columns} FROM {table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if ordered:
+            query += f" ORDER BY {key}"
+        if limited:
+            query += f" LIMIT ${len(conditions) + 1}"
+        return query
+
+    async def keyset_batches(after, limit, batch_size):
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            async with postgres_pool.acquire(timeout=POSTGRES_POOL_TIMEOUT) as conn:
+                if after is None:
+                    rows = await conn.fetch(select(ordered=True, limited=True), *values, size)
+                else:
+                    rows = await conn.fetch(select(after=True, ordered=True, limited=True), *values, after, size)
+            yield rows
+            if len(rows) < size: return
+            after = rows[-1][key_index]
+            if remaining is not None: remaining -= len(rows)
+
+    async def cursor_batches(after, limit, batch_size):
+        # Single query through a server-side cursor (see common.listing).
+        query = select(after=after is not None, ordered=after is not None or limit is not None, limited=limit is not None)
+        params = values + [p for p in (after, limit) if p is not None]
+        async with postgres_pool.acquire(timeout=POSTGRES_POOL_TIMEOUT) as conn:
+            async with conn.transaction(readonly=True):
+                rows = await conn.cursor(query, *params)
+                while True:
+                    batch = await rows.fetch(batch_size)
+                    if not batch: return
+                    yield batch
+
+    if stream:
+        batches = cursor_batches if cursor == 'server' else keyset_batches
+        async def docs():
+            async for rows in batches(after, limit, STREAM_BATCH_SIZE):
+                yield [to_dict(r) for r in rows]
+        return await streamed_response(docs(), stream, label)
+    try:
+        if limit is not None:
+            rows = [r async for batch in keyset_batches(after, limit, limit) for r in batch]
+            response = jsonify([to_dict(r) for r in rows])
+            if len(rows) == limit:
+                response.headers['X-Next-After'] = str(rows[-1][key_index])
+            return response
+        async with postgres_pool.acquire(timeout=POSTGRES_POOL_TIMEOUT) as conn:
+            if after is None:
+                rows = await conn.fetch(select(), *values)
+            else:
+                rows = await conn.fetch(select(after=True, ordered=True), *values, after)
+        return jsonify([to_dict(r) for r in rows])
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+async def mongo_list(name, label):
+    try:
+        limit, after, stream = parse_list_args(request.args, object_id)
+        query = parse_mongo_filter_args(DOCUMENT_FILTERS.get(name), request.args)
+        fields = parse_fields_arg(DOCUMENT_FIELDS.get(name), request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    collection = db()[name]
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    try:
+        if limit is not None and not stream:
+            docs = await collection.find(query, mongo_projection(fields, with_id=True)).sort("_id", 1).limit(limit).to_list()
+            last_id = docs[-1]["_id"] if docs else None
+            for doc in docs: del doc["_id"]
+            response = jsonify(docs)
+            if len(docs) == limit:
+                response.headers['X-Next-After'] = str(last_id)
+            return response
+        cursor = collection.find(query, mongo_projection(fields), batch_size=STREAM_BATCH_SIZE)
+        if after is not None or limit is not None:
+            cursor = cursor.sort("_id", 1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        if stream:
+            async def docs():
+                batch = []
+                async for doc in cursor:
+                    batch.append(doc)
+                    if len(batch) >= STREAM_BATCH_SIZE:
+                        yield batch
+                        batch = []
+                yield batch
+            return await streamed_response(docs(), stream, label)
+        return jsonify(await cursor.to_list())
+    except Exception as e:
+        print(f"Error fetching {label}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/customers', methods=['GET'])
+async def get_customers():
+    return await postgres_list('customers', "customers")
+
+@app.route('/orders', methods=['GET'])
+async def get_orders():
+    return await postgres_list('orders', "orders")
+
+@app.route('/order_items', methods=['GET'])
+async def get_order_items():
+    return await postgres_list('order_items', "order items")
+
+@app.route('/products', methods=['GET'])
+async def get_products():
+    return await mongo_list('products', "products")
+
+@app.route('/reviews', methods=['GET'])
+async def get_reviews():
+    return await mongo_list('reviews', "reviews")
+
+@app.route('/user_profiles', methods=['GET'])
+async def get_user_profiles():
+    return await mongo_list('user_profiles', "user profiles")
+
+def to_query_args(resource, data):
+    # asyncpg binds parameters by column type: timestamps must be datetimes and
+    # VARCHAR columns strings, where psycopg2 let PostgreSQL parse the text.
+    args = {}
+    for column, value in data.items():
+        if value is not None and column in resource.get('timestamps', ()):
+            value = datetime.fromisoformat(value) if isinstance(value, str) else value
+        elif value is not None and not isinstance(value, str):
+            value = str(value)
+        args[column] = value
+    return args
+
+async def postgres_item(name, key, label):
+    # Async counterpart of common.pg_crud.postgres_item_response.
+    resource = POSTGRES_RESOURCES[name]
+    method = request.method
+    body = await request.get_json(silent=True) if method in ('POST', 'PUT') else None
+    if method in ('POST', 'PUT') and not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    if method == 'POST' and key is None:
+        key = body.get(resource['key']) or uuid.uuid4().hex
+    if body and body.get(resource['key']) not in (None, key):
+        return jsonify({"error": f"{resource['key']} in body does not match the URL"}), 400
+    try:
+        data = to_query_args(resource, {c: body[c] for c in resource['columns'] if c in body and c != resource['key']} if body else {})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid {label} data: {e}"}), 400
+    table, columns, key_column = resource['table'], ", ".join(resource['columns']), resource['key']
+    try:
+        async with postgres_pool.acquire(timeout=POSTGRES_POOL_TIMEOUT) as conn:
+            async with conn.transaction():
+                if method == 'GET' or (method == 'PUT' and not data):
+                    row = await conn.fetchrow(f"SELECT {columns} FROM {table} WHERE {key_column} = $1;", key)
+                elif method == 'POST':
+                    values = {**data, key_column: key}
+                    placeholders = ", ".join(f"${i}" for i in range(1, len(values) + 1))
+                    row = await conn.fetchrow(
+                        f"INSERT INTO {table} ({', '.join(values)}) VALUES ({placeholders}) RETURNING {columns};",
+                        *values.values()
+                    )
+                elif method == 'PUT':
+                    assignments = ", ".join(f"{c} = ${i}" for i, c in enumerate(data, start=2))
+                    row = await conn.fetchrow(
+                        f"UPDATE {table} SET {assignments} WHERE {key_column} = $1 RETURNING {columns};", key, *data.values()
+                    )
+                else:
+                    for child_table, child_column in resource.get('children', ()):
+                        await conn.execute(f"DELETE FROM {child_table} WHERE {child_column} = $1;", key)
+                    deleted = await conn.fetchval(f"DELETE FROM {table} WHERE {key_column} = $1 RETURNING {key_column};", key)
+                    if deleted is not None:
+                        return jsonify({"message": f"{label.capitalize()} deleted", key_column: key}), 200
+                    row = None
+        if row is None:
+            return jsonify({"error": f"{label.capitalize()} '{key}' not found"}), 404
+        return jsonify(resource['to_dict'](row)), 201 if method == 'POST' else 200
+    except asyncpg.UniqueViolationError:
+        return jsonify({"error": f"{label.capitalize()} '{key}' already exists"}), 409
+    except asyncpg.ForeignKeyViolationError as e:
+        return jsonify({"error": f"{label.capitalize()} '{key}' violates a reference: {e.detail}"}), 409
+    except (asyncpg.DataError, asyncpg.NotNullViolationError) as e:
+        return jsonify({"error": f"Invalid {label} data: {e}"}), 400
+    except Exception as e:
+        print(f"Error handling {method} {label} {key}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/customers', methods=['POST'])
+@app.route('/customers/<customer_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@bumps_mongo_version('user_profiles')
+async def customer_item(customer_id=None):
+    response, status = await postgres_item('customers', customer_id, "customer")
+    if request.method in ('POST', 'DELETE') and status in (200, 201):
+        try:
+            customer_id = (await response.get_json())["customer_id"]
+            if request.method == 'POST':
+                await db().user_profiles.update_one(
+                    {"customer_id": customer_id},
+                    {"$setOnInsert": {"preferences": {"newsletter": False, "notifications": True}, "last_activity": None}},
+                    upsert=True
+                )
+            else:
+                await db().user_profiles.delete_one({"customer_id": customer_id})
+        except Exception as e:
+            print(f"Error syncing user profile for customer {customer_id}: {e}")
+    return response, status
+
+@app.route('/orders', methods=['POST'])
+@app.route('/orders/<order_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+async def order_item(order_id=None):
+    return await postgres_item('orders', order_id, "order")
+
+@app.route('/products', methods=['POST'])
+@app.route('/products/<product_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@bumps_mongo_version('products')
+async def product_item(product_id=None):
+    products = db().products
+    body = await request.get_json(silent=True) if request.method in ('POST', 'PUT') else None
+    if request.method in ('POST', 'PUT') and not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    if request.method == 'POST':
+        product_id = product_id or body.get('product_id') or uuid.uuid4().hex
+    if body and body.get('product_id') not in (None, product_id):
+        return jsonify({"error": "product_id in body does not match the URL"}), 400
+    try:
+        if request.method == 'GET':
+            product = await products.find_one({"product_id": product_id}, {"_id": 0})
+        elif request.method == 'POST':
+            product = product_document_from_fields({**body, "product_id": product_id})
+            await products.insert_one(product)
+            del product["_id"]
+            return jsonify(product), 201
+        elif request.method == 'PUT':
+            update = product_update(body)
+            if update:
+                product = await products.find_one_and_update(
+                    {"product_id": product_id}, {"$set": update},
+                    projection={"_id": 0}, return_document=ReturnDocument.AFTER
+                )
+                if product_cache: product_cache.discard(product_id)
+            else:
+                product = await products.find_one({"product_id": product_id}, {"_id": 0})
+        else:
+            if product_cache: product_cache.discard(product_id)
+            if (await products.delete_one({"product_id": product_id})).deleted_count:
+                return jsonify({"message": "Product deleted", "product_id": product_id})
+            product = None
+        if product is None:
+            return jsonify({"error": f"Product '{product_id}' not found"}), 404
+        return jsonify(product)
+    except DuplicateKeyError:
+        return jsonify({"error": f"Product '{product_id}' already exists"}), 409
+    except Exception as e:
+        print(f"Error handling {request.method} product {product_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+async def fetch_order_details(order_ids):
+    # Orders/items (PostgreSQL) and reviews (MongoDB) only depend on the order ids,
+    # so they are fetched concurrently; products follow once the items are known.
+    async def orders_with_items():
+        async with postgres_pool.acquire(timeout=POSTGRES_POOL_TIMEOUT) as conn:
+            return group_order_rows(await conn.fetch(ORDER_DETAILS_SQL_ASYNC, order_ids))
+
+    async def reviews():
+        return await db().reviews.find({"order_id": {"$in": order_ids}}, {"_id": 0}).to_list()
+
+    orders, order_reviews = await asyncio.gather(orders_with_items(), reviews())
+    product_ids = list(referenced_product_ids(orders))
+    products = product_cache.get_many(product_ids) if product_cache else {}
+    missing = [p for p in product_ids if p not in products]
+    if missing:
+        fetched = {p["product_id"]: p async for p in db().products.find({"product_id": {"$in": missing}}, {"_id": 0})}
+        if product_cache: product_cache.put_many(fetched)
+        products.update(fetched)
+    attach_products(orders, products)
+    attach_reviews(orders, order_reviews)
+    return orders
+
+@app.route('/orders/<order_id>/full', methods=['GET'])
+async def get_order_full(order_id):
+    try:
+        orders = await fetch_order_details([order_id])
+    except Exception as e:
+        print(f"Error fetching order details: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    if order_id not in orders:
+        return jsonify({"error": f"Order '{order_id}' not found"}), 404
+    return jsonify(orders[order_id])
+
+@app.route('/orders/full', methods=['GET'])
+async def get_orders_full():
+    order_ids = list(dict.fromkeys(i for i in request.args.get('ids', '').split(',') if i))
+    if not order_ids:
+        return jsonify({"error": "ids must list at least one order_id"}), 400
+    if len(order_ids) > ORDER_DETAILS_MAX_IDS:
+        return jsonify({"error": f"At most {ORDER_DETAILS_MAX_IDS} ids per request"}), 400
+    try:
+        orders = await fetch_order_details(order_ids)
+    except Exception as e:
+        print(f"Error fetching order details: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    return jsonify([orders[i] for i in order_ids if i in orders])
+
+async def postgres_report(report):
+    try:
+        limit = parse_report_limit(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        async with postgres_pool.acquire(timeout=POSTGRES_POOL_TIMEOUT) as conn:
+            if limit is None:
+                rows = await conn.fetch(report_query(report))
+            else:
+                rows = await conn.fetch(report_query(report, limited=True, placeholder='$1'), limit)
+        return jsonify([report_document(dict(r)) for r in rows])
+    except asyncpg.UndefinedTableError:
+        return jsonify({"error": "Analytics views do not exist yet; run the data loader"}), 503
+    except Exception as e:
+        print(f"Error fetching {report}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/analytics/revenue_by_month', methods=['GET'])
+async def get_revenue_by_month():
+    return await postgres_report('revenue_by_month')
+
+@app.route('/analytics/revenue_by_seller', methods=['GET'])
+async def get_revenue_by_seller():
+    return await postgres_report('revenue_by_seller')
+
+@app.route('/analytics/revenue_by_category', methods=['GET'])
+async def get_revenue_by_category():
+    try:
+        limit = parse_report_limit(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        cursor = db().category_sales.find({}, {"_id": 0}).sort(CATEGORY_SALES_SORT)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return jsonify([report_document(doc) for doc in await cursor.to_list()])
+    except Exception as e:
+        print(f"Error fetching revenue by category: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/pool_stats', methods=['GET'])
+async def get_pool_stats():
+    return jsonify({
+        "postgres": {
+            "min_size": postgres_pool.get_min_size(), "max_size": postgres_pool.get_max_size(),
+            "size": postgres_pool.get_size(), "idle": postgres_pool.get_idle_size(),
+        } if postgres_pool else None,
+        "mongo": mongo_pool_listener.stats()
+    })
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5000, host='0.0.0.0')
@@ -1,191 +1,272 @@
-import psycopg2
-from pymongo import MongoClient
-import pandas as pd
-import numpy as np
-import time
-import os
-
-POSTGRES_HOST = 'localhost'
-POSTGRES_PORT = '5433'
-POSTGRES_DB = 'ecom_hybrid_db'
-POSTGRES_USER = 'user'
-POSTGRES_PASSWORD = 'password'
-
-MONGO_HOST = 'localhost'
-MONGO_PORT = 27017
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-OLIST_DATA_PATH = os.path.join(BASE_DIR, '..', 'data')
-
-def get_postgres_connection():
-    try:
-        conn = psycopg2.connect(
-            host=POSTGRES_HOST, port=POSTGRES_PORT,
-            database=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD
-        )
-        return conn
-    except Exception as e:
-        print(f"PostgreSQL connection error: {e}")
-        return None
-
-def get_mongo_client():
-    try:
-        client = MongoClient(f'mongodb://{MONGO_HOST}:{MONGO_PORT}/')
-        client.admin.command('ismaster')
-        return client
-    except Exception as e:
-        print(f"MongoDB connection error: {e}")
-        return None
-
-def create_postgres_tables(cursor):
-    cursor.execute("DROP TABLE IF EXISTS order_items CASCADE; DROP TABLE IF EXISTS orders CASCADE; DROP TABLE IF EXISTS customers CASCADE;")
-    cursor.execute("""
-        CREATE TABLE customers (
-            customer_id VARCHAR(50) PRIMARY KEY, customer_unique_id VARCHAR(50) NOT NULL,
-            customer_zip_code_prefix VARCHAR(10), customer_city VARCHAR(100), customer_state VARCHAR(50)
-        );
-    """)
-    cursor.execute("""
-        CREATE TABLE orders (
-            order_id VARCHAR(50) PRIMARY KEY, customer_id VARCHAR(50) REFERENCES customers(customer_id),
-            order_status VARCHAR(50), order_purchase_timestamp TIMESTAMP, order_approved_at TIMESTAMP,
-            order_delivered_carrier_date TIMESTAMP, order_delivered_customer_date TIMESTAMP,
-            order_estimated_delivery_date TIMESTAMP
-        );
-    """)
-    cursor.execute("""
-        CREATE TABLE order_items (
-            order_item_id SERIAL PRIMARY KEY, order_id VARCHAR(50) REFERENCES orders(order_id),
-            product_id VARCHAR(50), seller_id VARCHAR(50), shipping_limit_date TIMESTAMP,
-            price DECIMAL(10, 2), freight_value DECIMAL(10, 2)
-        );
-    """)
-    print("PostgreSQL tables recreated.")
-
-def load_postgres_data(conn):
-    cursor = conn.cursor()
-    try:
-        customers_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_customers_dataset.csv')).replace({np.nan: None})
-        print(f"Loading {len(customers_df)} customers...")
-        for index, row in customers_df.iterrows():
-            cursor.execute(
-                "INSERT INTO customers (customer_id, customer_unique_id, customer_zip_code_prefix, customer_city, customer_state) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (customer_id) DO NOTHING;",
-                (row['customer_id'], row['customer_unique_id'], row['customer_zip_code_prefix'], row['customer_city'], row['customer_state'])
-            )
-        print("Customers loaded.")
-
-        orders_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_orders_dataset.csv'))
-        timestamp_cols = ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date', 'order_delivered_customer_date', 'order_estimated_delivery_date']
-        for col in timestamp_cols: orders_df[col] = pd.to_datetime(orders_df[col], errors='coerce')
-        orders_df = orders_df.replace({np.nan: None})
-        print(f"Loading {len(orders_df)} orders...")
-        for index, row in orders_df.iterrows():
-            cursor.execute(
-                """INSERT INTO orders (order_id, customer_id, order_status, order_purchase_timestamp, 
-                                    order_approved_at, order_delivered_carrier_date, 
-                                    order_delivered_customer_date, order_estimated_delivery_date) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT (order_id) DO NOTHING;""",
-                (row['order_id'], row['customer_id'], row['order_status'], row['order_purchase_timestamp'],
-                 row['order_approved_at'], row['order_delivered_carrier_date'],
-                 row['order_delivered_customer_date'], row['order_estimated_delivery_date'])
-            )
-        print("Orders loaded.")
-
-        order_items_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_order_items_dataset.csv'))
-        order_items_df['shipping_limit_date'] = pd.to_datetime(order_items_df['shipping_limit_date'], errors='coerce')
-        order_items_df = order_items_df.replace({np.nan: None})
-        print(f"Loading {len(order_items_df)} order items...")
-        items_to_insert = [(row['order_id'], row['product_id'], row['seller_id'], row['shipping_limit_date'], row['price'], row['freight_value']) for index, row in order_items_df.iterrows()]
-        if items_to_insert: cursor.executemany("""INSERT INTO order_items (order_id, product_id, seller_id, shipping_limit_date, price, freight_value) VALUES (%s, %s, %s, %s, %s, %s);""", items_to_insert)
-        print("Order items loaded.")
-        conn.commit()
-    except FileNotFoundError as e: print(f"Error: Olist CSV file not found. Ensure CSVs are in '{OLIST_DATA_PATH}'. {e}"); conn.rollback()
-    except Exception as e: print(f"Error loading PostgreSQL data: {e}"); conn.rollback()
-    finally: cursor.close()
-
-def load_mongodb_data(mongo_client):
-    db = mongo_client.ecom_hybrid_db
-    db.products.drop(); db.reviews.drop(); db.user_profiles.drop()
-    print("MongoDB collections dropped.")
-
-    try:
-        products_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_products_dataset.csv')).replace({np.nan: None})
-        products_data = []
-        for index, row in products_df.iterrows():
-            product_doc = {
-                "product_id": row['product_id'],
-                "product_category_name": row['product_category_name'],
-                # CORRECTED: Changed 'length' to 'lenght'
-                "product_name_length": row['product_name_lenght'],
-                "product_description_length": row['product_description_lenght'],
-                "product_photos_qty": row['product_photos_qty'],
-                "product_weight_g": row['product_weight_g'],
-                "product_length_cm": row['product_length_cm'],
-                "product_height_cm": row['product_height_cm'],
-                "product_width_cm": row['product_width_cm'],
-                "specs": {
-                    "weight_g": row['product_weight_g'],
-                    "dimensions_cm": {
-                        "length": row['product_length_cm'],
-                        "height": row['product_height_cm'],
-                        "width": row['product_width_cm']
-                    }
-                },
-                "tags": [row['product_category_name']] if row['product_category_name'] else ["unknown"]
-            }
-            products_data.append(product_doc)
-        if products_data: print(f"Loading {len(products_data)} products..."); db.products.insert_many(products_data); print("Products loaded.")
-        else: print("No product data.")
-
-        reviews_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_order_reviews_dataset.csv'))
-        reviews_df['review_creation_date'] = pd.to_datetime(reviews_df['review_creation_date'], errors='coerce')
-        reviews_df['review_answer_timestamp'] = pd.to_datetime(reviews_df['review_answer_timestamp'], errors='coerce')
-        reviews_df = reviews_df.replace({np.nan: None})
-        reviews_data = reviews_df.to_dict(orient='records')
-        if reviews_data: print(f"Loading {len(reviews_data)} reviews..."); db.reviews.insert_many(reviews_data); print("Reviews loaded.")
-        else: print("No review data.")
-
-        customers_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_customers_dataset.csv'))
-        unique_customer_ids = customers_df['customer_id'].unique()
-        user_profiles_data = [{"customer_id": cust_id, "preferences": {"newsletter": False, "notifications": True}, "last_activity": None} for cust_id in unique_customer_ids]
-        if user_profiles_data: print(f"Loading {len(user_profiles_data)} user profiles..."); db.user_profiles.insert_many(user_profiles_data); print("User profiles loaded.")
-        else: print("No user profiles.")
-
-    except FileNotFoundError as e: print(f"Error: Olist CSV file not found. Ensure CSVs are in '{OLIST_DATA_PATH}'. {e}")
-    except Exception as e: print(f"Error loading MongoDB data: {e}")
-
-if __name__ == "__main__":
-    postgres_conn = None
-    mongo_client = None
-    max_retries = 15 
-    retry_delay = 5 
-
-    for i in range(max_retries):
-        print(f"Attempting to connect to PostgreSQL (attempt {i+1}/{max_retries})...")
-        postgres_conn = get_postgres_connection()
-        if postgres_conn:
-            print("PostgreSQL connection successful!")
-            break
-        time.sleep(retry_delay)
-    
-    for i in range(max_retries):
-        print(f"Attempting to connect to MongoDB (attempt {i+1}/{max_retries})...")
-        mongo_client = get_mongo_client()
-        if mongo_client:
-            print("MongoDB connection successful!")
-            break
-        time.sleep(retry_delay)
-
-    if postgres_conn and mongo_client:
-        try:
-            print("--- Starting Olist Data Loading ---")
-            cursor = postgres_conn.cursor()
-            create_postgres_tables(cursor)
-            load_postgres_data(postgres_conn)
-            load_mongodb_data(mongo_client)
-            print("--- Olist Data Loading Completed ---")
-        except Exception as e: print(f"An error occurred during Olist data loading: {e}")
-        finally:
-            if postgres_conn: postgres_conn.close(); print("PostgreSQL connection closed.")
-            if mongo_client: mongo_client.close(); print("MongoDB connection closed.")
-    else: print("Failed to connect to one or both databases. Data loading aborted.")
+import psycopg2
+from pymongo import MongoClient
+import pandas as pd
+import numpy as np
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..'))
+from common.settings import env_int, env_str
+
+POSTGRES_HOST = env_str('POSTGRES_HOST', 'localhost')
+POSTGRES_PORT = env_str('POSTGRES_PORT', '5433')
+POSTGRES_DB = env_str('POSTGRES_DB', 'ecom_hybrid_db')
+POSTGRES_USER = env_str('POSTGRES_USER', 'user')
+POSTGRES_PASSWORD = env_str('POSTGRES_PASSWORD', 'password')
+
+MONGO_HOST = env_str('MONGO_HOST', 'localhost')
+MONGO_PORT = env_int('MONGO_PORT', 27017)
+
+MONGO_INSERT_BATCH_SIZE = env_int('MONGO_INSERT_BATCH_SIZE', 5000)
+MONGO_INSERT_WORKERS = env_int('MONGO_INSERT_WORKERS', 4)
+
+OLIST_DATA_PATH = env_str('OLIST_DATA_PATH', os.path.join(BASE_DIR, '..', 'data'))
+
+from common.analytics import refresh_mongo_category_sales, refresh_sales_views
+from common.documents import (build_category_translation_documents, build_product_documents, build_review_documents,
+                              build_user_profile_documents)
+from common.http_cache import bump_mongo_change_version
+from common.incremental import incremental_load_postgres_data, incremental_sync_mongo_source, save_mongo_fingerprint
+from common import snapshots
+from common.ratings import refresh_product_ratings
+from common.pg_loader import LOAD_METHODS, bulk_load_postgres_data, check_filter_indexes, create_postgres_tables
+from common.snapshots import file_fingerprint, read_olist_csv
+
+def get_postgres_connection():
+    try:
+        conn = psycopg2.connect(
+            host=POSTGRES_HOST, port=POSTGRES_PORT,
+            database=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD
+        )
+        return conn
+    except Exception as e:
+        print(f"PostgreSQL connection error: {e}")
+        return None
+
+def get_mongo_client():
+    try:
+        client = MongoClient(f'mongodb://{MONGO_HOST}:{MONGO_PORT}/')
+        client.admin.command('ismaster')
+        return client
+    except Exception as e:
+        print(f"MongoDB connection error: {e}")
+        return None
+
+def load_postgres_data(conn):
+    cursor = conn.cursor()
+    try:
+        customers_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_customers_dataset.csv')).replace({np.nan: None})
+        print(f"Loading {len(customers_df)} customers...")
+        for index, row in customers_df.iterrows():
+            cursor.execute(
+                "INSERT INTO customers (customer_id, customer_unique_id, customer_zip_code_prefix, customer_city, customer_state) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (customer_id) DO NOTHING;",
+                (row['customer_id'], row['customer_unique_id'], row['customer_zip_code_prefix'], row['customer_city'], row['customer_state'])
+            )
+        print("Customers loaded.")
+
+        orders_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_orders_dataset.csv'))
+        timestamp_cols = ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date', 'order_delivered_customer_date', 'order_estimated_delivery_date']
+        for col in timestamp_cols: orders_df[col] = pd.to_datetime(orders_df[col], errors='coerce')
+        orders_df = orders_df.replace({np.nan: None})
+        print(f"Loading {len(orders_df)} orders...")
+        for index, row in orders_df.iterrows():
+            cursor.execute(
+                """INSERT INTO orders (order_id, customer_id, order_status, order_purchase_timestamp, 
+                                    order_approved_at, order_delivered_carrier_date, 
+                                    order_delivered_customer_date, order_estimated_delivery_date) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT (order_id) DO NOTHING;""",
+                (row['order_id'], row['customer_id'], row['order_status'], row['order_purchase_timestamp'],
+                 row['order_approved_at'], row['order_delivered_carrier_date'],
+                 row['order_delivered_customer_date'], row['order_estimated_delivery_date'])
+            )
+        print("Orders loaded.")
+
+        order_items_df = pd.read_csv(os.path.join(OLIST_DATA_PATH, 'olist_order_items_dataset.csv'))
+        order_items_df['shipping_limit_date'] = pd.to_datetime(order_items_df['shipping_limit_date'], errors='coerce')
+        order_items_df = order_items_df.replace({np.nan: None})
+        print(f"Loading {len(order_items_df)} order items...")
+        items_to_insert = [(row['order_id'], row['product_id'], row['seller_id'], row['shipping_limit_date'], row['price'], row['freight_value']) for index, row in order_items_df.iterrows()]
+        if items_to_insert: cursor.executemany("""INSERT INTO order_items (order_id, product_id, seller_id, shipping_limit_date, price, freight_value) VALUES (%s, %s, %s, %s, %s, %s);""", items_to_insert)
+        print("Order items loaded.")
+        conn.commit()
+    except FileNotFoundError as e: print(f"Error: Olist CSV file not found. Ensure CSVs are in '{OLIST_DATA_PATH}'. {e}"); conn.rollback()
+    except Exception as e: print(f"Error loading PostgreSQL data: {e}"); conn.rollback()
+    finally: cursor.close()
+
+def insert_in_batches(collection, documents, batch_size=MONGO_INSERT_BATCH_SIZE, workers=MONGO_INSERT_WORKERS):
+    # Unordered insert_many batches issued from a small thread pool; MongoClient is
+    # thread-safe, so each worker borrows its own pooled socket.
+    batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        inserted = sum(len(result.inserted_ids) for result in
+                       executor.map(lambda batch: collection.insert_many(batch, ordered=False), batches))
+    return inserted
+
+# Lookup keys of the API's single-record routes and the list filters
+# (documents.DOCUMENT_FILTERS). Built after the bulk insert so each index is
+# created in one pass. reviews.order_id is not unique in the Olist data (a few
+# orders carry several reviews), so that index is plain.
+MONGO_INDEXES = {
+    'products': [("product_id", {"unique": True}), ("product_category_name", {}), ("tags", {})],
+    'reviews': [("order_id", {}), ("review_score", {}), ([("review_id", 1), ("order_id", 1)], {"unique": True})],
+    'user_profiles': [("customer_id", {"unique": True})],
+    'category_translations': [("product_category_name", {"unique": True})],
+}
+# (collection, source CSV, document builder, key fields for the incremental sync).
+# User profiles are only inserted/deleted by a sync, never overwritten, since the
+# API owns their contents once created. The products' rating is filled in by the
+# load_product_ratings stage afterwards.
+MONGO_SOURCES = [
+    ('products', 'olist_products_dataset.csv', build_product_documents, ('product_id',)),
+    ('reviews', 'olist_order_reviews_dataset.csv', build_review_documents, ('review_id', 'order_id')),
+    ('user_profiles', 'olist_customers_dataset.csv', build_user_profile_documents, ('customer_id',)),
+    ('category_translations', 'product_category_name_translation.csv', build_category_translation_documents, ('product_category_name',)),
+]
+
+def load_mongodb_data(mongo_client):
+    # Returns {collection: {"rows": n, "seconds": s}} for the timing summary; a
+    # collection that fails is reported and marked failed, the others still load.
+    db = mongo_client.ecom_hybrid_db
+    db.products.drop(); db.reviews.drop(); db.user_profiles.drop(); db.category_translations.drop(); db.load_fingerprints.drop()
+    print("MongoDB collections dropped.")
+
+    timings = {}
+    for name, filename, build, _ in MONGO_SOURCES:
+        started = time.perf_counter()
+        try:
+            path = os.path.join(OLIST_DATA_PATH, filename)
+            documents = build(read_olist_csv(path))
+            if documents:
+                print(f"Loading {len(documents)} {name.replace('_', ' ')}...")
+                insert_in_batches(db[name], documents)
+            else: print(f"No {name.replace('_', ' ')} data.")
+            for field, options in MONGO_INDEXES[name]:
+                db[name].create_index(field, **options)
+            save_mongo_fingerprint(db, name, filename, file_fingerprint(path), len(documents))
+            bump_mongo_change_version(db, name)
+            timings[name] = {"rows": len(documents), "seconds": time.perf_counter() - started}
+            print(f"{name.replace('_', ' ').capitalize()} loaded.")
+        except FileNotFoundError as e:
+            print(f"Error: Olist CSV file not found. Ensure CSVs are in '{OLIST_DATA_PATH}'. {e}")
+            timings[name] = {"rows": None, "seconds": time.perf_counter() - started, "failed": True}
+        except Exception as e:
+            print(f"Error loading MongoDB collection {name}: {e}")
+            timings[name] = {"rows": None, "seconds": time.perf_counter() - started, "failed": True}
+    return timings
+
+def sync_mongodb_data(mongo_client):
+    # Incremental counterpart of load_mongodb_data: unchanged CSVs are skipped and
+    # changed ones applied as a delta (see common/incremental.py).
+    db = mongo_client.ecom_hybrid_db
+    print("Incremental MongoDB load...")
+    timings = {}
+    for name, filename, build, key_fields in MONGO_SOURCES:
+        started = time.perf_counter()
+        try:
+            timings[name] = incremental_sync_mongo_source(
+                db, name, os.path.join(OLIST_DATA_PATH, filename), lambda path, build=build: build(read_olist_csv(path)),
+                key_fields, replace=name != 'user_profiles', derived=('rating',) if name == 'products' else ()
+            )
+            if not timings[name]["skipped"]:
+                bump_mongo_change_version(db, name)
+            for field, options in MONGO_INDEXES[name]:
+                db[name].create_index(field, **options)
+        except FileNotFoundError as e:
+            print(f"Error: Olist CSV file not found. Ensure CSVs are in '{OLIST_DATA_PATH}'. {e}")
+            timings[name] = {"rows": None, "seconds": time.perf_counter() - started, "failed": True}
+        except Exception as e:
+            print(f"Error syncing MongoDB collection {name}: {e}")
+            timings[name] = {"rows": None, "seconds": time.perf_counter() - started, "failed": True}
+    return timings
+
+def load_product_ratings(postgres_conn, mongo_client):
+    # Per-product review summaries in the product documents (common/ratings.py),
+    # from the reviews in MongoDB and the order items in PostgreSQL.
+    db = mongo_client.ecom_hybrid_db
+    print("Computing the product ratings...")
+    timings = refresh_product_ratings(postgres_conn, db)
+    if timings["rows"]:
+        bump_mongo_change_version(db, 'products')
+    print(f"  product ratings: {timings['rows']} products updated in {timings['seconds']:.2f}s")
+    return timings
+
+def load_postgres(postgres_conn, mode, incremental=False):
+    if incremental:
+        method = mode if mode != 'insert' else 'copy'
+        timings = {"postgres." + table: t for table, t in incremental_load_postgres_data(postgres_conn, OLIST_DATA_PATH, method=method).items()}
+    elif mode != 'insert':
+        timings = {"postgres." + table: t for table, t in bulk_load_postgres_data(postgres_conn, OLIST_DATA_PATH, method=mode).items()}
+    else:
+        started = time.perf_counter()
+        cursor = postgres_conn.cursor()
+        create_postgres_tables(cursor)
+        load_postgres_data(postgres_conn)
+        timings = {"postgres (all tables)": {"rows": None, "seconds": time.perf_counter() - started}}
+    print("Refreshing the PostgreSQL analytics views...")
+    timings.update({"postgres." + view: t for view, t in refresh_sales_views(postgres_conn).items()})
+    check_filter_indexes(postgres_conn)
+    return timings
+
+def print_timing_summary(timings):
+    print("--- Load timing summary ---")
+    for name, t in timings.items():
+        rows = "-" if t["rows"] is None else t["rows"]
+        rate = f"{t['rows'] / t['seconds']:,.0f} rows/s" if t["rows"] and t["seconds"] > 0 else "-"
+        print(f"  {name:<28} {rows:>8} rows {t['seconds']:>8.2f}s  {'FAILED' if t.get('failed') else rate}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the Olist CSVs into PostgreSQL and MongoDB.")
+    parser.add_argument('--mode', choices=LOAD_METHODS + ('insert',), default='copy',
+                        help="PostgreSQL load path. copy: COPY FROM STDIN (default), values: batched execute_values, insert: row-by-row INSERTs")
+    parser.add_argument('--incremental', action='store_true',
+                        help="keep existing data, skip unchanged CSVs and apply only the changed rows of the others")
+    parser.add_argument('--no-snapshot-cache', action='store_true',
+                        help="always parse the CSVs instead of reusing the parsed snapshots in data/.snapshot_cache")
+    args = parser.parse_args()
+    snapshots.SNAPSHOTS_ENABLED = not args.no_snapshot_cache
+
+    postgres_conn = None
+    mongo_client = None
+    max_retries = 15 
+    retry_delay = 5 
+
+    for i in range(max_retries):
+        print(f"Attempting to connect to PostgreSQL (attempt {i+1}/{max_retries})...")
+        postgres_conn = get_postgres_connection()
+        if postgres_conn:
+            print("PostgreSQL connection successful!")
+            break
+        time.sleep(retry_delay)
+    
+    for i in range(max_retries):
+        print(f"Attempting to connect to MongoDB (attempt {i+1}/{max_retries})...")
+        mongo_client = get_mongo_client()
+        if mongo_client:
+            print("MongoDB connection successful!")
+            break
+        time.sleep(retry_delay)
+
+    if postgres_conn and mongo_client:
+        try:
+            print("--- Starting Olist Data Loading ---")
+            # The two stores are independent, so load them side by side.
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                postgres_future = executor.submit(load_postgres, postgres_conn, args.mode, args.incremental)
+                mongo_future = executor.submit(sync_mongodb_data if args.incremental else load_mongodb_data, mongo_client)
+                timings = {**postgres_future.result(), **{"mongo." + name: t for name, t in mongo_future.result().items()}}
+            # Needs sales_by_product from PostgreSQL and the products from MongoDB.
+            timings["mongo.category_sales"] = refresh_mongo_category_sales(postgres_conn, mongo_client.ecom_hybrid_db)
+            timings["mongo.product_ratings"] = load_product_ratings(postgres_conn, mongo_client)
+            print("--- Olist Data Loading Completed ---")
+            print_timing_summary(timings)
+            print(f"  {'total (wall clock)':<28} {'':>8}      {time.perf_counter() - started:>8.2f}s")
+        except Exception as e: print(f"An error occurred during Olist data loading: {e}")
+        finally:
+            if postgres_conn: postgres_conn.close(); print("PostgreSQL connection closed.")
+            if mongo_client: mongo_client.close(); print("MongoDB connection closed.")
+    else: print("Failed to connect to one or both databases. Data loading aborted.")
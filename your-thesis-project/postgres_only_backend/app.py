@@ -1,106 +1,260 @@
-from flask import Flask, jsonify
-import psycopg2
-from flask_cors import CORS
-
-app = Flask(__name__)
-CORS(app)
-
-POSTGRES_HOST = 'localhost'
-POSTGRES_PORT = '5433'
-POSTGRES_DB = 'ecom_only_db' # Matches new database name
-POSTGRES_USER = 'user'
-POSTGRES_PASSWORD = 'password'
-
-def get_postgres_connection():
-    try:
-        conn = psycopg2.connect(
-            host=POSTGRES_HOST, port=POSTGRES_PORT,
-            database=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD
-        )
-        return conn
-    except Exception as e:
-        print(f"PostgreSQL connection error: {e}")
-        return None
-
-@app.route('/')
-def home():
-    return "E-commerce PostgreSQL Only Backend is running!"
-
-@app.route('/customers', methods=['GET'])
-def get_customers():
-    conn = get_postgres_connection()
-    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT customer_id, customer_unique_id, customer_zip_code_prefix, customer_city, customer_state FROM customers;")
-        customers = cur.fetchall()
-        cur.close()
-        return jsonify([{"customer_id": c[0], "customer_unique_id": c[1], "customer_zip_code_prefix": c[2], "customer_city": c[3], "customer_state": c[4]} for c in customers])
-    except Exception as e:
-        print(f"Error fetching customers: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if conn: conn.close()
-
-@app.route('/orders', methods=['GET'])
-def get_orders():
-    conn = get_postgres_connection()
-    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT 
-                order_id, customer_id, order_status, 
-                order_purchase_timestamp, order_approved_at, 
-                order_delivered_carrier_date, order_delivered_customer_date, 
-                order_estimated_delivery_date 
-            FROM orders;
-        """)
-        orders = cur.fetchall()
-        cur.close()
-        
-        return jsonify([
-            {
-                "order_id": o[0], 
-                "customer_id": o[1], 
-                "order_status": o[2], 
-                "order_purchase_timestamp": o[3].isoformat() if o[3] else None, 
-                "order_approved_at": o[4].isoformat() if o[4] else None,
-                "order_delivered_carrier_date": o[5].isoformat() if o[5] else None,
-                "order_delivered_customer_date": o[6].isoformat() if o[6] else None,
-                "order_estimated_delivery_date": o[7].isoformat() if o[7] else None
-            } 
-            for o in orders
-        ])
-    except Exception as e:
-        print(f"Error fetching orders: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if conn: conn.close()
-
-@app.route('/order_items', methods=['GET'])
-def get_order_items():
-    conn = get_postgres_connection()
-    if not conn: return jsonify({"error": "Failed to connect to PostgreSQL"}), 500
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT order_item_id, order_id, product_id, seller_id, shipping_limit_date, price, freight_value FROM order_items;")
-        order_items = cur.fetchall()
-        cur.close()
-        return jsonify([
-            {
-                "order_item_id": oi[0], "order_id": oi[1], "product_id": oi[2],
-                "seller_id": oi[3], "shipping_limit_date": oi[4].isoformat() if oi[4] else None,
-                "price": str(oi[5]), "freight_value": str(oi[6])
-            }
-            for oi in order_items
-        ])
-    except Exception as e:
-        print(f"Error fetching order items: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if conn: conn.close()
-
-
-if __name__ == '__main__':
-    app.run(debug=True, port=5000, host='0.0.0.0')
+from flask import Flask, jsonify, request
+import os
+import sys
+import threading
+from flask_cors import CORS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.analytics import postgres_report_response
+from common.bulk import postgres_bulk_response
+from common.db_pool import PostgresPool, abandon_after_fork
+from common.http_cache import create_http_cache, postgres_change_version
+from common.metrics import RequestMetrics, TimedCursor, timed_phase
+from common.listing import postgres_list_response
+from common.pg_crud import postgres_item_response
+from common.pg_documents import (DOCUMENT_RESOURCES, postgres_product_document_response, postgres_product_documents_bulk_response,
+                                 sync_user_profile_documents)
+from common.serializers import POSTGRES_RESOURCES, check_json_mode
+from common.single_flight import SingleFlight
+from common.settings import env_bool, env_float, env_int, env_str
+
+app = Flask(__name__)
+CORS(app)
+
+POSTGRES_HOST = env_str('POSTGRES_HOST', 'localhost')
+POSTGRES_PORT = env_str('POSTGRES_PORT', '5433')
+POSTGRES_DB = env_str('POSTGRES_DB', 'ecom_only_db') # Matches new database name
+POSTGRES_USER = env_str('POSTGRES_USER', 'user')
+POSTGRES_PASSWORD = env_str('POSTGRES_PASSWORD', 'password')
+
+# Process-wide pool shared by all routes (sized for the 1000-thread JMeter plan).
+POSTGRES_POOL_MIN_SIZE = env_int('POSTGRES_POOL_MIN_SIZE', 2)
+POSTGRES_POOL_MAX_SIZE = env_int('POSTGRES_POOL_MAX_SIZE', 20)
+POSTGRES_POOL_TIMEOUT = env_float('POSTGRES_POOL_TIMEOUT', 5.0) # seconds a request waits for a free connection
+POSTGRES_POOL_HEALTH_CHECK = env_bool('POSTGRES_POOL_HEALTH_CHECK', True)
+
+# Per-route phase timings (pool acquire, query, fetch, serialize, send) on
+# /metrics. Requests slower than SLOW_REQUEST_SECONDS are logged together with
+# their slowest query; SLOW_REQUEST_SECONDS=0 turns the log off.
+METRICS_ENABLED = env_bool('METRICS_ENABLED', True)
+SLOW_REQUEST_SECONDS = env_float('SLOW_REQUEST_SECONDS', 1.0) or None
+
+request_metrics = RequestMetrics(slow_request_seconds=SLOW_REQUEST_SECONDS)
+if METRICS_ENABLED:
+    request_metrics.init_app(app)
+
+# jsonify formatting. The JMeter plans extract ids with regexes such as
+# "customer_id": "(.+?)", which only match the indented output the debug server
+# produced, so production serving keeps it unless JSON_COMPACT=1.
+JSON_COMPACT = env_bool('JSON_COMPACT', False)
+app.json.compact = JSON_COMPACT
+
+# How the PostgreSQL list routes serialize rows: 'python' (row -> dict -> jsonify),
+# 'postgres' (row_to_json in the query) or 'orjson'; see common.serializers.
+# The last two write compact JSON only and refuse to start without JSON_COMPACT=1.
+POSTGRES_JSON_MODE = env_str('POSTGRES_JSON_MODE', 'python')
+check_json_mode(POSTGRES_JSON_MODE, JSON_COMPACT)
+
+# Document mode: /products, /reviews and /user_profiles serve the same JSON
+# documents as the hybrid backend's MongoDB collections, from the JSONB tables
+# of common/pg_documents.py (load them with data_loader.py --documents). Off,
+# /products is the relational products table and the other two routes are 404.
+DOCUMENT_MODE = env_bool('DOCUMENT_MODE', False)
+
+# Conditional GET (ETag / Last-Modified from per-table change versions, 304 Not
+# Modified) and gzip/brotli compression for the collection routes; see
+# common/http_cache.py. Compressed bodies are kept per data version in an LRU
+# bounded by HTTP_CACHE_MAX_ENTRIES / HTTP_CACHE_MAX_BYTES.
+HTTP_CACHE_ENABLED = env_bool('HTTP_CACHE_ENABLED', True)
+HTTP_CACHE_MAX_ENTRIES = env_int('HTTP_CACHE_MAX_ENTRIES', 64)
+HTTP_CACHE_MAX_BYTES = env_int('HTTP_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+http_cache = create_http_cache(enabled=HTTP_CACHE_ENABLED, max_entries=HTTP_CACHE_MAX_ENTRIES, max_bytes=HTTP_CACHE_MAX_BYTES)
+
+# Single flight for the collection GET routes: identical requests that arrive
+# while one is running wait for it and share its response instead of running the
+# same query; see common/single_flight.py. A follower waits at most
+# SINGLE_FLIGHT_TIMEOUT seconds before running the query itself.
+SINGLE_FLIGHT_ENABLED = env_bool('SINGLE_FLIGHT_ENABLED', True)
+SINGLE_FLIGHT_TIMEOUT = env_float('SINGLE_FLIGHT_TIMEOUT', 30.0)
+
+single_flight = SingleFlight(timeout=SINGLE_FLIGHT_TIMEOUT, enabled=SINGLE_FLIGHT_ENABLED)
+
+_pool_lock = threading.Lock()
+_postgres_pool = None
+
+def get_postgres_pool():
+    global _postgres_pool
+    if _postgres_pool is None:
+        with _pool_lock:
+            if _postgres_pool is None:
+                _postgres_pool = PostgresPool(
+                    min_size=POSTGRES_POOL_MIN_SIZE, max_size=POSTGRES_POOL_MAX_SIZE,
+                    acquire_timeout=POSTGRES_POOL_TIMEOUT, check_on_borrow=POSTGRES_POOL_HEALTH_CHECK,
+                    host=POSTGRES_HOST, port=POSTGRES_PORT,
+                    database=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD,
+                    cursor_factory=TimedCursor
+                )
+    return _postgres_pool
+
+def get_postgres_connection():
+    try:
+        with timed_phase('postgres', 'acquire'):
+            return get_postgres_pool().getconn()
+    except Exception as e:
+        print(f"PostgreSQL connection error: {e}")
+        return None
+
+def release_postgres_connection(conn, discard=False):
+    get_postgres_pool().putconn(conn, discard=discard)
+
+def open_pools():
+    # Run by gunicorn.conf.py in every worker before it accepts requests.
+    get_postgres_pool()
+
+def _reset_pools_after_fork():
+    # Each pre-forked worker opens its own pool on first use (or open_pools).
+    global _pool_lock, _postgres_pool
+    abandon_after_fork(_postgres_pool)
+    _pool_lock = threading.Lock()
+    _postgres_pool = None
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+def postgres_version(*tables):
+    return lambda: postgres_change_version(get_postgres_connection, release_postgres_connection, tables)
+
+@app.route('/')
+def home():
+    return "E-commerce PostgreSQL Only Backend is running!"
+
+@app.route('/customers', methods=['GET'])
+@http_cache.conditional('customers', postgres_version('customers'))
+@single_flight.coalesced('customers')
+def get_customers():
+    return postgres_list_response(POSTGRES_RESOURCES['customers'], request.args, get_postgres_connection, release_postgres_connection, "customers", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/orders', methods=['GET'])
+@http_cache.conditional('orders', postgres_version('orders', 'order_items'))
+@single_flight.coalesced('orders')
+def get_orders():
+    return postgres_list_response(POSTGRES_RESOURCES['orders'], request.args, get_postgres_connection, release_postgres_connection, "orders", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/order_items', methods=['GET'])
+@http_cache.conditional('order_items', postgres_version('order_items', 'orders'))
+@single_flight.coalesced('order_items')
+def get_order_items():
+    return postgres_list_response(POSTGRES_RESOURCES['order_items'], request.args, get_postgres_connection, release_postgres_connection, "order items", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/products', methods=['GET'])
+@http_cache.conditional('products', postgres_version('product_documents' if DOCUMENT_MODE else 'products'))
+@single_flight.coalesced('products')
+def get_products():
+    resource = DOCUMENT_RESOURCES['products'] if DOCUMENT_MODE else POSTGRES_RESOURCES['products']
+    return postgres_list_response(resource, request.args, get_postgres_connection, release_postgres_connection, "products", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/reviews', methods=['GET'])
+@http_cache.conditional('reviews', postgres_version('review_documents'))
+@single_flight.coalesced('reviews')
+def get_reviews():
+    if not DOCUMENT_MODE: return jsonify({"error": "Reviews are only served in document mode (DOCUMENT_MODE=1)"}), 404
+    return postgres_list_response(DOCUMENT_RESOURCES['reviews'], request.args, get_postgres_connection, release_postgres_connection, "reviews", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/user_profiles', methods=['GET'])
+@http_cache.conditional('user_profiles', postgres_version('user_profile_documents'))
+@single_flight.coalesced('user_profiles')
+def get_user_profiles():
+    if not DOCUMENT_MODE: return jsonify({"error": "User profiles are only served in document mode (DOCUMENT_MODE=1)"}), 404
+    return postgres_list_response(DOCUMENT_RESOURCES['user_profiles'], request.args, get_postgres_connection, release_postgres_connection, "user profiles", json_mode=POSTGRES_JSON_MODE)
+
+@app.route('/customers/_bulk', methods=['POST'])
+@single_flight.invalidates('customers', 'user_profiles')
+def customers_bulk():
+    response, status = postgres_bulk_response(POSTGRES_RESOURCES['customers'], request.get_data(), request.mimetype,
+                                              get_postgres_connection, release_postgres_connection, "customer")
+    if DOCUMENT_MODE and status == 200:
+        # Same user profile pairing as customer_item, in one transaction.
+        items = response.get_json()["items"]
+        try:
+            sync_user_profile_documents(
+                get_postgres_connection, release_postgres_connection,
+                created=[i["customer_id"] for i in items if i["op"] == 'create' and i["status"] == 201],
+                deleted=[i["customer_id"] for i in items if i["op"] == 'delete' and i["status"] == 200]
+            )
+        except Exception as e:
+            print(f"Error syncing user profiles for bulk customer request: {e}")
+    return response, status
+
+@app.route('/products/_bulk', methods=['POST'])
+@single_flight.invalidates('products')
+def products_bulk():
+    if DOCUMENT_MODE:
+        return postgres_product_documents_bulk_response(request.get_data(), request.mimetype,
+                                                        get_postgres_connection, release_postgres_connection)
+    return postgres_bulk_response(POSTGRES_RESOURCES['products'], request.get_data(), request.mimetype,
+                                  get_postgres_connection, release_postgres_connection, "product")
+
+@app.route('/customers', methods=['POST'])
+@app.route('/customers/<customer_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@single_flight.invalidates('customers', 'user_profiles')
+def customer_item(customer_id=None):
+    response, status = postgres_item_response(
+        POSTGRES_RESOURCES['customers'], customer_id, request.method, request.get_json(silent=True),
+        get_postgres_connection, release_postgres_connection, "customer"
+    )
+    # In document mode every customer has a user profile document (see the
+    # loader), as in the hybrid backend; keep them paired.
+    if DOCUMENT_MODE and request.method in ('POST', 'DELETE') and status in (200, 201):
+        customer_id = response.get_json()["customer_id"]
+        try:
+            if request.method == 'POST':
+                sync_user_profile_documents(get_postgres_connection, release_postgres_connection, created=[customer_id])
+            else:
+                sync_user_profile_documents(get_postgres_connection, release_postgres_connection, deleted=[customer_id])
+        except Exception as e:
+            print(f"Error syncing user profile for customer {customer_id}: {e}")
+    return response, status
+
+@app.route('/orders', methods=['POST'])
+@app.route('/orders/<order_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@single_flight.invalidates('orders', 'order_items')
+def order_item(order_id=None):
+    return postgres_item_response(
+        POSTGRES_RESOURCES['orders'], order_id, request.method, request.get_json(silent=True),
+        get_postgres_connection, release_postgres_connection, "order"
+    )
+
+@app.route('/products', methods=['POST'])
+@app.route('/products/<product_id>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@single_flight.invalidates('products')
+def product_item(product_id=None):
+    if DOCUMENT_MODE:
+        return postgres_product_document_response(product_id, request.method, request.get_json(silent=True),
+                                                  get_postgres_connection, release_postgres_connection)
+    return postgres_item_response(
+        POSTGRES_RESOURCES['products'], product_id, request.method, request.get_json(silent=True),
+        get_postgres_connection, release_postgres_connection, "product"
+    )
+
+@app.route('/analytics/revenue_by_month', methods=['GET'])
+def get_revenue_by_month():
+    return postgres_report_response('revenue_by_month', request.args, get_postgres_connection, release_postgres_connection)
+
+@app.route('/analytics/revenue_by_seller', methods=['GET'])
+def get_revenue_by_seller():
+    return postgres_report_response('revenue_by_seller', request.args, get_postgres_connection, release_postgres_connection)
+
+@app.route('/analytics/revenue_by_category', methods=['GET'])
+def get_revenue_by_category():
+    return postgres_report_response('revenue_by_category', request.args, get_postgres_connection, release_postgres_connection)
+
+@app.route('/pool_stats', methods=['GET'])
+def get_pool_stats():
+    return jsonify({"postgres": _postgres_pool.stats() if _postgres_pool else None})
+
+@app.route('/cache_stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({"http": http_cache.stats(), "single_flight": single_flight.stats()})
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5000, host='0.0.0.0')
@@ -0,0 +1,9 @@
+# Unit tests for the pure-Python parts of common/ and bench/; no database needed.
+# Run from this project's directory with
+#   pip install -r requirements-dev.txt && python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
@@ -0,0 +1,17 @@
+from bench import percentile
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 50) is None
+
+def test_nearest_rank_percentiles():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 95) == 10
+    assert percentile(values, 99) == 10
+    assert percentile(values, 100) == 10
+    assert percentile(values, 1) == 1
+
+def test_percentile_of_one_value():
+    assert percentile([0.25], 99) == 0.25
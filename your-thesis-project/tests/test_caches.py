@@ -0,0 +1,57 @@
+import time
+
+from common.order_details import ProductLRU
+from common.response_cache import LocalLRUCache
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LocalLRUCache(max_entries=2, max_bytes=1024)
+    cache.set("a", b"1", 60)
+    cache.set("b", b"2", 60)
+    assert cache.get("a") == b"1"  # a is now the most recent
+    cache.set("c", b"3", 60)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1", b"3")
+    assert cache.evictions == 1
+
+def test_lru_is_bounded_by_bytes():
+    cache = LocalLRUCache(max_entries=10, max_bytes=10)
+    cache.set("a", b"x" * 6, 60)
+    cache.set("b", b"y" * 6, 60)
+    assert cache.get("a") is None
+    assert cache.info()["bytes"] == 6
+    cache.set("big", b"z" * 11, 60)  # larger than the whole cache: not kept
+    assert cache.get("big") is None and cache.get("b") == b"y" * 6
+
+def test_lru_entries_expire():
+    cache = LocalLRUCache()
+    cache.set("a", b"1", 0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.info()["entries"] == 0
+
+def test_lru_version_bump_drops_the_namespace():
+    cache = LocalLRUCache()
+    cache.set("products:v0:/products?", b"1", 60)
+    cache.set("reviews:v0:/reviews?", b"2", 60)
+    cache.bump_version("products")
+    assert cache.version("products") == 1 and cache.version("reviews") == 0
+    assert cache.get("products:v0:/products?") is None
+    assert cache.get("reviews:v0:/reviews?") == b"2"
+
+def test_product_lru_hits_misses_and_bound():
+    cache = ProductLRU(max_entries=2, ttl=60)
+    cache.put_many({"a": {"id": "a"}, "b": {"id": "b"}, "c": {"id": "c"}})
+    assert cache.get_many(["a", "b", "c"]) == {"b": {"id": "b"}, "c": {"id": "c"}}
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (2, 1)
+    cache.discard("b")
+    assert cache.get_many(["b"]) == {}
+    cache.discard()
+    assert cache.stats()["entries"] == 0
+
+def test_product_lru_entries_expire():
+    cache = ProductLRU(ttl=0.01)
+    cache.put_many({"a": {"id": "a"}})
+    time.sleep(0.02)
+    assert cache.get_many(["a"]) == {}
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,75 @@
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from common.incremental import sync_collection
+
+
+class FakeCollection:
+    # The two calls sync_collection makes: find(filter, projection) and
+    # bulk_write(requests, ordered=False), which is recorded, not applied.
+    def __init__(self, documents):
+        self.documents = documents
+        self.batches = []
+
+    def find(self, query, projection):
+        assert query == {}
+        included = [f for f, v in projection.items() if v and f != "_id"]
+        excluded = [f for f, v in projection.items() if not v]
+        for doc in self.documents:
+            if included:
+                yield {f: doc[f] for f in included if f in doc}
+            else:
+                yield {k: v for k, v in doc.items() if k not in excluded}
+
+    def bulk_write(self, requests, ordered=True):
+        assert ordered is False
+        self.batches.append(list(requests))
+
+    @property
+    def requests(self):
+        return [r for batch in self.batches for r in batch]
+
+
+def test_unchanged_documents_write_nothing():
+    collection = FakeCollection([{"_id": 1, "k": "a", "v": 1}])
+    assert sync_collection(collection, [{"k": "a", "v": 1}], ("k",)) == {"inserted": 0, "updated": 0, "deleted": 0}
+    assert collection.batches == []
+
+def test_inserts_updates_and_deletes():
+    collection = FakeCollection([{"_id": 1, "k": "a", "v": 1}, {"_id": 2, "k": "b", "v": 2}, {"_id": 3, "k": "c", "v": 3}])
+    documents = [{"k": "a", "v": 1}, {"k": "b", "v": 20}, {"k": "d", "v": 4}]
+    assert sync_collection(collection, documents, ("k",)) == {"inserted": 1, "updated": 1, "deleted": 1}
+    expected = [
+        ReplaceOne({"k": "b"}, {"k": "b", "v": 20}, upsert=True),
+        ReplaceOne({"k": "d"}, {"k": "d", "v": 4}, upsert=True),
+        DeleteOne({"k": "c"}),
+    ]
+    assert len(collection.requests) == len(expected)
+    assert all(request in collection.requests for request in expected)
+
+def test_compound_keys():
+    collection = FakeCollection([{"_id": 1, "r": "x", "o": "1", "s": 5}, {"_id": 2, "r": "x", "o": "2", "s": 4}])
+    documents = [{"r": "x", "o": "1", "s": 5}, {"r": "x", "o": "2", "s": 1}]
+    assert sync_collection(collection, documents, ("r", "o")) == {"inserted": 0, "updated": 1, "deleted": 0}
+    assert collection.requests == [ReplaceOne({"r": "x", "o": "2"}, {"r": "x", "o": "2", "s": 1}, upsert=True)]
+
+def test_the_last_duplicate_wins():
+    collection = FakeCollection([])
+    sync_collection(collection, [{"k": "a", "v": 1}, {"k": "a", "v": 2}], ("k",))
+    assert collection.requests == [ReplaceOne({"k": "a"}, {"k": "a", "v": 2}, upsert=True)]
+
+def test_without_replace_existing_documents_are_kept():
+    collection = FakeCollection([{"_id": 1, "k": "a", "v": "edited"}, {"_id": 2, "k": "gone", "v": 0}])
+    documents = [{"k": "a", "v": "csv"}, {"k": "b", "v": "csv"}]
+    assert sync_collection(collection, documents, ("k",), replace=False) == {"inserted": 1, "updated": 0, "deleted": 1}
+    assert collection.requests == [UpdateOne({"k": "b"}, {"$setOnInsert": {"k": "b", "v": "csv"}}, upsert=True),
+                                   DeleteOne({"k": "gone"})]
+
+def test_derived_fields_do_not_count_as_changes():
+    collection = FakeCollection([{"_id": 1, "k": "a", "v": 1, "rating": {"count": 3}}])
+    documents = [{"k": "a", "v": 1}]
+    assert sync_collection(collection, documents, ("k",), derived=("rating",)) == {"inserted": 0, "updated": 0, "deleted": 0}
+
+def test_writes_are_batched():
+    collection = FakeCollection([])
+    sync_collection(collection, [{"k": i} for i in range(5)], ("k",), batch_size=2)
+    assert [len(batch) for batch in collection.batches] == [2, 2, 1]
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+from common.documents import DOCUMENT_FIELDS, DOCUMENT_FILTERS
+from common.listing import (MAX_PAGE_LIMIT, parse_cursor_arg, parse_fields_arg, parse_filter_args, parse_list_args,
+                            parse_mongo_filter_args)
+from common.serializers import POSTGRES_RESOURCES
+
+
+def test_list_args_default_to_the_whole_collection():
+    assert parse_list_args({}) == (None, None, None)
+
+def test_list_args_parse_limit_after_and_stream():
+    assert parse_list_args({"limit": "50", "after": "17", "stream": "ndjson"}, int) == (50, 17, "ndjson")
+
+@pytest.mark.parametrize("limit", ["0", str(MAX_PAGE_LIMIT + 1), "-3", "ten", "1.5"])
+def test_list_args_reject_bad_limits(limit):
+    with pytest.raises(ValueError, match="limit"):
+        parse_list_args({"limit": limit})
+
+def test_list_args_accept_the_limit_bounds():
+    assert parse_list_args({"limit": "1"})[0] == 1
+    assert parse_list_args({"limit": str(MAX_PAGE_LIMIT)})[0] == MAX_PAGE_LIMIT
+
+def test_list_args_parse_after_with_the_key_type():
+    with pytest.raises(ValueError, match="Invalid after"):
+        parse_list_args({"after": "abc"}, int)
+    assert parse_list_args({"after": "abc"})[1] == "abc"
+
+def test_list_args_reject_unknown_stream_formats():
+    with pytest.raises(ValueError, match="stream must be one of"):
+        parse_list_args({"stream": "csv"})
+
+def test_cursor_arg():
+    assert parse_cursor_arg({}) == "keyset"
+    assert parse_cursor_arg({"cursor": "server"}) == "server"
+    with pytest.raises(ValueError, match="cursor must be one of"):
+        parse_cursor_arg({"cursor": "client"})
+
+def test_filter_args_follow_the_resource_order():
+    resource = POSTGRES_RESOURCES['orders']
+    filters = parse_filter_args(resource, {"purchased_from": "2017-01-01", "customer_id": "c1", "unknown": "x"})
+    assert filters == [("customer_id = %s", "c1"), ("order_purchase_timestamp >= %s", datetime(2017, 1, 1))]
+
+def test_filter_args_name_the_bad_parameter():
+    with pytest.raises(ValueError, match="Invalid purchased_to"):
+        parse_filter_args(POSTGRES_RESOURCES['orders'], {"purchased_to": "yesterday"})
+
+def test_filter_args_of_a_resource_without_filters():
+    assert parse_filter_args(POSTGRES_RESOURCES['customers'], {"customer_id": "c1"}) == []
+
+def test_mongo_filter_args():
+    assert parse_mongo_filter_args(DOCUMENT_FILTERS["reviews"], {"review_score": "5", "order_id": "o1"}) == \
+        {"order_id": "o1", "review_score": 5}
+    with pytest.raises(ValueError, match="Invalid review_score"):
+        parse_mongo_filter_args(DOCUMENT_FILTERS["reviews"], {"review_score": "five"})
+    assert parse_mongo_filter_args(None, {"review_score": "5"}) == {}
+
+def test_fields_arg_always_includes_the_key_once():
+    fields = DOCUMENT_FIELDS["products"]
+    assert parse_fields_arg(fields, {"fields": "rating,tags,rating"}) == ["product_id", "rating", "tags"]
+    assert parse_fields_arg(fields, {"fields": "product_id"}) == ["product_id"]
+
+def test_fields_arg_is_optional():
+    assert parse_fields_arg(DOCUMENT_FIELDS["products"], {}) is None
+
+def test_fields_arg_is_ignored_without_selectable_fields():
+    assert parse_fields_arg(None, {"fields": "anything"}) is None
+
+@pytest.mark.parametrize("value", ["", ",", "rating,nope"])
+def test_fields_arg_rejects_unknown_or_empty_lists(value):
+    with pytest.raises(ValueError, match="fields must list some of"):
+        parse_fields_arg(DOCUMENT_FIELDS["products"], {"fields": value})
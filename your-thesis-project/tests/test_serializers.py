@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+from common.serializers import ascii_json, check_json_mode, document_text_encoder
+
+
+def test_json_modes_need_compact_output():
+    check_json_mode('python', False)
+    check_json_mode('postgres', True)
+    check_json_mode('orjson', True)
+    with pytest.raises(ValueError, match="JSON_COMPACT=1"):
+        check_json_mode('postgres', False)
+    with pytest.raises(ValueError, match="must be one of"):
+        check_json_mode('ujson', True)
+
+@pytest.mark.parametrize("text", ['{"city":"sao paulo"}', '{"city":"são paulo"}', '{"title":"ótimo 😀"}'])
+def test_ascii_json_matches_ensure_ascii(text):
+    assert ascii_json(text) == json.dumps(json.loads(text), separators=(',', ':'))
+
+def test_document_text_is_reencoded_like_jsonify():
+    # JSONB text: shorter keys first, ", " and ": " separators.
+    text = '{"tags": ["x"], "rating": {"count": 1, "scores": {"1": 0}, "average": 4.5}, "product_id": "p"}'
+    assert document_text_encoder()(text) == json.dumps(json.loads(text), sort_keys=True, separators=(',', ':'))
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from flask import Flask, Response, jsonify
+
+from common.single_flight import SingleFlight
+
+FOLLOWERS = 3
+
+
+def make_app(single_flight, view):
+    app = Flask(__name__)
+    app.add_url_rule('/items', 'items', single_flight.coalesced('items')(view))
+    app.add_url_rule('/items', 'write', single_flight.invalidates('items')(lambda: ("", 204)), methods=['POST'])
+    return app
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def run_concurrently(app, url, single_flight):
+    # The leader's view blocks on `release` until every follower has joined its
+    # flight; returns [(status, body)] of leader and followers.
+    results = []
+    def get():
+        response = app.test_client().get(url)
+        results.append((response.status_code, response.get_data(as_text=True)))
+    threads = [threading.Thread(target=get) for _ in range(FOLLOWERS + 1)]
+    threads[0].start()
+    wait_for(lambda: single_flight.stats()["in_flight"] == 1)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: single_flight.stats()["coalesced"] >= FOLLOWERS)
+    return threads, results
+
+def test_followers_share_the_leaders_response():
+    single_flight = SingleFlight(timeout=5)
+    release, calls = threading.Event(), []
+    def view():
+        calls.append(1)
+        release.wait(5)
+        return jsonify(n=len(calls))
+    app = make_app(single_flight, view)
+    threads, results = run_concurrently(app, '/items', single_flight)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert [status for status, _ in results] == [200] * (FOLLOWERS + 1)
+    assert len({body for _, body in results}) == 1
+    assert single_flight.stats()["namespaces"]["items"]["leaders"] == 1
+
+def test_errors_are_not_shared():
+    single_flight = SingleFlight(timeout=5)
+    release, calls = threading.Event(), []
+    def view():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return jsonify(error="boom"), 500
+        return jsonify(ok=True)
+    app = make_app(single_flight, view)
+    threads, results = run_concurrently(app, '/items', single_flight)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == FOLLOWERS + 1
+    assert sorted(status for status, _ in results) == [200] * FOLLOWERS + [500]
+    assert single_flight.stats()["namespaces"]["items"]["fallbacks"] == FOLLOWERS
+
+def test_different_queries_do_not_coalesce():
+    single_flight = SingleFlight(timeout=5)
+    app = make_app(single_flight, lambda: jsonify(ok=True))
+    client = app.test_client()
+    assert client.get('/items?limit=1').status_code == 200
+    assert client.get('/items?limit=2').status_code == 200
+    assert single_flight.stats()["namespaces"]["items"] == {"leaders": 2, "coalesced": 0, "fallbacks": 0, "max_followers": 0}
+
+def test_streams_bypass_coalescing():
+    single_flight = SingleFlight(timeout=5)
+    app = make_app(single_flight, lambda: Response(iter(["[", "]"]), mimetype='application/json'))
+    assert app.test_client().get('/items?stream=json').get_data(as_text=True) == "[]"
+    assert single_flight.stats()["namespaces"] == {}
+
+def test_writes_start_a_new_generation():
+    single_flight = SingleFlight(timeout=5)
+    app = make_app(single_flight, lambda: jsonify(ok=True))
+    with app.test_request_context('/items'):
+        before = single_flight._key('items')
+    assert app.test_client().post('/items').status_code == 204
+    with app.test_request_context('/items'):
+        assert single_flight._key('items') != before
+
+def test_disabled_single_flight_returns_the_view():
+    single_flight = SingleFlight(enabled=False)
+    view = lambda: jsonify(ok=True)
+    assert single_flight.coalesced('items')(view) is view